@@ -27,17 +27,31 @@ if str(repo_root) not in sys.path:
 
 # print("ffprobe exists:", os.path.exists("/usr/bin/ffprobe"))
 
+import json
 import time
+import uuid
+import hashlib
 import tempfile
+import contextlib
 from pathlib import Path
 
 import streamlit as st
 from dotenv import load_dotenv
 load_dotenv()
 
-from utils.audio_utils import ensure_wav_mono_16k, chunk_audio, duration_seconds
-from utils.gemini_client import upload_file, transcribe_file, summarize_text, answer_question
+from utils.audio_utils import ensure_wav_mono_16k, chunk_audio, iter_chunks, duration_seconds, AudioSource
+from utils.gemini_client import stream_summary, stream_answer
 from utils.export_utils import create_docx_from_text, create_pdf_from_text
+from utils.transcription import transcribe_chunks, merge_transcript, DEFAULT_CONCURRENCY
+from utils.transcript_cache import get_default_cache
+from utils.transcript_index import TranscriptIndex, format_timestamp
+from utils.jobs import JobStore, make_job_id
+from utils.quota import get_quota
+from utils.metrics import job_metrics, start_metrics_server
+from utils.workspace import workspace
+from utils.pipeline import job_settings as pipeline_job_settings
+from utils.condense import condense_wav, condense_enabled, TRIM_SILENCE_SECONDS, AUDIO_SPEEDUP, MAX_SPEEDUP
+from utils.job_queue import get_job_queue, queue_enabled, spool_file, QUEUED, RUNNING, DONE, FAILED
 from utils.audio_utils import ensure_ffmpeg_available
 
 
@@ -48,30 +62,296 @@ st.title("Lecture Voice → Notes (Streamlit + Gemini)")
 
 GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.5-flash")
 
+# Streamlit >= 1.43 can serve a download without rerunning the script, which
+# would otherwise interrupt a run in progress (it can still be resumed).
+_st_version = tuple(int(p) for p in st.__version__.split(".")[:2] if p.isdigit())
+DOWNLOAD_NO_RERUN = {"on_click": "ignore"} if _st_version >= (1, 43) else {}
+_rerun = getattr(st, "rerun", None) or st.experimental_rerun
+
+# With USE_JOB_QUEUE=1 uploads are processed by worker.py instead of this script.
+QUEUE_POLL_SECONDS = 2
+
+# Streamlit reruns this script on every widget change. Work derived from the
+# upload (saved copy, duration, finished results, export files) is memoized by
+# the upload's content hash so that a rerun only redraws the page.
+MEMO_TTL_SECONDS = int(os.getenv("APP_CACHE_TTL_SECONDS", "3600"))
+MEMO_MAX_ENTRIES = int(os.getenv("APP_CACHE_MAX_ENTRIES", "32"))
+UPLOAD_DIR = Path(tempfile.gettempdir()) / "voice2notes_uploads"
+UPLOAD_BLOCK_BYTES = 1 << 20
+
+
+def _upload_blocks(uploaded):
+    """
+    The upload's bytes as memoryview slices of one reused block. Reading with
+    readinto never copies the whole upload (getbuffer() or getvalue() on a
+    modified buffer would).
+    """
+    block = memoryview(bytearray(UPLOAD_BLOCK_BYTES))
+    uploaded.seek(0)
+    try:
+        while True:
+            n = uploaded.readinto(block)
+            if not n:
+                break
+            yield block[:n]
+    finally:
+        uploaded.seek(0)
+
+
+def upload_digest(uploaded) -> str:
+    """SHA-256 of an upload, hashed once per uploaded file in this session."""
+    file_id = getattr(uploaded, "file_id", None)
+    digests = st.session_state.setdefault("upload_digests", {})
+    if file_id is None or file_id not in digests:
+        h = hashlib.sha256()
+        for block in _upload_blocks(uploaded):
+            h.update(block)
+        digest = h.hexdigest()
+        if file_id is None:
+            return digest
+        digests[file_id] = digest
+    return digests[file_id]
+
+
+def _write_upload(uploaded, path: Path):
+    path.parent.mkdir(parents=True, exist_ok=True, mode=0o700)
+    tmp = path.with_name(f"{path.name}.{uuid.uuid4().hex}.tmp")
+    with open(tmp, "wb") as f:
+        for block in _upload_blocks(uploaded):
+            f.write(block)
+    os.replace(tmp, path)
+
+
+def _prune_uploads():
+    """Delete saved uploads that have not been used for MEMO_TTL_SECONDS."""
+    cutoff = time.time() - MEMO_TTL_SECONDS
+    for old in UPLOAD_DIR.glob("*"):
+        try:
+            if old.stat().st_mtime < cutoff:
+                old.unlink()
+        except OSError:
+            pass
+
+
+@st.cache_data(ttl=MEMO_TTL_SECONDS, max_entries=MEMO_MAX_ENTRIES, show_spinner=False)
+def _saved_upload(digest: str, suffix: str, _uploaded) -> str:
+    _prune_uploads()
+    path = UPLOAD_DIR / f"{digest}{suffix}"
+    if not path.exists():
+        _write_upload(_uploaded, path)
+    return str(path)
+
+
+def saved_upload_path(uploaded, digest: str) -> str:
+    """Path of the upload on disk, written once per content hash."""
+    path = _saved_upload(digest, Path(uploaded.name).suffix.lower(), uploaded)
+    if os.path.exists(path):
+        os.utime(path)  # in use: keep it from being pruned
+    else:
+        _write_upload(uploaded, Path(path))  # pruned since it was memoized
+    return path
+
+
+@st.cache_data(ttl=MEMO_TTL_SECONDS, max_entries=MEMO_MAX_ENTRIES, show_spinner=False)
+def probed_duration(digest: str, _path: str) -> int:
+    """Duration in seconds, probed once per content hash."""
+    return duration_seconds(AudioSource(_path))
+
+
+@st.cache_resource(ttl=MEMO_TTL_SECONDS, max_entries=MEMO_MAX_ENTRIES, show_spinner=False)
+def finished_run(result_key: str) -> dict:
+    """
+    Slot for the transcript, summary and metrics of a finished run. It is keyed
+    by content hash, settings and summary mode, and filled when the run finishes.
+    """
+    return {}
+
+
+@st.cache_data(ttl=MEMO_TTL_SECONDS, max_entries=MEMO_MAX_ENTRIES, show_spinner=False)
+def export_bytes(kind: str, text: str) -> bytes:
+    """DOCX or PDF export of `text`, built once per text."""
+    create = create_docx_from_text if kind == "docx" else create_pdf_from_text
+    return create(text).getvalue()
+
+
+def job_queue_counts() -> dict:
+    try:
+        return get_job_queue().counts()
+    except Exception:
+        return {}
+
+
+def _show_downloads(merged_transcript: str, summary_text: str):
+    """Download buttons for the transcript and the generated notes."""
+    st.markdown("### ⬇️ Download Options")
+    col1, col2, col3, col4 = st.columns(4)
+    
+    with col1:
+        st.download_button("📄 Transcript (TXT)", merged_transcript, file_name="transcript.txt", mime="text/plain")
+    with col2:
+        st.download_button("📝 Notes (MD)", summary_text, file_name="lecture_notes.md", mime="text/markdown")
+    with col3:
+        try:
+            docx_bytes = export_bytes("docx", summary_text)
+            st.download_button("📄 Notes (DOCX)", docx_bytes, file_name="lecture_notes.docx", mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document")
+        except Exception as e:
+            st.error(f"DOCX generation failed: {e}")
+    with col4:
+        try:
+            pdf_bytes = export_bytes("pdf", summary_text)
+            st.download_button("📄 Notes (PDF)", pdf_bytes, file_name="lecture_notes.pdf", mime="application/pdf")
+        except Exception as e:
+            st.error(f"PDF generation failed: {e}")
+
+
+def _show_metrics(data: dict):
+    """Per-stage timings and counters of a run, with a JSON download."""
+    with st.expander("📊 Processing metrics"):
+        rows = [
+            {"Stage": stage, "Calls": m["calls"], "Errors": m["errors"], "Seconds": m["seconds"],
+             "MB in": round(m["bytes_in"] / 1e6, 2), "MB out": round(m["bytes_out"] / 1e6, 2)}
+            for stage, m in data.get("stages", {}).items()
+        ]
+        if rows:
+            st.dataframe(rows, use_container_width=True)
+        st.json(data.get("counters", {}))
+        st.download_button("⬇️ Metrics (JSON)", json.dumps(data, indent=2), file_name="metrics.json",
+                           mime="application/json", **DOWNLOAD_NO_RERUN)
+
+
+def _show_results(result_key: str, result: dict):
+    """Transcript preview, notes, downloads and metrics of a finished run."""
+    merged_transcript = result.get("transcript", "")
+    summary_text = result.get("summary", "")
+    if result.get("failed"):
+        st.warning(f"⚠️ {result['failed']}/{result.get('chunks', 0)} chunk(s) could not be transcribed")
+    if st.session_state.get('result_key') != result_key:
+        st.session_state['result_key'] = result_key
+        st.session_state['transcript'] = merged_transcript
+        st.session_state['transcript_index'] = TranscriptIndex.from_transcript(merged_transcript)
+        st.session_state['summary'] = summary_text
+    st.header("📝 Merged transcript (preview)")
+    st.text_area("Transcript", merged_transcript[:20000], height=300, help="Showing first 20,000 characters")
+    st.subheader("📋 Summary / Notes (generated)")
+    st.markdown(summary_text)
+    _show_downloads(merged_transcript, summary_text)
+    if result.get("metrics"):
+        _show_metrics(result["metrics"])
+
+
+def _show_queued_job(job, estimated_total=None):
+    """Status of a job processed by worker.py; reruns the script until it finishes."""
+    if job.status == QUEUED:
+        st.info(f"⏳ Queued. Waiting for a worker ({job_queue_counts().get(QUEUED, 0)} job(s) in the queue)...")
+    elif job.status == RUNNING:
+        progress = job.progress or {}
+        done = progress.get("done", 0)
+        total = progress.get("total") or max(estimated_total or done, done, 1)
+        st.progress(min(100, int((done / total) * 100)))
+        st.info(f"⚙️ Processing on worker {job.worker}: {done}/{total} chunk(s) transcribed")
+        rows = [
+            {
+                "Chunk": c["index"] + 1,
+                "Start": format_timestamp(c["start_sec"]).strip("[]"),
+                "Status": "⏯️ restored" if c.get("resumed") else "♻️ cached" if c.get("cached") else "✅ done" if c["ok"] else "⚠️ failed",
+                "Latency (s)": c.get("latency", 0.0),
+            }
+            for c in progress.get("chunks", [])
+        ]
+        if rows:
+            st.dataframe(rows, use_container_width=True)
+        partial = progress.get("partial_transcript")
+        if partial:
+            st.text_area("Transcript so far", partial[-20000:], height=250, help="Showing the last 20,000 characters")
+            st.download_button("⬇️ Partial transcript (TXT)", partial, file_name="transcript_partial.txt",
+                               mime="text/plain", **DOWNLOAD_NO_RERUN)
+    elif job.status == DONE:
+        _show_results(job.key, job.result or {})
+        return
+    else:
+        st.error(f"❌ Processing failed: {job.error}")
+        return
+
+    # Poll: the worker writes progress to the queue, this session just rereads it
+    time.sleep(QUEUE_POLL_SECONDS)
+    _rerun()
+
+
+def _render_stream(pieces, placeholder) -> str:
+    """Show streamed text pieces in `placeholder` as they arrive; returns the full text."""
+    text = ""
+    for piece in pieces:
+        text += piece
+        placeholder.markdown(text + "▌")
+    placeholder.markdown(text)
+    return text
+
+
+def _chunk_status(result) -> str:
+    if result.resumed:
+        return "⏯️ restored"
+    if result.cached:
+        return "♻️ cached"
+    if result.ok:
+        return "✅ done"
+    if result.rate_limited:
+        return "🚫 rate limited"
+    return "⚠️ failed"
+
 st.sidebar.header("Settings")
-chunk_minutes = st.sidebar.slider("Chunk length (minutes)", 1, 10, 5)
+chunk_minutes = st.sidebar.slider("Chunk length (minutes)", 1, 20, 5)
+chunk_codec = st.sidebar.selectbox(
+    "Chunk audio format", ["flac", "opus", "wav"],
+    help="FLAC is lossless and about half the size of WAV; Opus is much smaller but lossy.",
+)
 summary_mode = st.sidebar.selectbox("Summary verbosity", ["concise", "detailed"])
 throttle_seconds = st.sidebar.slider("Throttle between chunk requests (s)", 1, 10, 3)
+split_on_silence = st.sidebar.checkbox("Cut chunks at pauses", value=True,
+                                       help="Move chunk boundaries to the nearest silence so words are not split.")
+skip_silence = st.sidebar.checkbox("Skip dead air", value=False,
+                                   help="Leave out silences longer than 10 seconds (fewer audio seconds uploaded).")
+trim_silence_seconds = st.sidebar.slider(
+    "Cut pauses longer than (s)", 0.0, 10.0, min(max(TRIM_SILENCE_SECONDS, 0.0), 10.0), 0.5,
+    help="0 keeps every pause. Cut pauses are not uploaded; transcript times still match the recording.",
+)
+speedup = st.sidebar.slider(
+    "Speed up speech", 1.0, MAX_SPEEDUP, min(max(AUDIO_SPEEDUP, 1.0), MAX_SPEEDUP), 0.05,
+    help="Upload the audio played faster (pitch preserved). Fewer audio seconds are billed; very high values can cost accuracy.",
+)
+condensing = condense_enabled(trim_silence_seconds, speedup)
+use_cache = st.sidebar.checkbox("Reuse cached transcripts", value=True,
+                                help="Chunks already transcribed with the same model are not sent to Gemini again.")
+concurrency = st.sidebar.slider("Concurrent chunk requests", 1, 8, min(DEFAULT_CONCURRENCY, 8),
+                                help="Higher values finish faster on paid-tier quotas; use 1 on the free tier.")
 
 
 
 # Processing status with better warnings
 processing_warning = st.empty()
 
+# Prometheus metrics for this server process when METRICS_PORT is set
+try:
+    start_metrics_server()
+except OSError as e:
+    st.warning(f"Metrics endpoint not started: {e}")
+
 # Fail early with a clear message if ffmpeg/ffprobe are not available.
 try:
     ensure_ffmpeg_available(raise_on_missing=True)
 except RuntimeError as e:
     st.error(str(e))
     st.stop()
-if st.session_state.get('last_processing_time'):
-    import time
-    time_since_last = time.time() - st.session_state['last_processing_time']
-    if time_since_last < 120:  # Less than 2 minutes
-        processing_warning.warning(
-            f"⚠️ Last processing was {int(time_since_last)} seconds ago. "
-            f"Wait {120 - int(time_since_last)} more seconds to avoid rate limits."
-        )
+# The API quota is shared by every session and worker on this machine; show
+# how long new requests would currently queue for it.
+try:
+    quota_wait = get_quota().estimate_wait(GEMINI_MODEL)
+except Exception:
+    quota_wait = 0
+if quota_wait > 5:
+    processing_warning.warning(
+        f"⚠️ The API quota is busy (shared with other users). "
+        f"New requests will queue for about {int(quota_wait)} seconds."
+    )
 
 # st.markdown("Upload a lecture audio (mp3/wav/m4a/mp4). We'll convert → chunk → upload → transcribe → summarize.")
 
@@ -100,20 +380,20 @@ else:
         st.error("Empty file uploaded. Please select a valid audio file.")
         st.stop()
     
-    # Save to temp file
-    tmp = tempfile.NamedTemporaryFile(delete=False, suffix=f"_{uploaded.name}")
+    # Save to disk once per content hash (reruns reuse the saved copy)
     try:
-        tmp.write(uploaded.getvalue())
-        tmp.flush()
-        uploaded_path = tmp.name
+        digest = upload_digest(uploaded)
+        uploaded_path = saved_upload_path(uploaded, digest)
         st.success(f"Saved uploaded file: {uploaded.name} ({uploaded.size/1024/1024:.1f}MB)")
     except Exception as e:
         st.error(f"Failed to save uploaded file: {e}")
         st.stop()
 
-    # show estimated duration
+    # show estimated duration (probed from headers; decoding happens once, later)
+    audio_source = AudioSource(uploaded_path)
+    dur = None
     try:
-        dur = duration_seconds(uploaded_path)
+        dur = probed_duration(digest, uploaded_path)
         if dur > 3600:  # 1 hour limit
             st.warning(f"Very long audio ({dur // 60}m {dur % 60}s). Consider shorter files for better performance.")
         else:
@@ -121,106 +401,230 @@ else:
     except Exception as e:
         st.warning("Could not determine duration: " + str(e))
 
-    if st.button("Process (convert → chunk → transcribe → summarize)"):
-        # Rate limiting check
-        if st.session_state.get('last_processing_time'):
-            time_since_last = time.time() - st.session_state['last_processing_time']
-            if time_since_last < 120:  # Less than 2 minutes
-                st.error(f"⚠️ **Rate Limit Protection**: Please wait {120 - int(time_since_last)} more seconds before processing again.")
-                st.info("💡 This prevents API rate limit errors. Free tier Google Gemini has strict usage limits.")
-                st.stop()
-        
+    # Look for an unfinished journal of this file with the same settings
+    job_store = JobStore()
+    job_settings = pipeline_job_settings({
+        "model": GEMINI_MODEL,
+        "chunk_minutes": chunk_minutes,
+        "chunk_codec": chunk_codec,
+        "split_on_silence": split_on_silence,
+        "skip_silence": skip_silence,
+        "trim_silence_seconds": trim_silence_seconds,
+        "speedup": speedup,
+    })
+    job_id = make_job_id(digest, job_settings)
+    result_key = f"{job_id}:{summary_mode}"
+    finished = finished_run(result_key)
+    previous_job = job_store.load(job_id)
+    resume_clicked = False
+    if not queue_enabled() and previous_job is not None and not previous_job.is_complete() and previous_job.done_count():
+        st.info(
+            f"⏯️ A previous run of this file stopped after {previous_job.done_count()}/{previous_job.total or len(previous_job.chunks)} "
+            f"chunk(s). Resume to transcribe only the {previous_job.remaining_count()} remaining chunk(s)."
+        )
+        resume_clicked = st.button(f"Resume ({previous_job.remaining_count()} chunk(s) left)")
+
+    if queue_enabled():
+        # Processing runs in worker.py; this session only enqueues and polls,
+        # so a browser disconnect or rerun does not interrupt the job.
+        job_queue = get_job_queue()
+        queued = job_queue.find(result_key)
+        if queued is not None and queued.status == FAILED:
+            st.error(f"❌ The last attempt failed: {queued.error}")
+            queued = None
+        if queued is None and st.button("Queue for processing (convert → chunk → transcribe → summarize)"):
+            queued = job_queue.enqueue(result_key, spool_file(uploaded_path, result_key), dict(
+                job_settings,
+                summary_mode=summary_mode,
+                use_cache=use_cache,
+                concurrency=concurrency,
+                throttle_seconds=throttle_seconds,
+            ))
+        if queued is not None:
+            processing_warning.empty()
+            _show_queued_job(queued, -(-int(dur) // (chunk_minutes * 60)) if dur else None)
+
+    elif st.button("Process (convert → chunk → transcribe → summarize)") or resume_clicked:
         # Validate API key
         if not os.getenv("GEMINI_API_KEY"):
             st.error("GEMINI_API_KEY not found in environment variables!")
             st.stop()
         
-        # Set processing time
-        st.session_state['last_processing_time'] = time.time()
         processing_warning.empty()  # Clear the warning
             
-        wav_path = None
         chunks = []
+        summary_ok = False
+        # Stage timings, bytes, API calls and cache hits of this run (utils.metrics)
+        metrics_scope = contextlib.ExitStack()
+        run_metrics = metrics_scope.enter_context(job_metrics(job_id))
+        # Anything written to disk during the run lives here and is removed with it
+        work_dir = metrics_scope.enter_context(workspace())
+        # Dead-air skipping and condensing need the whole recording up front;
+        # otherwise conversion, chunking and transcription run as one pipeline.
+        pipelined = not skip_silence and not condensing
         try:
-            with st.spinner("Converting and chunking audio..."):
-                try:
-                    wav_path = ensure_wav_mono_16k(uploaded_path)
-                    st.success("✅ Audio converted successfully")
-                except Exception as e:
-                    st.error(f"❌ Conversion failed: {e}")
-                    st.stop()
+            if pipelined:
+                chunks = iter_chunks(
+                    audio_source,
+                    chunk_length_seconds=chunk_minutes * 60,
+                    codec=chunk_codec,
+                    split_on_silence=split_on_silence,
+                    out_dir=work_dir,
+                )
+            else:
+                with st.spinner("Converting and chunking audio..."):
+                    try:
+                        wav_path = ensure_wav_mono_16k(audio_source, out_path=os.path.join(work_dir, "normalized.wav"))
+                        st.success("✅ Audio converted successfully")
+                    except Exception as e:
+                        st.error(f"❌ Conversion failed: {e}")
+                        st.stop()
 
-                try:
-                    chunks = chunk_audio(wav_path, chunk_length_seconds=chunk_minutes * 60)
-                    st.success(f"✅ Created {len(chunks)} chunk(s)")
-                    if len(chunks) > 10:
-                        st.warning("⚠️ Many chunks detected. This will take significant time and API credits.")
-                except Exception as e:
-                    st.error(f"❌ Chunking failed: {e}")
-                    st.stop()
+                    time_map = None
+                    if condensing:
+                        try:
+                            audio_source.release()
+                            condensed_path = os.path.join(work_dir, "condensed.wav")
+                            time_map = condense_wav(wav_path, condensed_path,
+                                                    trim_silence_seconds=trim_silence_seconds, speedup=speedup)
+                            wav_path, audio_source = condensed_path, AudioSource(condensed_path)
+                            st.success(
+                                f"✅ Condensed {format_timestamp(time_map.source_ms // 1000).strip('[]')} of audio to "
+                                f"{format_timestamp(time_map.output_ms // 1000).strip('[]')} "
+                                f"({time_map.saved_fraction:.0%} fewer seconds to upload)"
+                            )
+                        except Exception as e:
+                            st.error(f"❌ {e}")
+                            st.stop()
+
+                    try:
+                        chunks = chunk_audio(
+                            wav_path,
+                            chunk_length_seconds=chunk_minutes * 60,
+                            source=audio_source,
+                            split_on_silence=split_on_silence,
+                            skip_silence=skip_silence,
+                            codec=chunk_codec,
+                            out_dir=work_dir,
+                        )
+                        audio_source.release()  # chunks are encoded; free the decoded samples
+                        if time_map is not None:
+                            chunks = time_map.map_chunks(chunks)  # transcript times of the original recording
+                        st.success(f"✅ Created {len(chunks)} chunk(s)")
+                        if len(chunks) > 10:
+                            st.warning("⚠️ Many chunks detected. This will take significant time and API credits.")
+                    except Exception as e:
+                        st.error(f"❌ Chunking failed: {e}")
+                        st.stop()
 
-            transcripts = []
+            # Journal every chunk result so an interrupted run can be resumed
+            job = job_store.open(job_id, None if pipelined else chunks, settings=job_settings, resume=resume_clicked)
+            if job.done_count():
+                st.info(f"⏯️ Resuming: {job.done_count()} chunk(s) already transcribed")
+
+            # While the pipeline is still producing chunks the total is estimated
+            estimated_total = -(-int(dur) // (chunk_minutes * 60)) if dur else None
             progress_bar = st.progress(0)
             status_placeholder = st.empty()
-            
-            for idx, (chunk_path, start_sec, end_sec) in enumerate(chunks):
-                progress_bar.progress(int((idx / len(chunks)) * 100))
-                status_placeholder.info(f"Processing chunk {idx+1}/{len(chunks)} (start {start_sec//60:02d}:{start_sec%60:02d}) ...")
-                
-                try:
-                    status_placeholder.info(f"Uploading chunk {idx+1}/{len(chunks)}...")
-                    file_obj = upload_file(chunk_path)
-                    status_placeholder.info(f"Transcribing chunk {idx+1}/{len(chunks)}...")
-                    text = transcribe_file(file_obj, model=GEMINI_MODEL)
-                    transcripts.append((start_sec, text))
-                    status_placeholder.success(f"✅ Chunk {idx+1} completed")
-                except Exception as e:
-                    error_msg = str(e)
-                    
-                    # Provide specific guidance for API limit errors
-                    if any(phrase in error_msg.lower() for phrase in [
-                        "api upload limit reached", "quota", "rate limit", "429", 
-                        "too many requests", "resource exhausted"
-                    ]):
-                        st.error(f"🚫 **API Rate Limit Reached!**")
-                        st.error("**What to do:**")
-                        st.error("• ⏱️ Wait 2-3 minutes before trying again")
-                        st.error("• 📏 Use shorter audio files (1-2 minutes)")
-                        st.error("• ⚙️ Increase throttle delay to 5-10 seconds")
-                        st.error("• � Consider upgrading to paid API tier")
-                        st.info("💡 Free tier Google Gemini allows ~15 requests per minute maximum")
-                        st.stop()  # Stop processing entirely
-                    elif "503" in error_msg or "unavailable" in error_msg.lower():
-                        st.warning(f"⚠️ Chunk {idx+1} failed: Google API temporarily unavailable. Try again in a few minutes.")
-                    else:
-                        st.warning(f"⚠️ Chunk {idx+1} failed: {str(e)[:100]}...")
-                    
-                    transcripts.append((start_sec, f"[ERROR: {str(e)[:50]}...]"))
-                
-                if idx < len(chunks) - 1:  # Don't sleep after last chunk
-                    time.sleep(throttle_seconds)
-            
+            if pipelined:
+                status_placeholder.info(f"Converting, chunking and transcribing with up to {concurrency} concurrent request(s)...")
+            else:
+                status_placeholder.info(f"Transcribing {len(chunks)} chunk(s) with up to {concurrency} concurrent request(s)...")
+
+            # Live view: each chunk's text is slotted in at its timestamp as soon as it lands
+            st.subheader("🔴 Live transcript")
+            live_table = st.empty()
+            live_transcript = st.empty()
+            live_results = {}
+
+            def _render_live(done):
+                rows = [
+                    {
+                        "Chunk": r.index + 1,
+                        "Start": format_timestamp(r.start_sec).strip("[]"),
+                        "Status": _chunk_status(r),
+                        "Latency (s)": round(r.latency, 1),
+                        "Attempts": r.attempts,
+                    }
+                    for r in sorted(live_results.values(), key=lambda r: (r.start_sec, r.index))
+                ]
+                live_table.dataframe(rows, use_container_width=True)
+                partial = merge_transcript(live_results.values())
+                with live_transcript.container():
+                    st.text_area("Transcript so far", partial[-20000:], height=250, key=f"live_transcript_{done}",
+                                 help="Showing the last 20,000 characters")
+                    st.download_button("⬇️ Partial transcript (TXT)", partial, file_name="transcript_partial.txt",
+                                       mime="text/plain", key=f"live_download_{done}", **DOWNLOAD_NO_RERUN)
+
+            def _on_chunk_done(result, done, total):
+                total = total or max(estimated_total or done, done)
+                progress_bar.progress(min(100, int((done / total) * 100)))
+                live_results[result.index] = result
+                _render_live(done)
+                if result.resumed:
+                    status_placeholder.success(f"⏯️ Chunk {result.index+1} restored from previous run ({done}/{total})")
+                elif result.cached:
+                    status_placeholder.success(f"♻️ Chunk {result.index+1} loaded from cache ({done}/{total})")
+                elif result.ok:
+                    status_placeholder.success(f"✅ Chunk {result.index+1} completed ({done}/{total})")
+                elif result.rate_limited:
+                    status_placeholder.warning(f"⚠️ Chunk {result.index+1} stopped: API rate limit")
+                elif "503" in result.error or "unavailable" in result.error.lower():
+                    st.warning(f"⚠️ Chunk {result.index+1} failed: Google API temporarily unavailable. Try again in a few minutes.")
+                else:
+                    st.warning(f"⚠️ Chunk {result.index+1} failed: {result.error[:100]}...")
+
+            results = transcribe_chunks(
+                chunks,
+                model=GEMINI_MODEL,
+                concurrency=concurrency,
+                throttle_seconds=throttle_seconds,
+                on_result=_on_chunk_done,
+                cache=get_default_cache() if use_cache else None,
+                job=job,
+            )
+            if pipelined:
+                st.success(f"✅ Created {len(results)} chunk(s)")
+            cached_count = sum(1 for r in results if r.cached)
+            if cached_count:
+                st.info(f"♻️ {cached_count}/{len(results)} chunk(s) served from the transcript cache")
+
+            if any(r.rate_limited for r in results):
+                # Provide specific guidance for API limit errors
+                st.error(f"🚫 **API Rate Limit Reached!**")
+                st.error("**What to do:**")
+                st.error("• ⏱️ Wait 2-3 minutes before trying again")
+                st.error("• 📏 Use shorter audio files (1-2 minutes)")
+                st.error("• ⚙️ Lower concurrency or increase throttle delay to 5-10 seconds")
+                st.error("• � Consider upgrading to paid API tier")
+                st.info(f"💾 Progress saved: {job.done_count()} chunk(s) done. Use **Resume** after waiting to continue.")
+                st.info("💡 Free tier Google Gemini allows ~15 requests per minute maximum")
+                st.stop()  # Stop processing entirely
+
             progress_bar.progress(100)
             status_placeholder.success(f"🎉 All chunks processed!")
 
             # Merge transcripts with simple timestamps
-            merged = []
-            for start, txt in transcripts:
-                merged.append(f"[{start//60:02d}:{start%60:02d}] {txt.strip()}")
-            merged_transcript = "\n\n".join(merged)
-            
+            merged_transcript = merge_transcript(results)
+            live_transcript.empty()  # the full preview below replaces it
+
             # Store in session state for persistent Q&A
             st.session_state['transcript'] = merged_transcript
+            # Build the Q&A passage index once, when the transcript is final
+            st.session_state['transcript_index'] = TranscriptIndex.from_transcript(merged_transcript)
             st.session_state['summary'] = None  # Will be set after summarization
 
             st.header("📝 Merged transcript (preview)")
             st.text_area("Transcript", merged_transcript[:20000], height=300, help="Showing first 20,000 characters")
 
             st.header("🤖 Generate structured notes")
+            st.subheader("📋 Summary / Notes (generated)")
+            summary_placeholder = st.empty()
             with st.spinner("Creating summary..."):
                 try:
-                    summary_text = summarize_text(merged_transcript, mode=summary_mode)
+                    summary_text = _render_stream(stream_summary(merged_transcript, mode=summary_mode), summary_placeholder)
                     st.session_state['summary'] = summary_text  # Store in session
+                    summary_ok = True
                     st.success("✅ Summary generated successfully")
                 except Exception as e:
                     st.error(f"❌ Summarization failed: {e}")
@@ -231,44 +635,46 @@ else:
             st.error(f"❌ Processing failed: {e}")
             st.stop()
         finally:
-            # Simple cleanup with better error handling
-            cleanup_files = []
-            if 'wav_path' in locals() and wav_path and os.path.exists(wav_path):
-                cleanup_files.append(wav_path)
-            if 'chunks' in locals():
-                for chunk_path, _, _ in chunks:
-                    if os.path.exists(chunk_path):
-                        cleanup_files.append(chunk_path)
-            if 'uploaded_path' in locals() and uploaded_path and os.path.exists(uploaded_path):
-                cleanup_files.append(uploaded_path)
-            
-            # Try cleanup once, ignore errors
-            for file_path in cleanup_files:
-                try:
-                    os.unlink(file_path)
-                except:
-                    pass  # Silently ignore cleanup errors
+            metrics_scope.close()  # also removes the workspace
+            run_metrics.save()
 
-        st.subheader("📋 Summary / Notes (generated)")
-        st.markdown(summary_text)
+        st.session_state['result_key'] = result_key
+        if summary_ok:
+            # Later reruns (e.g. asking a question) show this result instead of losing it
+            finished.update(
+                transcript=merged_transcript,
+                summary=summary_text,
+                chunks=len(results),
+                failed=sum(1 for r in results if not r.ok),
+                metrics=run_metrics.to_dict(),
+            )
+        _show_downloads(merged_transcript, summary_text)
+        _show_metrics(run_metrics.to_dict())
+    elif finished:
+        _show_results(result_key, finished)
 
-        # Export options
-        st.markdown("### ⬇️ Download Options")
-        col1, col2, col3, col4 = st.columns(4)
-        
-        with col1:
-            st.download_button("📄 Transcript (TXT)", merged_transcript, file_name="transcript.txt", mime="text/plain")
-        with col2:
-            st.download_button("📝 Notes (MD)", summary_text, file_name="lecture_notes.md", mime="text/markdown")
-        with col3:
-            try:
-                docx_bytes = create_docx_from_text(summary_text)
-                st.download_button("📄 Notes (DOCX)", docx_bytes, file_name="lecture_notes.docx", mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document")
-            except Exception as e:
-                st.error(f"DOCX generation failed: {e}")
-        with col4:
+# Q&A over the last processed transcript (kept in session state across reruns)
+if st.session_state.get('transcript'):
+    st.header("❓ Ask about the lecture")
+    # Gemini is only asked on submit; answers are kept per (result, question)
+    # so slider changes, downloads and queue polling do not re-ask.
+    answers = st.session_state.setdefault('qa_answers', {})
+    with st.form("qa_form"):
+        question = st.text_input("Question", key="qa_question")
+        asked = st.form_submit_button("Ask")
+    question = (question or "").strip()
+    answer_key = (st.session_state.get('result_key'), question)
+    if asked and question and answer_key not in answers:
+        answer_placeholder = st.empty()
+        with st.spinner("Finding the answer..."):
             try:
-                pdf_bytes = create_pdf_from_text(summary_text)
-                st.download_button("📄 Notes (PDF)", pdf_bytes, file_name="lecture_notes.pdf", mime="application/pdf")
+                answers[answer_key] = _render_stream(stream_answer(
+                    st.session_state['transcript'],
+                    question,
+                    model=GEMINI_MODEL,
+                    index=st.session_state.get('transcript_index'),
+                ), answer_placeholder)
             except Exception as e:
-                st.error(f"PDF generation failed: {e}")
+                st.error(f"❌ {e}")
+    elif answer_key in answers:
+        st.markdown(answers[answer_key])
@@ -0,0 +1,302 @@
+#!/usr/bin/env python3
+"""
+Headless batch processing: transcribe and summarize every recording in a
+directory (or listed in a manifest) without the Streamlit UI.
+
+Conversion and chunking are CPU bound and run in a process pool; all API
+calls of all files share one bounded thread pool and the machine-wide quota,
+so a large batch keeps the quota busy without exceeding it. For every input
+a folder with transcript.txt, notes.md, notes.docx, notes.pdf and
+metrics.json is written to the output directory. Finished inputs are skipped on the next run, and an
+interrupted input resumes from its job journal.
+
+Usage:
+    python batch.py lectures/ -o notes/
+    python batch.py --manifest files.txt -o notes/ --api-workers 16
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import hashlib
+import argparse
+import threading
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from dotenv import load_dotenv
+load_dotenv()
+
+DONE_MARKER = ".done.json"
+
+_print_lock = threading.Lock()
+
+
+def log(message: str):
+    with _print_lock:
+        print(f"[{time.strftime('%H:%M:%S')}] {message}", flush=True)
+
+
+def find_inputs(paths, manifest: str = None):
+    """
+    Return (source_path, output_name) pairs. Files inside a directory are named
+    by their path relative to it; other files by their stem, with a short hash
+    of the full path added when two inputs share a stem.
+    """
+    from utils.gemini_client import ALLOWED_EXTENSIONS
+
+    paths = list(paths)
+    if manifest:
+        with open(manifest, "r", encoding="utf-8") as f:
+            paths += [line.strip() for line in f if line.strip() and not line.strip().startswith("#")]
+
+    entries = []
+    for p in paths:
+        p = Path(p)
+        if p.is_dir():
+            for f in sorted(p.rglob("*")):
+                if f.is_file() and f.suffix.lower() in ALLOWED_EXTENSIONS:
+                    entries.append((f, str(f.relative_to(p).with_suffix(""))))
+        elif p.is_file():
+            entries.append((p, p.stem))
+        else:
+            log(f"⚠️ Skipping {p}: not found")
+
+    counts = {}
+    for _, name in entries:
+        counts[name] = counts.get(name, 0) + 1
+    inputs = []
+    for src, name in entries:
+        if counts[name] > 1:
+            name = f"{name}-{hashlib.sha1(str(src.resolve()).encode()).hexdigest()[:8]}"
+        inputs.append((str(src), name))
+    return inputs
+
+
+def prepare_chunks(src_path: str, work_dir: str, settings: dict):
+    """
+    Convert and chunk one file (runs in a worker process). Returns the chunk
+    list and the metrics recorded meanwhile (they cannot be shared otherwise).
+    """
+    from utils.audio_utils import AudioSource, ensure_wav_mono_16k, chunk_audio
+    from utils.condense import condense_wav, condense_enabled
+    from utils.metrics import job_metrics
+
+    with job_metrics(src_path) as prep_metrics:
+        source = AudioSource(src_path)
+        wav_path = ensure_wav_mono_16k(source, out_path=os.path.join(work_dir, "normalized.wav"))
+        scratch = [wav_path]
+        time_map = None
+        if condense_enabled(settings.get("trim_silence_seconds"), settings.get("speedup")):
+            source.release()
+            condensed_path = os.path.join(work_dir, "condensed.wav")
+            time_map = condense_wav(wav_path, condensed_path,
+                                    trim_silence_seconds=settings["trim_silence_seconds"],
+                                    speedup=settings["speedup"])
+            wav_path, source = condensed_path, AudioSource(condensed_path)
+            scratch.append(wav_path)
+        chunks = chunk_audio(
+            wav_path,
+            chunk_length_seconds=settings["chunk_minutes"] * 60,
+            source=source,
+            split_on_silence=settings["split_on_silence"],
+            skip_silence=settings["skip_silence"],
+            codec=settings["chunk_codec"],
+            # Files, not buffers: chunks of every queued file would otherwise
+            # pile up in memory (and be pickled) until the API catches up
+            in_memory=False,
+            out_dir=work_dir,
+        )
+        source.release()
+        for path in scratch:
+            if os.path.dirname(os.path.abspath(path)) == os.path.abspath(work_dir):
+                os.remove(path)  # only the encoded chunks wait for the API (never remove the input)
+        if time_map is not None:
+            chunks = time_map.map_chunks(chunks)
+    return chunks, prep_metrics.to_dict()
+
+
+def is_done(out_dir: Path, job_id: str) -> bool:
+    try:
+        with open(out_dir / DONE_MARKER, "r", encoding="utf-8") as f:
+            return json.load(f).get("job_id") == job_id
+    except (OSError, ValueError):
+        return False
+
+
+def write_outputs(out_dir: Path, transcript: str, notes: str):
+    from utils.export_utils import create_docx_from_text, create_pdf_from_text
+
+    out_dir.mkdir(parents=True, exist_ok=True)
+    (out_dir / "transcript.txt").write_text(transcript, encoding="utf-8")
+    (out_dir / "notes.md").write_text(notes, encoding="utf-8")
+    (out_dir / "notes.docx").write_bytes(create_docx_from_text(notes).getvalue())
+    (out_dir / "notes.pdf").write_bytes(create_pdf_from_text(notes).getvalue())
+
+
+def process_file(src_path: str, name: str, chunks_future, job_store, job_id: str, args, api_pool, cache, cancel=None):
+    """Transcribe, summarize and export one file once its chunks are ready (runs in a thread)."""
+    from utils.metrics import job_metrics
+
+    try:
+        with job_metrics(job_id) as file_metrics:
+            return _process_file(src_path, name, chunks_future, job_store, job_id, args, api_pool, cache,
+                                 file_metrics, cancel)
+    finally:
+        out_dir = Path(args.output_dir) / name
+        if out_dir.exists():
+            (out_dir / "metrics.json").write_text(file_metrics.to_json(), encoding="utf-8")
+        file_metrics.save()
+
+
+def _process_file(src_path, name, chunks_future, job_store, job_id, args, api_pool, cache, file_metrics, cancel):
+    from utils.transcription import transcribe_chunks, merge_transcript
+    from utils.gemini_client import summarize_text
+
+    out_dir = Path(args.output_dir) / name
+    chunks, prep_metrics = chunks_future.result()
+    file_metrics.merge(prep_metrics)
+    try:
+        job = job_store.open(job_id, chunks, settings=args.settings, resume=True)
+        if job.done_count():
+            log(f"⏯️ {name}: resuming, {job.done_count()}/{len(chunks)} chunk(s) already done")
+        results = transcribe_chunks(
+            chunks, model=args.model, concurrency=args.api_workers,
+            cache=cache, job=job, executor=api_pool, cancel=cancel,
+        )
+    finally:
+        for chunk_dir in {os.path.dirname(c[0]) for c in chunks}:
+            shutil.rmtree(chunk_dir, ignore_errors=True)
+
+    # No summary, outputs or done marker for a partial transcript: the next
+    # run resumes from the journal and retries just the missing chunks.
+    if any(r.rate_limited for r in results):
+        raise Exception("API quota/rate limit exceeded. Progress is saved; run again later to resume.")
+    failed = [r for r in results if not r.ok]
+    if failed:
+        raise Exception(f"{len(failed)}/{len(results)} chunk(s) failed; progress is saved, run again to retry them")
+
+    transcript = merge_transcript(results)
+    notes = summarize_text(transcript, model=args.model, mode=args.mode)
+    write_outputs(out_dir, transcript, notes)
+
+    with open(out_dir / DONE_MARKER, "w", encoding="utf-8") as f:
+        json.dump({"job_id": job_id, "source": src_path, "chunks": len(results), "finished": time.time()}, f)
+    return len(results)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Transcribe and summarize lecture recordings in bulk.")
+    parser.add_argument("inputs", nargs="*", help="Audio/video files or directories (searched recursively)")
+    parser.add_argument("--manifest", help="Text file listing one input path per line")
+    parser.add_argument("-o", "--output-dir", default="batch_output", help="Where to write per-file results")
+    parser.add_argument("--model", default=os.getenv("GEMINI_MODEL", "gemini-2.5-flash"))
+    parser.add_argument("--mode", choices=["concise", "detailed"], default="concise", help="Summary verbosity")
+    parser.add_argument("--chunk-minutes", type=int, default=5)
+    parser.add_argument("--codec", choices=["flac", "opus", "wav"], default=None, help="Chunk codec (default: CHUNK_CODEC or flac)")
+    parser.add_argument("--no-split-on-silence", action="store_true", help="Cut chunks at fixed lengths instead of at pauses")
+    parser.add_argument("--skip-silence", action="store_true", help="Leave out long stretches of dead air")
+    parser.add_argument("--trim-silence", type=float, default=float(os.getenv("TRIM_SILENCE_SECONDS", "0")),
+                        metavar="SECONDS", help="Cut pauses at least this long before uploading (0: off)")
+    parser.add_argument("--speedup", type=float, default=float(os.getenv("AUDIO_SPEEDUP", "1.0")),
+                        help="Speed speech up by this factor before uploading (1.0-2.0)")
+    parser.add_argument("--convert-workers", type=int, default=os.cpu_count() or 2, help="Processes for conversion/chunking")
+    parser.add_argument("--api-workers", type=int, default=8, help="Concurrent API requests across all files")
+    parser.add_argument("--no-cache", action="store_true", help="Do not use the transcript cache")
+    parser.add_argument("--force", action="store_true", help="Reprocess inputs that are already done")
+    args = parser.parse_args(argv)
+    if not args.inputs and not args.manifest:
+        parser.error("give at least one input path or --manifest")
+    from utils.pipeline import job_settings
+
+    args.settings = job_settings({
+        "model": args.model,
+        "chunk_minutes": args.chunk_minutes,
+        "chunk_codec": args.codec or os.getenv("CHUNK_CODEC", "flac"),
+        "split_on_silence": not args.no_split_on_silence,
+        "skip_silence": args.skip_silence,
+        "trim_silence_seconds": args.trim_silence,
+        "speedup": args.speedup,
+    })
+    if not 1.0 <= args.speedup <= 2.0:
+        parser.error("--speedup must be between 1.0 and 2.0")
+    return args
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    if not os.getenv("GEMINI_API_KEY"):
+        log("❌ GEMINI_API_KEY not found in environment variables!")
+        return 2
+
+    from utils.jobs import JobStore
+    from utils.transcript_cache import get_default_cache
+    from utils.workspace import workspace
+
+    inputs = find_inputs(args.inputs, args.manifest)
+    job_store = JobStore()
+    cache = None if args.no_cache else get_default_cache()
+
+    todo = []
+    for src, name in inputs:
+        job_id = job_store.job_id_for(src, args.settings)
+        if not args.force and is_done(Path(args.output_dir) / name, job_id):
+            log(f"⏭️ {name}: already done")
+            continue
+        todo.append((src, name, job_id))
+    log(f"📂 {len(inputs)} input(s), {len(todo)} to process")
+    if not todo:
+        return 0
+
+    # Files are converted at most one round ahead of transcription, so the
+    # encoded chunks on disk stay bounded however long the input list is.
+    max_in_flight = 2 * max(1, args.convert_workers)
+    cancel = threading.Event()
+    failures = 0
+    with workspace("voice2notes_batch_") as work_root, \
+            ProcessPoolExecutor(max_workers=max(1, args.convert_workers)) as convert_pool, \
+            ThreadPoolExecutor(max_workers=max(1, args.api_workers), thread_name_prefix="api") as api_pool, \
+            ThreadPoolExecutor(max_workers=max(1, args.convert_workers), thread_name_prefix="file") as file_pool:
+        pending = {}
+        queued = iter(enumerate(todo))
+
+        def submit_next():
+            for i, (src, name, job_id) in queued:
+                work_dir = os.path.join(work_root, str(i))
+                os.makedirs(work_dir, mode=0o700)
+                chunks_future = convert_pool.submit(prepare_chunks, src, work_dir, args.settings)
+                future = file_pool.submit(process_file, src, name, chunks_future, job_store, job_id, args,
+                                          api_pool, cache, cancel)
+                pending[future] = name
+                return
+
+        try:
+            for _ in range(max_in_flight):
+                submit_next()
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = pending.pop(future)
+                    try:
+                        count = future.result()
+                        log(f"✅ {name}: {count} chunk(s) transcribed and summarized")
+                    except Exception as e:
+                        failures += 1
+                        log(f"❌ {name}: {e}")
+                    submit_next()
+        except KeyboardInterrupt:
+            # Leave without waiting for queued files: drop them, and let
+            # in-flight files skip the chunks they have not sent yet.
+            cancel.set()
+            for pool in (convert_pool, file_pool, api_pool):
+                pool.shutdown(wait=False, cancel_futures=True)
+            log("⏹️ Interrupted; finished chunks are journaled and will be resumed")
+            return 130
+
+    log(f"🏁 Done: {len(todo) - failures} succeeded, {failures} failed")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
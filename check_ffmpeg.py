@@ -1,7 +1,8 @@
-from pydub import AudioSegment
 import utils.audio_utils as au
+AudioSegment = au._audio_segment()
 print('AudioSegment.converter ->', getattr(AudioSegment, 'converter', None))
 print('AudioSegment.ffprobe ->', getattr(AudioSegment, 'ffprobe', None))
+print('discovery cache ->', au.FFMPEG_CACHE_PATH)
 try:
     import imageio_ffmpeg
     print('imageio_ffmpeg available:', imageio_ffmpeg.get_ffmpeg_exe())
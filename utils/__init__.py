@@ -5,19 +5,38 @@ like `from utils.audio_utils import ...` work reliably under different
 execution environments (Streamlit runner, Docker, etc.).
 """
 
-# Optionally expose common helpers at package level
-from .audio_utils import ensure_wav_mono_16k, chunk_audio, duration_seconds
-from .gemini_client import upload_file, transcribe_file, summarize_text, answer_question
-from .export_utils import create_docx_from_text, create_pdf_from_text
-
-__all__ = [
-    "ensure_wav_mono_16k",
-    "chunk_audio",
-    "duration_seconds",
-    "upload_file",
-    "transcribe_file",
-    "summarize_text",
-    "answer_question",
-    "create_docx_from_text",
-    "create_pdf_from_text",
-]
+import importlib
+
+# Common helpers exposed at package level. They are imported on first access
+# (PEP 562) so `import utils` stays cheap; the SDK, pydub and the document
+# libraries only load when something actually needs them.
+_EXPORTS = {
+    "ensure_wav_mono_16k": "audio_utils",
+    "chunk_audio": "audio_utils",
+    "duration_seconds": "audio_utils",
+    "AudioSource": "audio_utils",
+    "upload_file": "gemini_client",
+    "transcribe_file": "gemini_client",
+    "summarize_text": "gemini_client",
+    "answer_question": "gemini_client",
+    "stream_summary": "gemini_client",
+    "stream_answer": "gemini_client",
+    "create_docx_from_text": "export_utils",
+    "create_pdf_from_text": "export_utils",
+    "transcribe_chunks": "transcription",
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    module_name = _EXPORTS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f".{module_name}", __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
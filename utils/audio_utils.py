@@ -1,82 +1,134 @@
 # utils/audio_utils.py
+import io
 import os
+import json
 import math
+import wave
 import tempfile
+import shutil
+import threading
+import subprocess
 from pathlib import Path
 import warnings
+import hashlib
+from dataclasses import dataclass
 
-# Try to configure ffmpeg/ffprobe from imageio-ffmpeg BEFORE importing pydub.
-# This prevents pydub from emitting "Couldn't find ffmpeg/ffprobe" warnings
-# during import in environments where system binaries are missing.
-try:
-    import imageio_ffmpeg
-    _img_ffmpeg = imageio_ffmpeg.get_ffmpeg_exe()
-    if _img_ffmpeg:
-        # Set environment variables early so pydub picks them up without warnings
-        os.environ.setdefault("FFMPEG_PATH", _img_ffmpeg)
-        # Try to locate ffprobe next to ffmpeg
-        candidate_probe = os.path.join(os.path.dirname(_img_ffmpeg), "ffprobe")
-        if os.path.exists(candidate_probe):
-            os.environ.setdefault("FFPROBE_PATH", candidate_probe)
-except Exception:
-    # imageio-ffmpeg not available — we'll handle later
-    _img_ffmpeg = None
-
-from pydub import AudioSegment
-from pydub.utils import which
-
-# Allow overriding ffmpeg/ffprobe via environment variables. This helps deployments
-# (Streamlit Cloud, Docker, servers) where system ffmpeg may be missing or in a
-# non-standard location. If environment variables are not set, pydub will try to
-# find ffmpeg/ffprobe on PATH and will emit a RuntimeWarning (the original error
-# you saw). We proactively check and set the paths here for clearer messages.
-_FFMPEG_PATH = os.environ.get("FFMPEG_PATH")
-_FFPROBE_PATH = os.environ.get("FFPROBE_PATH")
-
-if _FFMPEG_PATH:
-    AudioSegment.converter = _FFMPEG_PATH
-else:
-    # if not provided, try to auto-discover; if discovery fails pydub will warn later
-    _found = which("ffmpeg")
-    if _found:
-        AudioSegment.converter = _found
-
-if _FFPROBE_PATH:
-    AudioSegment.ffprobe = _FFPROBE_PATH
-else:
-    _found_probe = which("ffprobe")
-    if _found_probe:
-        AudioSegment.ffprobe = _found_probe
-# Try imageio-ffmpeg as a fallback (works on many cloud platforms when ffmpeg
-# isn't installed system-wide). This avoids the frequent RuntimeWarning and the
-# 'No such file or directory: ffprobe' error during conversions.
-if (not getattr(AudioSegment, "converter", None)) or (not getattr(AudioSegment, "ffprobe", None)):
+from .metrics import instrumented, file_size
+from .workspace import workspace_root
+
+# ffmpeg/ffprobe discovery (and importing pydub) is deferred to first use so
+# the app can render before any of it happens. Discovered paths are cached on
+# disk and reused while the binaries are unchanged. FFMPEG_PATH / FFPROBE_PATH
+# override discovery (useful on Streamlit Cloud, Docker, servers).
+FFMPEG_CACHE_PATH = os.path.join(Path.home(), ".cache", "voice2notes", "ffmpeg.json")
+_ffmpeg_paths = None
+_ffmpeg_lock = threading.Lock()
+
+
+def _binary_stamp(path):
+    """(size, mtime) of an executable, or None if it is missing or not executable."""
+    try:
+        st = os.stat(path)
+    except (OSError, TypeError):
+        return None
+    if not os.path.isfile(path) or not os.access(path, os.X_OK):
+        return None
+    return [st.st_size, st.st_mtime_ns]
+
+
+def _load_ffmpeg_cache():
+    """Cached (ffmpeg, ffprobe), or None if the cache is missing or a binary changed."""
     try:
-        import imageio_ffmpeg
-        # imageio_ffmpeg.get_ffmpeg_exe() provides a bundled ffmpeg binary path
-        _img_ffmpeg = imageio_ffmpeg.get_ffmpeg_exe()
-        if _img_ffmpeg and not getattr(AudioSegment, "converter", None):
-            AudioSegment.converter = _img_ffmpeg
-        # imageio_ffmpeg doesn't always expose ffprobe; try to find ffprobe near ffmpeg
-        if _img_ffmpeg and not getattr(AudioSegment, "ffprobe", None):
-            candidate = os.path.join(os.path.dirname(_img_ffmpeg), "ffprobe")
-            if os.path.exists(candidate):
-                AudioSegment.ffprobe = candidate
+        with open(FFMPEG_CACHE_PATH, "r", encoding="utf-8") as f:
+            cached = json.load(f)
+        entries = [cached["ffmpeg"], cached["ffprobe"]]
     except Exception:
-        # imageio-ffmpeg not available or failed — fall back to warning.
-        pass
-
-if not getattr(AudioSegment, "converter", None) or not getattr(AudioSegment, "ffprobe", None):
-    warnings.warn(
-        "ffmpeg or ffprobe not configured. On Streamlit Cloud install ffmpeg or set FFMPEG_PATH and FFPROBE_PATH environment variables. "
-        "As a workaround, consider adding 'imageio-ffmpeg' to requirements.txt so a bundled ffmpeg is available.",
-        RuntimeWarning,
-    )
+        return None
+    for entry in entries:
+        if entry["path"] and _binary_stamp(entry["path"]) != entry["stamp"]:
+            return None
+    return entries[0]["path"], entries[1]["path"]
+
+
+def _save_ffmpeg_cache(ffmpeg, ffprobe):
+    try:
+        os.makedirs(os.path.dirname(FFMPEG_CACHE_PATH), exist_ok=True)
+        data = {name: {"path": path, "stamp": _binary_stamp(path)}
+                for name, path in (("ffmpeg", ffmpeg), ("ffprobe", ffprobe))}
+        tmp = f"{FFMPEG_CACHE_PATH}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp, FFMPEG_CACHE_PATH)
+    except OSError:
+        pass  # the cache only saves time
+
+
+def _discover_ffmpeg():
+    """Search PATH, then fall back to imageio-ffmpeg's bundled binary."""
+    ffmpeg = shutil.which("ffmpeg")
+    ffprobe = shutil.which("ffprobe")
+    if not ffmpeg or not ffprobe:
+        try:
+            import imageio_ffmpeg
+            bundled = imageio_ffmpeg.get_ffmpeg_exe()
+            if bundled:
+                ffmpeg = ffmpeg or bundled
+                # imageio-ffmpeg doesn't always ship ffprobe; try next to ffmpeg
+                candidate = os.path.join(os.path.dirname(bundled), "ffprobe")
+                if not ffprobe and os.path.exists(candidate):
+                    ffprobe = candidate
+        except Exception:
+            pass
+    return ffmpeg, ffprobe
+
+
+def ffmpeg_paths():
+    """Return (ffmpeg_path, ffprobe_path); either may be None if not found."""
+    global _ffmpeg_paths
+    if _ffmpeg_paths is None:
+        with _ffmpeg_lock:
+            if _ffmpeg_paths is None:
+                env_ffmpeg, env_ffprobe = os.environ.get("FFMPEG_PATH"), os.environ.get("FFPROBE_PATH")
+                if env_ffmpeg and env_ffprobe:
+                    paths = (env_ffmpeg, env_ffprobe)
+                else:
+                    paths = _load_ffmpeg_cache()
+                    if paths is None or not paths[0]:
+                        paths = _discover_ffmpeg()
+                        if paths[0]:
+                            _save_ffmpeg_cache(*paths)
+                    elif not paths[1] and shutil.which("ffprobe"):
+                        # Cheap re-check so installing ffprobe later is noticed
+                        paths = (paths[0], shutil.which("ffprobe"))
+                        _save_ffmpeg_cache(*paths)
+                    paths = (env_ffmpeg or paths[0], env_ffprobe or paths[1])
+                if not all(paths):
+                    warnings.warn(
+                        "ffmpeg or ffprobe not configured. On Streamlit Cloud install ffmpeg or set FFMPEG_PATH and FFPROBE_PATH environment variables. "
+                        "As a workaround, consider adding 'imageio-ffmpeg' to requirements.txt so a bundled ffmpeg is available.",
+                        RuntimeWarning,
+                    )
+                _ffmpeg_paths = paths
+    return _ffmpeg_paths
+
+
+def _audio_segment():
+    """pydub's AudioSegment, imported on first use and pointed at our ffmpeg/ffprobe."""
+    ffmpeg, ffprobe = ffmpeg_paths()
+    with warnings.catch_warnings():
+        # pydub warns at import when ffmpeg isn't on PATH; we configure it explicitly
+        warnings.simplefilter("ignore", RuntimeWarning)
+        from pydub import AudioSegment
+    if ffmpeg:
+        AudioSegment.converter = ffmpeg
+    if ffprobe:
+        AudioSegment.ffprobe = ffprobe
+    return AudioSegment
+
 
 def ffmpeg_status():
     """Return (ffmpeg_path, ffprobe_path, ok_bool) where ok_bool is True if both are set."""
-    conv = getattr(AudioSegment, "converter", None)
-    probe = getattr(AudioSegment, "ffprobe", None)
+    conv, probe = ffmpeg_paths()
     return conv, probe, bool(conv and probe)
 
 
@@ -98,69 +150,467 @@ def ensure_ffmpeg_available(raise_on_missing: bool = True):
         " 3) Set environment variables FFMPEG_PATH and FFPROBE_PATH to the full paths of ffmpeg/ffprobe.",
         " 4) Install system ffmpeg on the host (apt/yum/brew or include in your Docker image).",
         "\nCurrent detection:",
-        f"  ffmpeg (pydub AudioSegment.converter) = {conv}",
-        f"  ffprobe (pydub AudioSegment.ffprobe) = {probe}",
+        f"  ffmpeg = {conv}",
+        f"  ffprobe = {probe}",
     ]
     msg = "\n".join(msg_lines)
     if raise_on_missing:
         raise RuntimeError(msg)
     return False
 
-def ensure_wav_mono_16k(src_path: str, out_path: str = None):
+TARGET_SAMPLE_RATE = 16000
+TARGET_CHANNELS = 1
+BYTES_PER_MS = TARGET_SAMPLE_RATE * 2 // 1000  # 16-bit mono 16k PCM
+MAX_DURATION_MS = 3 * 60 * 60 * 1000  # 3 hours (in-memory decoding)
+# Streaming mode keeps memory flat, so much longer recordings are acceptable.
+MAX_STREAMING_DURATION_MS = 10 * 60 * 60 * 1000  # 10 hours
+# Codec used for chunk files that get uploaded. FLAC is lossless at roughly half
+# the size of PCM WAV; Opus is lossy but 5-10x smaller still.
+CHUNK_CODECS = {
+    "wav": {"ext": ".wav", "export": {"format": "wav"}, "ffmpeg": ["-c:a", "pcm_s16le"]},
+    "flac": {"ext": ".flac", "export": {"format": "flac"}, "ffmpeg": ["-c:a", "flac"]},
+    "opus": {
+        "ext": ".ogg",
+        "export": {"format": "ogg", "codec": "libopus", "bitrate": os.environ.get("CHUNK_OPUS_BITRATE", "24k")},
+        "ffmpeg": ["-c:a", "libopus", "-b:a", os.environ.get("CHUNK_OPUS_BITRATE", "24k")],
+    },
+}
+DEFAULT_CHUNK_CODEC = os.environ.get("CHUNK_CODEC", "flac").lower()
+# Keep encoded chunks in memory (EncodedChunk) instead of writing chunk files.
+CHUNKS_IN_MEMORY = os.environ.get("CHUNKS_IN_MEMORY", "1").strip().lower() in ("1", "true", "yes")
+# Above this duration conversion/chunking switch to ffmpeg streaming automatically.
+STREAMING_THRESHOLD_MS = int(float(os.environ.get("AUDIO_STREAMING_THRESHOLD_MINUTES", "30")) * 60 * 1000)
+
+
+@dataclass
+class EncodedChunk:
+    """
+    An encoded chunk held in memory. It takes the place of the chunk file path
+    in (chunk, start_seconds, end_seconds) tuples; audio_part, upload_file and
+    the transcript cache accept either.
+    """
+    name: str  # file name the chunk would have on disk, e.g. chunk_0003_900_1200.flac
+    data: bytes
+    pcm_sha256: str  # pcm_fingerprint() of the chunk's samples, computed before encoding
+
+    @property
+    def ext(self) -> str:
+        return os.path.splitext(self.name)[1].lower()
+
+    def __str__(self):
+        return self.name
+
+
+def encode_chunk(pcm, name: str, codec: str = None) -> EncodedChunk:
+    """Encode mono 16k s16le PCM with `codec` through ffmpeg pipes (nothing touches disk)."""
+    spec = _chunk_codec(codec)
+    fingerprint = hashlib.sha256(f"{TARGET_SAMPLE_RATE}:{TARGET_CHANNELS}:2".encode())
+    fingerprint.update(pcm)
+    if spec["ext"] == ".wav":
+        bio = io.BytesIO()
+        with wave.open(bio, "wb") as w:
+            w.setnchannels(TARGET_CHANNELS)
+            w.setsampwidth(2)
+            w.setframerate(TARGET_SAMPLE_RATE)
+            w.writeframes(pcm)
+        data = bio.getvalue()
+    else:
+        converter = ffmpeg_paths()[0]
+        if not converter:
+            raise RuntimeError("ffmpeg not configured")
+        proc = subprocess.run(
+            [converter, "-hide_banner", "-nostdin", "-loglevel", "error",
+             "-f", "s16le", "-ac", str(TARGET_CHANNELS), "-ar", str(TARGET_SAMPLE_RATE), "-i", "pipe:0"]
+            + spec["ffmpeg"] + ["-f", spec["export"]["format"], "pipe:1"],
+            input=pcm, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+        )
+        if proc.returncode != 0:
+            err = proc.stderr.decode("utf-8", errors="replace").strip()[-500:]
+            raise RuntimeError(f"ffmpeg exited with code {proc.returncode}: {err}")
+        data = proc.stdout
+    return EncodedChunk(name=name + spec["ext"], data=data, pcm_sha256=fingerprint.hexdigest())
+
+
+def _probe_wav_header(path: str):
+    """Read duration/format from a RIFF WAV header without decoding samples."""
+    with wave.open(path, "rb") as w:
+        frames = w.getnframes()
+        rate = w.getframerate()
+        return {
+            "duration_ms": int(frames * 1000 / rate) if rate else 0,
+            "sample_rate": rate,
+            "channels": w.getnchannels(),
+            "codec": "pcm_s%dle" % (w.getsampwidth() * 8),
+        }
+
+
+def _probe_ffprobe(path: str):
+    """Read duration/format from container headers with ffprobe (no decode)."""
+    probe = ffmpeg_paths()[1]
+    if not probe:
+        raise RuntimeError("ffprobe not configured")
+    cmd = [
+        probe, "-v", "error",
+        "-select_streams", "a:0",
+        "-show_entries", "format=duration:stream=duration,sample_rate,channels,codec_name",
+        "-of", "json", path,
+    ]
+    out = subprocess.run(cmd, capture_output=True, check=True, timeout=30).stdout
+    data = json.loads(out or b"{}")
+    streams = data.get("streams") or []
+    if not streams:
+        raise ValueError("No audio stream found")
+    stream = streams[0]
+    duration = stream.get("duration") or data.get("format", {}).get("duration")
+    if duration in (None, "N/A"):
+        raise ValueError("Container does not report a duration")
+    return {
+        "duration_ms": int(float(duration) * 1000),
+        "sample_rate": int(stream.get("sample_rate") or 0),
+        "channels": int(stream.get("channels") or 0),
+        "codec": stream.get("codec_name"),
+    }
+
+
+class AudioSource:
+    """
+    Handle on a source audio file that is probed cheaply and decoded at most once.
+
+    Metadata comes from the WAV header or ffprobe, so `duration_seconds()` does
+    not decode anything. `normalized()` decodes and resamples to mono 16k once and
+    caches the result, so conversion and chunking can share the same samples.
+    """
+
+    def __init__(self, path: str):
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"Audio file not found: {path}")
+        self.path = os.path.abspath(path)
+        self._info = None
+        self._normalized = None
+
+    def probe(self):
+        """Return dict with duration_ms, sample_rate, channels and codec."""
+        if self._info is None:
+            info = None
+            try:
+                info = _probe_wav_header(self.path)
+            except Exception:
+                pass
+            if info is None:
+                try:
+                    info = _probe_ffprobe(self.path)
+                except Exception:
+                    # Headers are missing or unreadable: fall back to decoding once.
+                    audio = self.normalized()
+                    info = {
+                        "duration_ms": len(audio),
+                        "sample_rate": audio.frame_rate,
+                        "channels": audio.channels,
+                        "codec": None,
+                    }
+            self._info = info
+        return self._info
+
+    @property
+    def duration_ms(self) -> int:
+        if self._normalized is not None:
+            return len(self._normalized)
+        return self.probe()["duration_ms"]
+
+    def duration_seconds(self) -> int:
+        return math.ceil(self.duration_ms / 1000)
+
+    def is_normalized_format(self) -> bool:
+        """True if the file already is 16-bit mono 16k PCM WAV."""
+        info = self.probe()
+        return (info.get("sample_rate") == TARGET_SAMPLE_RATE
+                and info.get("channels") == TARGET_CHANNELS
+                and info.get("codec") == "pcm_s16le")
+
+    def normalized(self):
+        """Decode once and return the mono 16k AudioSegment (cached)."""
+        if self._normalized is None:
+            self._normalized = _audio_segment()(
+                data=decode_pcm(self.path), sample_width=2,
+                frame_rate=TARGET_SAMPLE_RATE, channels=TARGET_CHANNELS,
+            )
+        return self._normalized
+
+    @property
+    def is_decoded(self) -> bool:
+        return self._normalized is not None
+
+    def release(self):
+        """Drop decoded samples to free memory; metadata stays cached."""
+        self._normalized = None
+
+
+def _as_source(src):
+    return src if isinstance(src, AudioSource) else AudioSource(src)
+
+
+def _use_streaming(streaming, duration_ms: int) -> bool:
+    """Resolve the `streaming` argument: None means decide by duration."""
+    if streaming is None:
+        return duration_ms > STREAMING_THRESHOLD_MS
+    return bool(streaming)
+
+
+def _run_ffmpeg(args):
+    """Run ffmpeg with `args`; raise RuntimeError with the stderr tail on failure."""
+    converter = ffmpeg_paths()[0]
+    if not converter:
+        raise RuntimeError("ffmpeg not configured")
+    cmd = [converter, "-hide_banner", "-nostdin", "-loglevel", "error", "-y"] + list(args)
+    proc = subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    if proc.returncode != 0:
+        err = proc.stderr.decode("utf-8", errors="replace").strip()[-500:]
+        raise RuntimeError(f"ffmpeg exited with code {proc.returncode}: {err}")
+
+
+def decode_pcm(src_path: str, max_duration_ms: int = MAX_DURATION_MS) -> bytearray:
+    """
+    Decode `src_path` to mono 16k s16le PCM with ffmpeg, which also does the
+    resampling. The file is read by ffmpeg, not Python, and the samples are
+    collected from its stdout in fixed-size blocks, so neither the encoded
+    file nor intermediate WAV copies are held in memory. The buffer is
+    returned as is (not copied to bytes), which would double the peak.
+    """
+    converter = ffmpeg_paths()[0]
+    if not converter:
+        raise RuntimeError("ffmpeg not configured")
+    stderr = tempfile.TemporaryFile()
+    proc = subprocess.Popen(
+        [converter, "-hide_banner", "-nostdin", "-loglevel", "error", "-i", src_path,
+         "-vn", "-ac", str(TARGET_CHANNELS), "-ar", str(TARGET_SAMPLE_RATE), "-f", "s16le", "-"],
+        stdout=subprocess.PIPE, stderr=stderr,
+    )
+    buf = bytearray()
+    block = memoryview(bytearray(1 << 20))
+    try:
+        while True:
+            n = proc.stdout.readinto(block)
+            if not n:
+                break
+            buf += block[:n]
+            if len(buf) > max_duration_ms * BYTES_PER_MS:
+                raise ValueError(f"Audio file too long (max {max_duration_ms // 60000} minutes)")
+        if proc.wait() != 0:
+            stderr.seek(0)
+            err = stderr.read().decode("utf-8", errors="replace").strip()[-500:]
+            raise RuntimeError(f"ffmpeg exited with code {proc.returncode}: {err}")
+    finally:
+        if proc.poll() is None:
+            proc.kill()
+            proc.wait()
+        proc.stdout.close()
+        stderr.close()
+    return buf
+
+
+def stream_convert_wav_mono_16k(src_path: str, out_path: str):
+    """
+    Resample `src_path` to mono 16k PCM WAV entirely inside ffmpeg.
+    Samples never enter Python, so memory use is constant in the input length.
+    """
+    _run_ffmpeg([
+        "-i", src_path,
+        "-vn", "-ac", str(TARGET_CHANNELS), "-ar", str(TARGET_SAMPLE_RATE),
+        "-c:a", "pcm_s16le", "-f", "wav", out_path,
+    ])
+    return out_path
+
+
+def _chunk_codec(codec: str):
+    codec = (codec or DEFAULT_CHUNK_CODEC).lower()
+    if codec not in CHUNK_CODECS:
+        raise ValueError(f"Unsupported chunk codec: {codec}. Allowed: {', '.join(CHUNK_CODECS)}")
+    return CHUNK_CODECS[codec]
+
+
+def stream_segment_wav(wav_path: str, plan, out_dir: str, codec: str = None):
+    """
+    Cut a PCM WAV into the planned (start_ms, end_ms) pieces with ffmpeg's
+    segment muxer in a single pass, encoding them with `codec`. Gaps between
+    planned pieces (skipped silence) are cut out and deleted.
+    Returns list of (chunk_path, start_seconds, end_seconds), same as chunk_audio.
+    """
+    spec = _chunk_codec(codec)
+    total_ms = plan[-1][1]
+    points = sorted({p for chunk in plan for p in chunk} - {0, total_ms})
+    pattern = os.path.join(out_dir, "segment_%04d" + spec["ext"])
+    args = ["-i", wav_path, "-t", f"{total_ms / 1000:.3f}", "-f", "segment"]
+    if points:
+        args += ["-segment_times", ",".join(f"{p / 1000:.3f}" for p in points)]
+    else:
+        args += ["-segment_time", f"{total_ms / 1000 + 1:.3f}"]
+    _run_ffmpeg(args + ["-reset_timestamps", "1"] + spec["ffmpeg"] + [pattern])
+
+    bounds = [0] + points + [total_ms]
+    wanted = {start: end for start, end in plan}
+    chunks = []
+    for seg_idx in range(len(bounds) - 1):
+        seg_path = os.path.join(out_dir, f"segment_{seg_idx:04d}{spec['ext']}")
+        start = bounds[seg_idx]
+        if not os.path.exists(seg_path):
+            continue
+        if wanted.get(start) != bounds[seg_idx + 1]:
+            os.unlink(seg_path)  # skipped silence
+            continue
+        end = bounds[seg_idx + 1]
+        idx = len(chunks)
+        # Rename to the same naming scheme the in-memory path uses
+        chunk_path = os.path.join(out_dir, f"chunk_{idx:04d}_{start//1000}_{end//1000}{spec['ext']}")
+        os.replace(seg_path, chunk_path)
+        chunks.append((chunk_path, start // 1000, end // 1000))
+    return chunks
+
+
+def fixed_chunk_plan(total_ms: int, chunk_ms: int):
+    """
+    Plan fixed-length (start_ms, end_ms) chunks. A trailing remainder shorter
+    than one second is merged into the last chunk rather than dropped.
+    """
+    plan = []
+    pos = 0
+    while total_ms - pos > chunk_ms and total_ms - (pos + chunk_ms) >= 1000:
+        plan.append((pos, pos + chunk_ms))
+        pos += chunk_ms
+    if total_ms - pos >= 1000:
+        plan.append((pos, total_ms))
+    elif plan:
+        plan[-1] = (plan[-1][0], total_ms)
+    return plan
+
+
+def silence_chunk_plan(wav_path: str, total_ms: int, chunk_ms: int, audio=None,
+                       tolerance_seconds: int = 20, skip_silence: bool = False,
+                       dead_air_seconds: float = 10):
+    """
+    Plan chunks whose boundaries fall in pauses, using energy-based VAD.
+    Energy is computed from `audio` (an AudioSegment) when given, otherwise
+    streamed from the WAV file block by block.
+    """
+    from . import vad  # needs numpy; only loaded when silence splitting is used
+
+    if audio is not None:
+        energies = vad.frame_energies(audio.get_array_of_samples(), audio.frame_rate)
+    else:
+        energies = vad.frame_energies_from_wav(wav_path)
+    return vad.plan_chunks(
+        energies, total_ms, chunk_ms,
+        tolerance_ms=int(tolerance_seconds * 1000),
+        skip_silence=skip_silence,
+        dead_air_ms=int(dead_air_seconds * 1000),
+    )
+
+@instrumented("convert", bytes_in=lambda a, kw: file_size(a[0] if a else kw.get("src_path")), bytes_out=file_size)
+def ensure_wav_mono_16k(src_path, out_path: str = None, streaming: bool = None):
     """
     Convert any audio file to mono 16k WAV (Gemini often works better with 16k mono).
+    `src_path` may be a path or an AudioSource; passing the same AudioSource to
+    chunk_audio afterwards avoids decoding the audio a second time.
+    With `streaming` ffmpeg converts file-to-file with constant memory; None
+    picks streaming for recordings longer than STREAMING_THRESHOLD_MS.
     Returns output path.
     """
-    if not os.path.exists(src_path):
-        raise FileNotFoundError(f"Source audio file not found: {src_path}")
+    source_path = src_path.path if isinstance(src_path, AudioSource) else src_path
+    if not os.path.exists(source_path):
+        raise FileNotFoundError(f"Source audio file not found: {source_path}")
     
     # Security: Validate file path
-    resolved_src = os.path.abspath(src_path)
+    resolved_src = os.path.abspath(source_path)
     if not os.path.isfile(resolved_src):
         raise ValueError("Source path is not a valid file")
     
     try:
+        source = _as_source(src_path)
+
         if out_path is None:
             # Create secure temporary file
-            temp_dir = tempfile.mkdtemp(prefix="voice2notes_")
-            out_path = os.path.join(temp_dir, Path(src_path).stem + "_normalized.wav")
+            temp_dir = tempfile.mkdtemp(prefix="voice2notes_", dir=workspace_root())
+            out_path = os.path.join(temp_dir, Path(source_path).stem + "_normalized.wav")
         
         # Validate output path
         out_dir = os.path.dirname(out_path)
         if not os.path.exists(out_dir):
             os.makedirs(out_dir, mode=0o700)  # Secure permissions
         
-        audio = AudioSegment.from_file(src_path)
+        # Security: Limit audio duration to prevent resource exhaustion.
+        # Checked from the probed headers so oversized files fail before decoding.
+        if source.is_normalized_format():
+            # Already mono 16k PCM WAV: copy the bytes instead of decoding and re-encoding
+            if source.duration_ms > MAX_STREAMING_DURATION_MS:
+                raise ValueError(
+                    f"Audio file too long: {source.duration_ms/1000/60:.1f} minutes "
+                    f"(max {MAX_STREAMING_DURATION_MS // 60000} minutes)"
+                )
+            if source.duration_ms == 0:
+                raise ValueError("Audio file appears to be empty or corrupted")
+            if os.path.abspath(out_path) != source.path:
+                shutil.copyfile(source.path, out_path)
+            return out_path
+
+        if _use_streaming(streaming, source.duration_ms):
+            if source.duration_ms > MAX_STREAMING_DURATION_MS:
+                raise ValueError(
+                    f"Audio file too long: {source.duration_ms/1000/60:.1f} minutes "
+                    f"(max {MAX_STREAMING_DURATION_MS // 60000} minutes)"
+                )
+            stream_convert_wav_mono_16k(source.path, out_path)
+            if os.path.getsize(out_path) <= 44:  # bare WAV header
+                raise ValueError("Audio file appears to be empty or corrupted")
+            return out_path
+
+        if source.duration_ms > MAX_DURATION_MS:
+            raise ValueError(f"Audio file too long: {source.duration_ms/1000/60:.1f} minutes (max 180 minutes)")
+
+        audio = source.normalized()
         
         # Validate audio
         if len(audio) == 0:
             raise ValueError("Audio file appears to be empty or corrupted")
         
-        # Security: Limit audio duration to prevent resource exhaustion
-        max_duration_ms = 3 * 60 * 60 * 1000  # 3 hours
-        if len(audio) > max_duration_ms:
+        if len(audio) > MAX_DURATION_MS:
             raise ValueError(f"Audio file too long: {len(audio)/1000/60:.1f} minutes (max 180 minutes)")
         
-        audio = audio.set_frame_rate(16000).set_channels(1)
         audio.export(out_path, format="wav")
         return out_path
     except Exception as e:
         raise Exception(f"Audio conversion failed: {str(e)}")
 
-def duration_seconds(path: str):
-    """Get duration of audio file in seconds"""
-    if not os.path.exists(path):
-        raise FileNotFoundError(f"Audio file not found: {path}")
+def duration_seconds(path):
+    """Get duration of audio file in seconds (read from headers, no decoding)"""
+    source_path = path.path if isinstance(path, AudioSource) else path
+    if not os.path.exists(source_path):
+        raise FileNotFoundError(f"Audio file not found: {source_path}")
     
     try:
-        audio = AudioSegment.from_file(path)
-        return math.ceil(len(audio) / 1000)
+        return _as_source(path).duration_seconds()
     except Exception as e:
         raise Exception(f"Could not read audio duration: {str(e)}")
 
-def chunk_audio(wav_path: str, chunk_length_seconds: int = 300):
+@instrumented("chunk", bytes_in=lambda a, kw: file_size(a[0] if a else kw.get("wav_path")),
+              bytes_out=lambda chunks: sum(file_size(c[0]) for c in chunks))
+def chunk_audio(wav_path: str, chunk_length_seconds: int = 300, source: AudioSource = None,
+                streaming: bool = None, split_on_silence: bool = False,
+                silence_tolerance_seconds: int = 20, skip_silence: bool = False,
+                dead_air_seconds: float = 10, codec: str = None,
+                in_memory: bool = None, out_dir: str = None):
     """
     Splits wav_path into chunks of chunk_length_seconds.
+    If `source` is the AudioSource that produced wav_path, its already decoded
+    samples are sliced instead of reading the WAV back from disk.
+    With `streaming` ffmpeg's segment muxer splits the file without loading it;
+    None picks streaming for recordings longer than STREAMING_THRESHOLD_MS.
+    With `split_on_silence` each boundary moves to the nearest pause within
+    `silence_tolerance_seconds`; `skip_silence` also leaves out stretches of
+    silence longer than `dead_air_seconds`.
+    Chunk files are encoded with `codec` ("flac", "opus" or "wav"; default
+    CHUNK_CODEC env var, else "flac") to keep upload sizes down.
+    With `in_memory` (default CHUNKS_IN_MEMORY) chunks are EncodedChunk buffers
+    instead of files; streaming mode always writes files, into `out_dir`
+    (default: a new directory under the workspace root).
     Returns list of (chunk_path, start_seconds, end_seconds).
     """
     if not os.path.exists(wav_path):
@@ -173,42 +623,168 @@ def chunk_audio(wav_path: str, chunk_length_seconds: int = 300):
     if chunk_length_seconds > 3600:  # 1 hour max per chunk
         raise ValueError("Chunk length too large (max 3600 seconds)")
     
+    spec = _chunk_codec(codec)
+
     try:
-        audio = AudioSegment.from_file(wav_path)
-        total_ms = len(audio)
+        if source is None or not source.is_decoded:
+            # Nothing decoded yet: work from the normalized WAV's own header
+            source = AudioSource(wav_path)
+
+        stream = _use_streaming(streaming, source.duration_ms)
+        audio = None if stream else source.normalized()
+        total_ms = source.duration_ms
         
         if total_ms == 0:
             raise ValueError("Audio file is empty")
         
         chunk_ms = chunk_length_seconds * 1000
-        chunks = []
-        
-        # Create secure temporary directory
-        tmpdir = Path(tempfile.mkdtemp(prefix="voice2notes_chunks_"))
-        
-        start = 0
-        idx = 0
-        
+        if split_on_silence or skip_silence:
+            plan = silence_chunk_plan(
+                wav_path, total_ms, chunk_ms, audio=audio,
+                tolerance_seconds=silence_tolerance_seconds if split_on_silence else 0,
+                skip_silence=skip_silence, dead_air_seconds=dead_air_seconds,
+            )
+        else:
+            plan = fixed_chunk_plan(total_ms, chunk_ms)
+
         # Security: Limit number of chunks to prevent resource exhaustion
         max_chunks = 1000
-        
-        while start < total_ms and idx < max_chunks:
-            end = min(start + chunk_ms, total_ms)
+        if len(plan) > max_chunks:
+            raise ValueError(f"Too many chunks generated (max {max_chunks})")
+        if not plan:
+            return []
+
+        if in_memory is None:
+            in_memory = CHUNKS_IN_MEMORY
+        if not stream and in_memory:
+            return [
+                (encode_chunk(audio[start:end].raw_data, f"chunk_{idx:04d}_{start//1000}_{end//1000}", codec),
+                 start // 1000, end // 1000)
+                for idx, (start, end) in enumerate(plan)
+            ]
+
+        # Create secure temporary directory
+        tmpdir = Path(out_dir or tempfile.mkdtemp(prefix="voice2notes_chunks_", dir=workspace_root()))
+
+        if stream:
+            return stream_segment_wav(wav_path, plan, str(tmpdir), codec=codec)
+
+        chunks = []
+        for idx, (start, end) in enumerate(plan):
             chunk = audio[start:end]
-            
-            # Skip very short chunks (less than 1 second)
-            if len(chunk) < 1000:
-                break
-                
-            chunk_path = tmpdir / f"chunk_{idx:04d}_{start//1000}_{end//1000}.wav"
-            chunk.export(chunk_path, format="wav")
+            chunk_path = tmpdir / f"chunk_{idx:04d}_{start//1000}_{end//1000}{spec['ext']}"
+            chunk.export(chunk_path, **spec["export"])
             chunks.append((str(chunk_path), start // 1000, end // 1000))
-            idx += 1
-            start += chunk_ms
-        
-        if idx >= max_chunks:
-            raise ValueError(f"Too many chunks generated (max {max_chunks})")
             
         return chunks
     except Exception as e:
         raise Exception(f"Audio chunking failed: {str(e)}")
+
+
+def _plan_buffer(buf, chunk_ms: int, split_on_silence: bool, tolerance_ms: int):
+    """Chunk plan for the PCM currently held by iter_chunks' ring buffer."""
+    total_ms = len(buf) // BYTES_PER_MS
+    if not split_on_silence:
+        return fixed_chunk_plan(total_ms, chunk_ms)
+    from . import vad
+    import numpy as np
+    energies = vad.frame_energies(np.frombuffer(bytes(buf), dtype="<i2"), TARGET_SAMPLE_RATE)
+    return vad.plan_chunks(energies, total_ms, chunk_ms, tolerance_ms=tolerance_ms)
+
+
+@instrumented("convert_chunk", bytes_in=lambda a, kw: file_size(a[0] if a else kw.get("src_path")),
+              bytes_out=lambda chunk: file_size(chunk[0]))
+def iter_chunks(src_path, chunk_length_seconds: int = 300, codec: str = None,
+                split_on_silence: bool = False, silence_tolerance_seconds: int = 20,
+                out_dir: str = None, in_memory: bool = None):
+    """
+    Pipelined conversion + chunking: yield (chunk_path, start_seconds, end_seconds)
+    as soon as each chunk is encoded, while ffmpeg is still decoding the rest.
+
+    ffmpeg decodes `src_path` straight to mono 16k PCM on a pipe; only a ring
+    buffer of about one chunk plus the silence tolerance is held in memory, so
+    time-to-first-chunk and memory use do not grow with the recording length.
+    Boundaries are the same as chunk_audio's fixed or split_on_silence plans
+    (dead-air skipping needs the whole file and is not available here).
+    Closing the generator early stops ffmpeg. With `in_memory` (default
+    CHUNKS_IN_MEMORY) chunks are yielded as EncodedChunk buffers, otherwise
+    they are written to `out_dir`.
+    """
+    src = src_path.path if isinstance(src_path, AudioSource) else src_path
+    if not os.path.exists(src):
+        raise FileNotFoundError(f"Source audio file not found: {src}")
+    if chunk_length_seconds <= 0:
+        raise ValueError("Chunk length must be positive")
+    if chunk_length_seconds > 3600:  # 1 hour max per chunk
+        raise ValueError("Chunk length too large (max 3600 seconds)")
+    converter = ffmpeg_paths()[0]
+    if not converter:
+        raise RuntimeError("ffmpeg not configured")
+
+    spec = _chunk_codec(codec)
+    chunk_ms = chunk_length_seconds * 1000
+    tolerance_ms = silence_tolerance_seconds * 1000 if split_on_silence else 0
+    # Only cut once the buffer can hold a full window plus a 1 s minimum remainder
+    decide_bytes = (chunk_ms + tolerance_ms + 1000) * BYTES_PER_MS
+    if in_memory is None:
+        in_memory = CHUNKS_IN_MEMORY
+    if out_dir is None and not in_memory:
+        out_dir = tempfile.mkdtemp(prefix="voice2notes_chunks_", dir=workspace_root())
+
+    stderr = tempfile.TemporaryFile()
+    proc = subprocess.Popen(
+        [converter, "-hide_banner", "-nostdin", "-loglevel", "error", "-i", src,
+         "-vn", "-ac", str(TARGET_CHANNELS), "-ar", str(TARGET_SAMPLE_RATE), "-f", "s16le", "-"],
+        stdout=subprocess.PIPE, stderr=stderr,
+    )
+
+    buf = bytearray()
+    buf_start_ms = 0
+    idx = 0
+
+    def emit(start_ms, end_ms):
+        nonlocal idx
+        if idx >= 1000:
+            raise ValueError("Too many chunks generated (max 1000)")
+        data = bytes(buf[start_ms * BYTES_PER_MS:end_ms * BYTES_PER_MS])
+        abs_start, abs_end = buf_start_ms + start_ms, buf_start_ms + end_ms
+        name = f"chunk_{idx:04d}_{abs_start//1000}_{abs_end//1000}"
+        if in_memory:
+            chunk = encode_chunk(data, name, codec)
+        else:
+            chunk = os.path.join(out_dir, name + spec["ext"])
+            _audio_segment()(data=data, sample_width=2, frame_rate=TARGET_SAMPLE_RATE,
+                             channels=TARGET_CHANNELS).export(chunk, **spec["export"])
+        idx += 1
+        return chunk, abs_start // 1000, abs_end // 1000
+
+    try:
+        while True:
+            block = proc.stdout.read(1 << 16)
+            if block:
+                buf += block
+                if buf_start_ms + len(buf) // BYTES_PER_MS > MAX_STREAMING_DURATION_MS:
+                    raise ValueError(f"Audio file too long (max {MAX_STREAMING_DURATION_MS // 60000} minutes)")
+            while len(buf) >= decide_bytes:
+                start_ms, end_ms = _plan_buffer(buf, chunk_ms, split_on_silence, tolerance_ms)[0]
+                yield emit(start_ms, end_ms)
+                del buf[:end_ms * BYTES_PER_MS]
+                buf_start_ms += end_ms
+            if not block:
+                break
+
+        if proc.wait() != 0:
+            stderr.seek(0)
+            err = stderr.read().decode("utf-8", errors="replace").strip()[-500:]
+            raise RuntimeError(f"ffmpeg exited with code {proc.returncode}: {err}")
+        if buf_start_ms == 0 and not buf:
+            raise ValueError("Audio file appears to be empty or corrupted")
+
+        for start_ms, end_ms in _plan_buffer(buf, chunk_ms, split_on_silence, tolerance_ms):
+            yield emit(start_ms, end_ms)
+    finally:
+        if proc.poll() is None:
+            proc.kill()
+            proc.wait()
+        proc.stdout.close()
+        stderr.close()
@@ -0,0 +1,163 @@
+# utils/condense.py
+"""Billed-audio reduction: cut long pauses and optionally speed speech up.
+
+Runs on the normalized mono 16k WAV, before chunking. Every second that is
+not uploaded saves latency and audio tokens. The condensed audio is shorter
+than the recording, so a TimeMap records where each kept piece came from.
+Chunk boundaries are mapped back through it, which keeps the transcript's
+[mm:ss] markers in the time of the original recording. Timestamps the model
+writes inside a chunk's text are not mapped.
+"""
+import os
+import wave
+import bisect
+import tempfile
+import subprocess
+from dataclasses import dataclass, field
+
+from .audio_utils import ffmpeg_paths, TARGET_SAMPLE_RATE, TARGET_CHANNELS, BYTES_PER_MS
+from .metrics import instrumented, file_size
+from . import metrics
+
+# Pauses at least this long are cut (0 disables trimming).
+TRIM_SILENCE_SECONDS = float(os.getenv("TRIM_SILENCE_SECONDS", "0"))
+# Playback speed for uploaded audio (1.0 disables the speed-up).
+AUDIO_SPEEDUP = float(os.getenv("AUDIO_SPEEDUP", "1.0"))
+MAX_SPEEDUP = 2.0
+# Silence kept on each side of a cut pause, so words are not clipped.
+TRIM_PAD_MS = 250
+
+
+@dataclass
+class TimeMap:
+    """Maps positions in condensed audio back to the original recording."""
+    source_ms: int
+    segments: list = field(default_factory=list)  # kept (start_ms, end_ms) of the source, in order
+    speedup: float = 1.0
+
+    def __post_init__(self):
+        self._offsets = []  # start of each segment in the trimmed (not yet sped up) audio
+        pos = 0
+        for start, end in self.segments:
+            self._offsets.append(pos)
+            pos += end - start
+
+    @property
+    def kept_ms(self) -> int:
+        return sum(end - start for start, end in self.segments)
+
+    @property
+    def output_ms(self) -> int:
+        return int(self.kept_ms / self.speedup)
+
+    @property
+    def saved_fraction(self) -> float:
+        return 1 - self.output_ms / self.source_ms if self.source_ms else 0.0
+
+    def to_source_ms(self, out_ms: int) -> int:
+        """Position in the recording of `out_ms` in the condensed audio."""
+        if not self.segments:
+            return 0
+        trimmed_ms = out_ms * self.speedup
+        i = max(0, bisect.bisect_right(self._offsets, trimmed_ms) - 1)
+        start, end = self.segments[i]
+        return int(min(start + trimmed_ms - self._offsets[i], end))
+
+    def map_chunks(self, chunks):
+        """
+        (chunk, start_sec, end_sec, audio_seconds) tuples with times mapped to
+        the recording; audio_seconds is the length of the condensed audio that
+        is actually sent (what the API bills).
+        """
+        return [
+            (chunk, self.to_source_ms(start * 1000) // 1000, self.to_source_ms(end * 1000) // 1000, end - start)
+            for chunk, start, end in chunks
+        ]
+
+
+def _copy_frames(w, segments, write, block_ms: int = 10000):
+    """Write the PCM of `segments` from the open wave reader `w` in blocks."""
+    block_frames = TARGET_SAMPLE_RATE * block_ms // 1000
+    for start, end in segments:
+        w.setpos(start * TARGET_SAMPLE_RATE // 1000)
+        remaining = (end - start) * TARGET_SAMPLE_RATE // 1000
+        while remaining > 0:
+            data = w.readframes(min(block_frames, remaining))
+            if not data:
+                break
+            write(data)
+            remaining -= len(data) // 2
+
+
+def _write_condensed(wav_path: str, out_path: str, segments, speedup: float):
+    with wave.open(wav_path, "rb") as w:
+        if speedup == 1.0:
+            with wave.open(out_path, "wb") as out:
+                out.setnchannels(TARGET_CHANNELS)
+                out.setsampwidth(2)
+                out.setframerate(TARGET_SAMPLE_RATE)
+                _copy_frames(w, segments, out.writeframesraw)
+            return
+
+        converter = ffmpeg_paths()[0]
+        if not converter:
+            raise RuntimeError("ffmpeg not configured")
+        stderr = tempfile.TemporaryFile()
+        proc = subprocess.Popen(
+            [converter, "-hide_banner", "-nostdin", "-loglevel", "error", "-y",
+             "-f", "s16le", "-ac", str(TARGET_CHANNELS), "-ar", str(TARGET_SAMPLE_RATE), "-i", "pipe:0",
+             "-af", f"atempo={speedup:g}", "-c:a", "pcm_s16le", "-f", "wav", out_path],
+            stdin=subprocess.PIPE, stderr=stderr,
+        )
+        try:
+            _copy_frames(w, segments, proc.stdin.write)
+            proc.stdin.close()
+            if proc.wait() != 0:
+                stderr.seek(0)
+                err = stderr.read().decode("utf-8", errors="replace").strip()[-500:]
+                raise RuntimeError(f"ffmpeg exited with code {proc.returncode}: {err}")
+        finally:
+            if proc.poll() is None:
+                proc.kill()
+                proc.wait()
+            stderr.close()
+
+
+@instrumented("condense", bytes_in=lambda a, kw: file_size(a[0] if a else kw.get("wav_path")),
+              bytes_out=lambda time_map: time_map.output_ms * BYTES_PER_MS)
+def condense_wav(wav_path: str, out_path: str, trim_silence_seconds: float = TRIM_SILENCE_SECONDS,
+                 speedup: float = AUDIO_SPEEDUP) -> TimeMap:
+    """
+    Write `wav_path` (mono 16k PCM WAV) to `out_path` without pauses of at
+    least `trim_silence_seconds` (0 keeps them) and sped up by `speedup`
+    (pitch-preserving ffmpeg atempo). Returns the TimeMap for the output.
+    """
+    if not 1.0 <= speedup <= MAX_SPEEDUP:
+        raise ValueError(f"Speed-up must be between 1.0 and {MAX_SPEEDUP}")
+    try:
+        with wave.open(wav_path, "rb") as w:
+            if (w.getframerate(), w.getnchannels(), w.getsampwidth()) != (TARGET_SAMPLE_RATE, TARGET_CHANNELS, 2):
+                raise ValueError("Expected a mono 16k 16-bit WAV (see ensure_wav_mono_16k)")
+            source_ms = w.getnframes() * 1000 // TARGET_SAMPLE_RATE
+
+        segments = [(0, source_ms)]
+        if trim_silence_seconds > 0:
+            from . import vad  # needs numpy; only loaded when trimming is used
+            segments = vad.speech_regions(vad.frame_energies_from_wav(wav_path), source_ms,
+                                          int(trim_silence_seconds * 1000), pad_ms=TRIM_PAD_MS)
+        if not segments:
+            raise ValueError("No speech found in the audio")
+
+        _write_condensed(wav_path, out_path, segments, speedup)
+        time_map = TimeMap(source_ms=source_ms, segments=segments, speedup=speedup)
+    except Exception as e:
+        raise Exception(f"Audio condensing failed: {str(e)}")
+
+    metrics.incr("audio_seconds", source_ms / 1000, kind="source")
+    metrics.incr("audio_seconds", time_map.kept_ms / 1000, kind="trimmed")
+    metrics.incr("audio_seconds", time_map.output_ms / 1000, kind="sent")
+    return time_map
+
+
+def condense_enabled(trim_silence_seconds: float, speedup: float) -> bool:
+    return bool(trim_silence_seconds and trim_silence_seconds > 0) or bool(speedup and speedup != 1.0)
@@ -1,14 +1,25 @@
 # utils/export_utils.py
 import io
-from docx import Document
-from fpdf import FPDF
 
+from .metrics import instrumented
+
+
+def _text_bytes(args, kwargs):
+    return len((args[0] if args else kwargs.get("text")) or "")
+
+
+def _buffer_bytes(bio):
+    return len(bio.getvalue())
+
+
+@instrumented("export_docx", bytes_in=_text_bytes, bytes_out=_buffer_bytes)
 def create_docx_from_text(text: str) -> io.BytesIO:
     """Create a DOCX document from text"""
     if not text or not text.strip():
         raise ValueError("Cannot create document from empty text")
     
     try:
+        from docx import Document  # imported on first export; python-docx is slow to load
         doc = Document()
         doc.add_heading("Lecture Notes (Generated)", level=1)
         
@@ -23,12 +34,14 @@ def create_docx_from_text(text: str) -> io.BytesIO:
     except Exception as e:
         raise Exception(f"DOCX creation failed: {str(e)}")
 
+@instrumented("export_pdf", bytes_in=_text_bytes, bytes_out=_buffer_bytes)
 def create_pdf_from_text(text: str) -> io.BytesIO:
     """Create a PDF document from text"""
     if not text or not text.strip():
         raise ValueError("Cannot create PDF from empty text")
     
     try:
+        from fpdf import FPDF
         pdf = FPDF()
         pdf.add_page()
         pdf.set_auto_page_break(auto=True, margin=15)
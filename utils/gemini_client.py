@@ -1,35 +1,66 @@
 # utils/gemini_client.py
+import io
 import os
+import asyncio
+import hashlib
+import weakref
+import itertools
+import threading
 from dotenv import load_dotenv
 load_dotenv()
 
-GEMINI_KEY = os.getenv("GEMINI_API_KEY")
-if not GEMINI_KEY:
-    raise ValueError("GEMINI_API_KEY environment variable is required")
+from .upload_registry import file_sha256, get_default_registry, REGISTRY_ERRORS
+from .quota import get_quota, estimate_text_tokens, AUDIO_TOKENS_PER_SECOND
+from .retry import get_policy, RetryError, CircuitOpenError, QuotaWaitError, RATE_LIMITED, UPLOAD_PENDING
+from . import metrics
+from .metrics import instrumented, file_size
+from .audio_utils import EncodedChunk
 
 MODEL = os.getenv("GEMINI_MODEL", "gemini-2.5-flash")
 
-# Try imports for different SDK variants
+TRANSCRIBE_PROMPT = "Transcribe the audio to plain text. Provide timestamps for major sections if available. Output only spoken text."
+
+# The SDK is imported and the client created on first use (importing
+# google-genai takes a noticeable part of a second).
 _client = None
 _client_type = None
-try:
-    # new SDK: google-genai
-    from google import genai
-    _client = genai.Client(api_key=GEMINI_KEY)
-    _client_type = "google-genai"
-except Exception:
-    try:
-        # older package shape
-        import google.generativeai as genai_old  # type: ignore
-        genai_old.configure(api_key=GEMINI_KEY)
-        _client = genai_old
-        _client_type = "google-generativeai-old"
-    except Exception:
-        raise ImportError("Unable to import a supported Google GenAI SDK. Install 'google-genai'")
+_client_lock = threading.Lock()
+
+
+def _get_client():
+    """Return the SDK client, creating it on first use."""
+    global _client, _client_type
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                api_key = os.getenv("GEMINI_API_KEY")
+                if not api_key:
+                    raise ValueError("GEMINI_API_KEY environment variable is required")
+                try:
+                    # new SDK: google-genai
+                    from google import genai
+                    client = genai.Client(api_key=api_key)
+                    _client_type = "google-genai"
+                except Exception:
+                    try:
+                        # older package shape
+                        import google.generativeai as genai_old  # type: ignore
+                        genai_old.configure(api_key=api_key)
+                        client = genai_old
+                        _client_type = "google-generativeai-old"
+                    except Exception:
+                        raise ImportError("Unable to import a supported Google GenAI SDK. Install 'google-genai'")
+                _client = client
+    return _client
+
+
+def _sdk_type() -> str:
+    _get_client()
+    return _client_type
 
 def _get_model_name(model: str) -> str:
     """Normalize model name for the SDK being used"""
-    if _client_type == "google-genai":
+    if _sdk_type() == "google-genai":
         # New SDK requires models/ prefix
         if not model.startswith("models/"):
             return f"models/{model}"
@@ -38,20 +69,133 @@ def _get_model_name(model: str) -> str:
         # Older SDK uses model name as-is
         return model
 
-def upload_file(path: str):
+# Longest we block waiting for shared quota before giving up on a call.
+QUOTA_MAX_WAIT_SECONDS = float(os.getenv("QUOTA_MAX_WAIT_SECONDS", "900"))
+FILES_QUOTA_SCOPE = "files"
+
+
+def _acquire_quota(scope: str, tokens: int = 0):
+    """Wait for the shared request/token budget of `scope` (see utils.quota)."""
+    try:
+        waited = get_quota().acquire(scope, requests=1, tokens=tokens, timeout=QUOTA_MAX_WAIT_SECONDS)
+        metrics.incr("quota_wait_seconds", waited, scope=scope)
+        return waited
+    except TimeoutError:
+        raise QuotaWaitError("API quota exhausted by other jobs. Please try again in a few minutes.")
+
+
+def _penalize_quota(scope: str, seconds: float):
+    """Tell every process sharing the quota to back off for `seconds`."""
+    try:
+        get_quota().penalize(scope, seconds)
+    except Exception:
+        import time
+        time.sleep(seconds)  # quota store unavailable: back off locally
+
+
+def _count_call(scope: str, tokens: int):
+    metrics.incr("api_calls", scope=scope)
+    if tokens:
+        metrics.incr("api_tokens_estimated", tokens, scope=scope)
+
+
+def _call_api(scope: str, fn, tokens: int = 0):
     """
-    Upload local file to Gemini Files API and return a "file object" that can be used in calls.
-    For google-genai, this returns an object; for the older SDK, adjust accordingly.
+    Run one SDK call under the shared quota and the retry policy (utils.retry).
+    Rate-limit backoff is handed to the shared quota, so every session waits
+    for the server-requested delay instead of sleeping on its own.
     """
-    if not os.path.exists(path):
-        raise FileNotFoundError(f"File not found: {path}")
-    
-    # Security: Validate file path to prevent directory traversal
-    resolved_path = os.path.abspath(path)
-    if not resolved_path.startswith(os.path.abspath(os.path.dirname(path))):
-        raise ValueError("Invalid file path detected")
-    
-    file_size = os.path.getsize(path)
+    def attempt():
+        _acquire_quota(scope, tokens=tokens)
+        _count_call(scope, tokens)
+        return fn()
+
+    def on_backoff(info, delay):
+        metrics.incr("api_retries", scope=scope, kind=info.kind)
+        if info.kind == RATE_LIMITED:
+            _penalize_quota(scope, delay)
+            return True  # the next _acquire_quota blocks for the delay
+        return False
+
+    return get_policy().call(attempt, scope=scope, on_backoff=on_backoff)
+
+
+def _friendly_api_error(e: Exception, action: str) -> Exception:
+    """Turn a failed call into the user-facing exception raised by this module."""
+    if isinstance(e, (CircuitOpenError, QuotaWaitError)):
+        return Exception(str(e))
+    if isinstance(e, RetryError):
+        if e.info.kind == UPLOAD_PENDING:
+            return Exception("API upload limit reached. Free tier users: wait 2-3 minutes before trying again.")
+        if e.info.kind == RATE_LIMITED:
+            return Exception("API quota/rate limit exceeded. Free tier users: wait 2-3 minutes and use shorter audio files.")
+        return Exception("API temporarily unavailable. Please try again in 2-3 minutes.")
+    return Exception(f"{action} failed: {str(e)}")
+
+
+def _get_remote_file(name: str):
+    """Fetch a Files API handle by name; returns None if it is gone or not ACTIVE."""
+    try:
+        if _sdk_type() == "google-genai":
+            f = _call_api(FILES_QUOTA_SCOPE, lambda: _get_client().files.get(name=name))
+        else:
+            f = _call_api(FILES_QUOTA_SCOPE, lambda: _get_client().get_file(name))
+    except Exception:
+        return None
+    state = getattr(f, "state", None)
+    state = getattr(state, "name", state)
+    if state and str(state).upper() != "ACTIVE":
+        return None
+    return f
+
+
+def _reuse_uploaded(content_hash: str):
+    """Return a still-live remote handle for identical bytes uploaded earlier."""
+    entry = get_default_registry().lookup(content_hash)
+    if not entry:
+        return None
+    f = _get_remote_file(entry["name"])
+    if f is None:
+        get_default_registry().forget(content_hash)
+    return f
+
+
+# Inline requests are capped at 20MB in total; stay well below to leave room
+# for the prompt and request overhead.
+INLINE_MAX_BYTES = int(float(os.getenv("GEMINI_INLINE_MAX_MB", "8")) * 1024 * 1024)
+
+ALLOWED_EXTENSIONS = {'.wav', '.flac', '.mp3', '.m4a', '.ogg', '.opus', '.mp4', '.avi', '.mov', '.webm'}
+
+# Audio formats that may be sent inline (video always goes through the Files API)
+INLINE_MIME_TYPES = {
+    '.wav': 'audio/wav',
+    '.flac': 'audio/flac',
+    '.mp3': 'audio/mp3',
+    '.ogg': 'audio/ogg',
+    '.opus': 'audio/ogg',
+    '.m4a': 'audio/mp4',
+}
+
+
+def _validate_media_path(path):
+    """
+    Existence, size and extension checks shared by upload and inline paths.
+    `path` may also be an in-memory EncodedChunk.
+    """
+    if isinstance(path, EncodedChunk):
+        file_size, file_ext = len(path.data), path.ext
+    else:
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"File not found: {path}")
+
+        # Security: Validate file path to prevent directory traversal
+        resolved_path = os.path.abspath(path)
+        if not resolved_path.startswith(os.path.abspath(os.path.dirname(path))):
+            raise ValueError("Invalid file path detected")
+
+        file_size = os.path.getsize(path)
+        file_ext = os.path.splitext(path)[1].lower()
+
     if file_size == 0:
         raise ValueError("Cannot upload empty file")
     
@@ -59,56 +203,98 @@ def upload_file(path: str):
         raise ValueError(f"File too large: {file_size/1024/1024:.1f}MB (max 50MB per chunk)")
     
     # Validate file extension for security
-    allowed_extensions = {'.wav', '.mp3', '.m4a', '.ogg', '.mp4', '.avi', '.mov', '.webm'}
-    file_ext = os.path.splitext(path)[1].lower()
-    if file_ext not in allowed_extensions:
-        raise ValueError(f"Unsupported file type: {file_ext}. Allowed: {', '.join(allowed_extensions)}")
-    
-    # Retry logic for file upload with longer delays for API limits
-    import time
-    for attempt in range(3):
-        try:
-            if _client_type == "google-genai":
-                f = _client.files.upload(file=path)
-                return f
-            else:
-                # older style
-                return _client.upload_file(path)
-        except Exception as e:
-            error_str = str(e)
-            
-            # Check for various API limit errors with more comprehensive detection
-            rate_limit_indicators = [
-                "503", "service unavailable", "unavailable",
-                "upload status is not finalized", "rate limit", 
-                "quota", "too many requests", "429",
-                "resource exhausted", "deadline exceeded"
-            ]
-            
-            if any(phrase in error_str.lower() for phrase in rate_limit_indicators):
-                if attempt < 2:  # Not last attempt
-                    wait_time = 30 * (attempt + 1)  # Wait 30, 60 seconds (longer for free tier)
-                    time.sleep(wait_time)
-                    continue
-                else:
-                    # Last attempt - give helpful error message for free tier
-                    if "upload status is not finalized" in error_str.lower():
-                        raise Exception("API upload limit reached. Free tier users: wait 2-3 minutes before trying again.")
-                    elif any(phrase in error_str.lower() for phrase in ["quota", "rate limit", "429", "resource exhausted"]):
-                        raise Exception("API quota/rate limit exceeded. Free tier users: wait 2-3 minutes and use shorter audio files.")
-                    else:
-                        raise Exception("API temporarily unavailable. Please try again in 2-3 minutes.")
-            
-            # For other errors, don't retry
-            raise Exception(f"File upload failed: {error_str}")
-
-def transcribe_file(file_obj, model: str = MODEL, prompt: str = None):
+    if file_ext not in ALLOWED_EXTENSIONS:
+        raise ValueError(f"Unsupported file type: {file_ext}. Allowed: {', '.join(sorted(ALLOWED_EXTENSIONS))}")
+    return file_size
+
+
+def _media_ext(path) -> str:
+    return path.ext if isinstance(path, EncodedChunk) else os.path.splitext(path)[1].lower()
+
+
+def _media_sha256(path) -> str:
+    if isinstance(path, EncodedChunk):
+        return hashlib.sha256(path.data).hexdigest()
+    return file_sha256(path)
+
+
+def _upload_kwargs(path) -> dict:
+    """files.upload() arguments for a path or an EncodedChunk (a fresh stream per call)."""
+    if isinstance(path, EncodedChunk):
+        return {"file": io.BytesIO(path.data),
+                "config": {"mime_type": INLINE_MIME_TYPES.get(path.ext), "display_name": path.name}}
+    return {"file": path}
+
+
+def audio_part(path, inline_max_bytes: int = INLINE_MAX_BYTES):
     """
-    Ask Gemini to transcribe the uploaded audio file.
-    `file_obj` is the return value from upload_file.
+    Return something to pass as audio in generate_content: the raw bytes inline
+    when the file is small enough, otherwise an uploaded Files API handle.
+    Inline skips the upload round trip and its finalization waits.
+    `path` may be a file path or an in-memory EncodedChunk.
+    """
+    file_size = _validate_media_path(path)
+    mime_type = INLINE_MIME_TYPES.get(_media_ext(path))
+    if mime_type is None or file_size > inline_max_bytes:
+        return upload_file(path)
+
+    if isinstance(path, EncodedChunk):
+        data = path.data
+    else:
+        with open(path, "rb") as f:
+            data = f.read()
+    if _sdk_type() == "google-genai":
+        from google.genai import types
+        return types.Part.from_bytes(data=data, mime_type=mime_type)
+    return {"mime_type": mime_type, "data": data}
+
+
+@instrumented("upload", bytes_in=lambda a, kw: file_size(a[0] if a else kw.get("path")))
+def upload_file(path, reuse: bool = True):
+    """
+    Upload local file to Gemini Files API and return a "file object" that can be used in calls.
+    For google-genai, this returns an object; for the older SDK, adjust accordingly.
+    With `reuse`, a file whose bytes were uploaded before and whose remote copy
+    has not expired is not uploaded again; the existing handle is returned.
+    An EncodedChunk is uploaded straight from memory.
     """
+    _validate_media_path(path)
+
+    content_hash = None
+    if reuse:
+        try:
+            content_hash = _media_sha256(path)
+            existing = _reuse_uploaded(content_hash)
+            if existing is not None:
+                metrics.incr("upload_reused")
+                return existing
+        except REGISTRY_ERRORS:
+            content_hash = None  # registry unavailable; just upload
+
+    def call():
+        kwargs = _upload_kwargs(path)
+        if _sdk_type() == "google-genai":
+            return _get_client().files.upload(**kwargs)
+        # older style
+        return _get_client().upload_file(kwargs["file"], **kwargs.get("config", {}))
+
+    # Retries, backoff and circuit breaking live in utils.retry
+    try:
+        f = _call_api(FILES_QUOTA_SCOPE, call)
+    except Exception as e:
+        raise _friendly_api_error(e, "File upload")
+
+    if content_hash:
+        try:
+            get_default_registry().register(content_hash, f)
+        except REGISTRY_ERRORS:
+            pass
+    return f
+
+def _sanitize_prompt(prompt: str = None) -> str:
+    """Validate a transcription prompt (defaults to TRANSCRIBE_PROMPT)."""
     if prompt is None:
-        prompt = "Transcribe the audio to plain text. Provide timestamps for major sections if available. Output only spoken text."
+        prompt = TRANSCRIBE_PROMPT
 
     # Sanitize prompt for security
     if not isinstance(prompt, str):
@@ -123,58 +309,237 @@ def transcribe_file(file_obj, model: str = MODEL, prompt: str = None):
     
     if not prompt.strip():
         raise ValueError("Prompt cannot be empty after sanitization")
+    return prompt
+
+
+@instrumented("transcribe", bytes_out=len)
+def transcribe_file(file_obj, model: str = MODEL, prompt: str = None, audio_seconds: float = None):
+    """
+    Ask Gemini to transcribe the uploaded audio file.
+    `file_obj` is the return value from upload_file or audio_part.
+    `audio_seconds` (the chunk length) sizes the token reservation in the
+    shared quota; without it a 5 minute chunk is assumed.
+    """
+    prompt = _sanitize_prompt(prompt)
+    est_tokens = int((audio_seconds or 300) * AUDIO_TOKENS_PER_SECOND) + estimate_text_tokens(prompt)
+
+    def call():
+        if _sdk_type() == "google-genai":
+            resp = _get_client().models.generate_content(
+                model=_get_model_name(model),
+                contents=[file_obj, prompt]
+            )
+            return resp.text
+        else:
+            # older SDK usage
+            return _get_client().generate_text([file_obj, prompt], model_name=model).text
+
+    try:
+        return _call_api(model, call, tokens=est_tokens)
+    except Exception as e:
+        raise _friendly_api_error(e, "Transcription")
+
+# Map-reduce summarization: transcripts longer than SUMMARY_WINDOW_CHARS are
+# summarized window by window in parallel, then the partial notes are merged.
+SUMMARY_WINDOW_CHARS = int(os.getenv("SUMMARY_WINDOW_CHARS", "30000"))
+SUMMARY_CONCURRENCY = int(os.getenv("SUMMARY_CONCURRENCY", "4"))
+# Upper bound on reduce rounds over the partial notes
+MAX_REDUCE_ROUNDS = 4
+
+SUMMARY_INSTRUCTIONS = {
+    "concise": "Produce: (A) One-line TL;DR, (B) 6-12 bullet key takeaways, (C) 3 action items, (D) short glossary if present. Keep bullets concise.",
+    "detailed": "Create detailed lecture notes: one-line TL;DR, section headings, lists of points, short explanations, and next steps.",
+}
+
+MAP_INSTRUCTION = (
+    "Summarize this section of a longer lecture transcript as thorough bullet notes: "
+    "main points, definitions, examples, formulas and any action items. Keep the [mm:ss] "
+    "timestamps of the topics you mention. Do not add an introduction or conclusion."
+)
+
+REDUCE_INSTRUCTION = (
+    "Merge these partial notes from consecutive parts of one lecture into a single set of bullet "
+    "notes. Remove repetition but keep every distinct point, definition and example, in order."
+)
+
+
+def _generate_text(prompt: str, model: str):
+    """Single generate_content call (with quota and retries) returning the response text."""
+    def call():
+        if _sdk_type() == "google-genai":
+            resp = _get_client().models.generate_content(model=_get_model_name(model), contents=[prompt])
+            return resp.text
+        else:
+            return _get_client().generate_text(prompt, model_name=model).text
+
+    try:
+        return _call_api(model, call, tokens=estimate_text_tokens(prompt))
+    except (RetryError, CircuitOpenError) as e:
+        raise _friendly_api_error(e, "Generation")
+
+
+def _stream_text(prompt: str, model: str):
+    """
+    Streaming generate_content: yield text pieces as the model produces them.
+    Opening the stream and waiting for the first piece go through quota and
+    retries like _generate_text; once text has been yielded a failure is
+    raised as-is, since the caller has already shown part of the answer.
+    """
+    def open_stream():
+        if _sdk_type() == "google-genai":
+            stream = iter(_get_client().models.generate_content_stream(model=_get_model_name(model), contents=[prompt]))
+        else:
+            stream = iter([_get_client().generate_text(prompt, model_name=model)])  # no streaming in the old SDK
+        first = next(stream, None)  # connection and quota errors surface here
+        return first, stream
+
+    try:
+        first, stream = _call_api(model, open_stream, tokens=estimate_text_tokens(prompt))
+    except (RetryError, CircuitOpenError) as e:
+        raise _friendly_api_error(e, "Generation")
+
+    if first is None:
+        return
+    for piece in itertools.chain([first], stream):
+        text = getattr(piece, "text", None)
+        if text:
+            yield text
+
+
+def split_text_windows(text: str, max_chars: int = SUMMARY_WINDOW_CHARS):
+    """
+    Split text into windows of at most max_chars, breaking between paragraphs
+    (the merged transcript has one paragraph per chunk) and only splitting a
+    single paragraph when it is longer than a window on its own.
+    """
+    windows = []
+    current = []
+    size = 0
+    for para in text.split("\n\n"):
+        pieces = [para[i:i + max_chars] for i in range(0, len(para), max_chars)] or [""]
+        for piece in pieces:
+            if current and size + len(piece) + 2 > max_chars:
+                windows.append("\n\n".join(current))
+                current, size = [], 0
+            current.append(piece)
+            size += len(piece) + 2
+    if current:
+        windows.append("\n\n".join(current))
+    return [w for w in windows if w.strip()]
+
+
+def _map_prompt(window: str) -> str:
+    return f"{MAP_INSTRUCTION}\n\nTranscript section:\n\n{window}"
+
+
+def _reduce_prompt(group: str) -> str:
+    return f"{REDUCE_INSTRUCTION}\n\nPartial notes:\n\n{group}"
+
+
+def _final_prompt(text: str, mode: str, from_notes: bool) -> str:
+    instr = SUMMARY_INSTRUCTIONS.get(mode, SUMMARY_INSTRUCTIONS["detailed"])
+    if not from_notes:
+        return f"{instr}\n\nTranscript:\n\n{text}"
+    return (
+        f"{instr}\n\nThe following are notes taken on consecutive sections of one lecture, "
+        f"in order. Base the result on all of them.\n\nNotes:\n\n{text}"
+    )
 
-    # Retry logic for API calls with better free tier handling
-    import time
-    for attempt in range(3):
-        try:
-            if _client_type == "google-genai":
-                resp = _client.models.generate_content(
-                    model=_get_model_name(model),
-                    contents=[file_obj, prompt]
-                )
-                return resp.text
-            else:
-                # older SDK usage
-                return _client.generate_text([file_obj, prompt], model_name=model).text
-        except Exception as e:
-            error_str = str(e)
-            rate_limit_indicators = ["503", "UNAVAILABLE", "429", "quota", "rate limit", "resource exhausted"]
-            
-            if any(phrase in error_str.lower() for phrase in rate_limit_indicators):
-                if attempt < 2:  # Not last attempt
-                    wait_time = 30 * (attempt + 1)  # Wait 30, 60 seconds for free tier
-                    time.sleep(wait_time)
-                    continue
-                else:
-                    raise Exception("API rate limit exceeded. Free tier users: wait 2-3 minutes before trying again.")
-            
-            raise Exception(f"Transcription failed: {str(e)}")
 
+def _map_windows(prompts, model: str):
+    """Run one generate call per prompt in parallel, preserving order."""
+    from concurrent.futures import ThreadPoolExecutor
+    workers = max(1, min(SUMMARY_CONCURRENCY, len(prompts)))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="summarize") as pool:
+        futures = [pool.submit(metrics.propagate(_generate_text), p, model) for p in prompts]
+        return [f.result() for f in futures]
+
+
+def _reduce_round(notes, max_chars: int):
+    """
+    Prompts for the next reduce round over `notes`, or None once they fit in
+    one window. Every prompt holds at most one window: notes that fit together
+    are merged, a note that fills a window on its own is condensed by itself.
+    """
+    combined = "\n\n".join(notes)
+    if len(combined) <= max_chars:
+        return None
+    return [_reduce_prompt(g) for g in split_text_windows(combined, max_chars)]
+
+
+def _reduced_text(notes, max_chars: int) -> str:
+    # Only reached over max_chars if the model stopped shortening its notes
+    # within MAX_REDUCE_ROUNDS; the final prompt stays bounded regardless.
+    return "\n\n".join(notes)[:max_chars]
+
+
+def _reduce_notes(notes, model: str, max_chars: int):
+    """Merge partial notes groupwise until they fit in one window."""
+    for _ in range(MAX_REDUCE_ROUNDS):
+        prompts = _reduce_round(notes, max_chars)
+        if prompts is None:
+            break
+        notes = _map_windows(prompts, model)
+    return _reduced_text(notes, max_chars)
+
+
+def _summary_prompt(text: str, model: str, mode: str) -> str:
+    """
+    Final summarization prompt for `text`. Long transcripts are summarized
+    with map-reduce instead of being truncated: each window is summarized in
+    parallel, then the partial notes are reduced (recursively if needed), and
+    the prompt asks for the requested format over those notes.
+    """
+    if not text or not text.strip():
+        raise ValueError("Cannot summarize empty text")
+
+    if len(text) <= SUMMARY_WINDOW_CHARS:
+        return _final_prompt(text, mode, from_notes=False)
+
+    windows = split_text_windows(text, SUMMARY_WINDOW_CHARS)
+    partial = _map_windows([_map_prompt(w) for w in windows], model)
+    notes = _reduce_notes(partial, model, SUMMARY_WINDOW_CHARS)
+    return _final_prompt(notes, mode, from_notes=True)
+
+
+@instrumented("summarize", bytes_in=lambda a, kw: len((a[0] if a else kw.get("text")) or ""), bytes_out=len)
 def summarize_text(text: str, model: str = MODEL, mode: str = "concise"):
+    """Summarize a transcript into notes in the given mode ("concise" or "detailed")."""
     if not text or not text.strip():
         raise ValueError("Cannot summarize empty text")
-    
-    if len(text) > 100000:  # 100k character limit
-        text = text[:100000] + "...(truncated)"
-    
-    if mode == "concise":
-        instr = "Produce: (A) One-line TL;DR, (B) 6-12 bullet key takeaways, (C) 3 action items, (D) short glossary if present. Keep bullets concise."
-    else:
-        instr = "Create detailed lecture notes: one-line TL;DR, section headings, lists of points, short explanations, and next steps."
 
-    prompt = f"{instr}\n\nTranscript:\n\n{text}"
-    
     try:
-        if _client_type == "google-genai":
-            resp = _client.models.generate_content(model=_get_model_name(model), contents=[prompt])
-            return resp.text
-        else:
-            return _client.generate_text(prompt, model_name=model).text
+        return _generate_text(_summary_prompt(text, model, mode), model)
+    except Exception as e:
+        raise Exception(f"Summarization failed: {str(e)}")
+
+
+@instrumented("summarize", bytes_in=lambda a, kw: len((a[0] if a else kw.get("text")) or ""), bytes_out=len)
+def stream_summary(text: str, model: str = MODEL, mode: str = "concise"):
+    """
+    Like summarize_text, but a generator of text pieces as the final notes are
+    generated. For long transcripts the map-reduce steps run before the first
+    piece is yielded.
+    """
+    if not text or not text.strip():
+        raise ValueError("Cannot summarize empty text")
+
+    try:
+        yield from _stream_text(_summary_prompt(text, model, mode), model)
     except Exception as e:
         raise Exception(f"Summarization failed: {str(e)}")
 
-def answer_question(context_text: str, question: str, model: str = MODEL):
+# Contexts up to this size are sent whole; longer ones go through retrieval.
+QA_FULL_CONTEXT_CHARS = int(os.getenv("QA_FULL_CONTEXT_CHARS", "8000"))
+
+
+def _qa_prompt(context_text: str, question: str, index=None, top_k: int = 6) -> str:
+    """
+    Question-answering prompt. Only the `top_k` passages most relevant to the
+    question (with their [mm:ss] markers) are included, using `index` (a
+    TranscriptIndex built once per transcript) or an index built on the fly
+    for long contexts.
+    """
     if not context_text or not context_text.strip():
         raise ValueError("Context text is required")
     
@@ -182,19 +547,231 @@ def answer_question(context_text: str, question: str, model: str = MODEL):
         raise ValueError("Question is required")
     
     # Limit input sizes
-    if len(context_text) > 50000:
-        context_text = context_text[:50000] + "...(truncated)"
-    
     if len(question) > 1000:
         question = question[:1000]
     
-    prompt = f"Context:\n{context_text}\n\nQuestion: {question}\nAnswer concisely using the context; if unsure, say 'Not stated in the transcript.'"
+    if index is None and len(context_text) > QA_FULL_CONTEXT_CHARS:
+        from .transcript_index import TranscriptIndex
+        index = TranscriptIndex.from_transcript(context_text)
+    if index is not None and len(index):
+        context_text = index.context_for(question, top_k=top_k)
     
+    return (
+        f"Context (excerpts from a lecture transcript, with [mm:ss] timestamps):\n{context_text}\n\n"
+        f"Question: {question}\nAnswer concisely using the context and cite the [mm:ss] timestamps you used; "
+        f"if unsure, say 'Not stated in the transcript.'"
+    )
+
+
+@instrumented("answer", bytes_in=lambda a, kw: len((a[0] if a else kw.get("context_text")) or ""), bytes_out=len)
+def answer_question(context_text: str, question: str, model: str = MODEL, index=None, top_k: int = 6):
+    """Answer a question about a transcript (see _qa_prompt for the context sent)."""
+    prompt = _qa_prompt(context_text, question, index=index, top_k=top_k)
     try:
-        if _client_type == "google-genai":
-            resp = _client.models.generate_content(model=_get_model_name(model), contents=[prompt])
-            return resp.text
-        else:
-            return _client.generate_text(prompt, model_name=model).text
+        return _generate_text(prompt, model)
+    except Exception as e:
+        raise Exception(f"Question answering failed: {str(e)}")
+
+
+@instrumented("answer", bytes_in=lambda a, kw: len((a[0] if a else kw.get("context_text")) or ""), bytes_out=len)
+def stream_answer(context_text: str, question: str, model: str = MODEL, index=None, top_k: int = 6):
+    """Like answer_question, but a generator of text pieces as the answer is generated."""
+    prompt = _qa_prompt(context_text, question, index=index, top_k=top_k)
+    try:
+        yield from _stream_text(prompt, model)
+    except Exception as e:
+        raise Exception(f"Question answering failed: {str(e)}")
+
+
+# --- asyncio API -------------------------------------------------------------
+# Async counterparts of upload_file, transcribe_file, summarize_text and
+# answer_question built on the SDK's async client (`_client.aio`). Waits for
+# quota and retry backoff use asyncio.sleep, so a single event loop can keep
+# many requests in flight without a thread per request. The number of API
+# calls in flight per event loop is capped by GEMINI_ASYNC_CONCURRENCY.
+ASYNC_CONCURRENCY = int(os.getenv("GEMINI_ASYNC_CONCURRENCY", "64"))
+
+_async_limits = weakref.WeakKeyDictionary()  # event loop -> Semaphore
+
+
+def _async_limit() -> asyncio.Semaphore:
+    loop = asyncio.get_running_loop()
+    sem = _async_limits.get(loop)
+    if sem is None:
+        sem = _async_limits[loop] = asyncio.Semaphore(max(1, ASYNC_CONCURRENCY))
+    return sem
+
+
+async def _acquire_quota_async(scope: str, tokens: int = 0):
+    try:
+        waited = await get_quota().acquire_async(scope, requests=1, tokens=tokens, timeout=QUOTA_MAX_WAIT_SECONDS)
+        metrics.incr("quota_wait_seconds", waited, scope=scope)
+        return waited
+    except TimeoutError:
+        raise QuotaWaitError("API quota exhausted by other jobs. Please try again in a few minutes.")
+
+
+async def _penalize_quota_async(scope: str, seconds: float):
+    """_penalize_quota without blocking the event loop."""
+    try:
+        await asyncio.to_thread(get_quota().penalize, scope, seconds)
+    except Exception:
+        await asyncio.sleep(seconds)  # quota store unavailable: back off locally
+
+
+async def _call_api_async(scope: str, fn, tokens: int = 0):
+    """Async _call_api: `fn` returns an awaitable SDK call."""
+    async def attempt():
+        await _acquire_quota_async(scope, tokens=tokens)
+        _count_call(scope, tokens)
+        async with _async_limit():
+            return await fn()
+
+    async def on_backoff(info, delay):
+        metrics.incr("api_retries", scope=scope, kind=info.kind)
+        if info.kind == RATE_LIMITED:
+            await _penalize_quota_async(scope, delay)
+            return True
+        return False
+
+    return await get_policy().call_async(attempt, scope=scope, on_backoff=on_backoff)
+
+
+def _has_async_client() -> bool:
+    return _sdk_type() == "google-genai" and hasattr(_get_client(), "aio")
+
+
+async def _get_remote_file_async(name: str):
+    try:
+        f = await _call_api_async(FILES_QUOTA_SCOPE, lambda: _get_client().aio.files.get(name=name))
+    except Exception:
+        return None
+    state = getattr(f, "state", None)
+    state = getattr(state, "name", state)
+    if state and str(state).upper() != "ACTIVE":
+        return None
+    return f
+
+
+@instrumented("upload", bytes_in=lambda a, kw: file_size(a[0] if a else kw.get("path")))
+async def upload_file_async(path, reuse: bool = True):
+    """Async upload_file."""
+    if not _has_async_client():
+        # The undecorated function: this wrapper already records the stage
+        return await asyncio.to_thread(upload_file.__wrapped__, path, reuse)
+    _validate_media_path(path)
+
+    content_hash = None
+    if reuse:
+        try:
+            content_hash = await asyncio.to_thread(_media_sha256, path)
+            entry = await asyncio.to_thread(lambda: get_default_registry().lookup(content_hash))
+            if entry:
+                existing = await _get_remote_file_async(entry["name"])
+                if existing is not None:
+                    metrics.incr("upload_reused")
+                    return existing
+                await asyncio.to_thread(lambda: get_default_registry().forget(content_hash))
+        except REGISTRY_ERRORS:
+            content_hash = None
+
+    try:
+        f = await _call_api_async(FILES_QUOTA_SCOPE, lambda: _get_client().aio.files.upload(**_upload_kwargs(path)))
+    except Exception as e:
+        raise _friendly_api_error(e, "File upload")
+
+    if content_hash:
+        try:
+            await asyncio.to_thread(lambda: get_default_registry().register(content_hash, f))
+        except REGISTRY_ERRORS:
+            pass
+    return f
+
+
+async def audio_part_async(path, inline_max_bytes: int = INLINE_MAX_BYTES):
+    """Async audio_part: inline bytes for small files, otherwise upload_file_async."""
+    file_size = _validate_media_path(path)
+    mime_type = INLINE_MIME_TYPES.get(_media_ext(path))
+    if mime_type is None or file_size > inline_max_bytes:
+        return await upload_file_async(path)
+    return await asyncio.to_thread(audio_part, path, inline_max_bytes)
+
+
+@instrumented("transcribe", bytes_out=len)
+async def transcribe_file_async(file_obj, model: str = MODEL, prompt: str = None, audio_seconds: float = None):
+    """Async transcribe_file."""
+    if not _has_async_client():
+        # The undecorated function: this wrapper already records the stage
+        return await asyncio.to_thread(transcribe_file.__wrapped__, file_obj, model, prompt, audio_seconds)
+    prompt = _sanitize_prompt(prompt)
+    est_tokens = int((audio_seconds or 300) * AUDIO_TOKENS_PER_SECOND) + estimate_text_tokens(prompt)
+
+    async def call():
+        resp = await _get_client().aio.models.generate_content(model=_get_model_name(model), contents=[file_obj, prompt])
+        return resp.text
+
+    try:
+        return await _call_api_async(model, call, tokens=est_tokens)
+    except Exception as e:
+        raise _friendly_api_error(e, "Transcription")
+
+
+async def _generate_text_async(prompt: str, model: str):
+    if not _has_async_client():
+        return await asyncio.to_thread(_generate_text, prompt, model)
+
+    async def call():
+        resp = await _get_client().aio.models.generate_content(model=_get_model_name(model), contents=[prompt])
+        return resp.text
+
+    try:
+        return await _call_api_async(model, call, tokens=estimate_text_tokens(prompt))
+    except (RetryError, CircuitOpenError) as e:
+        raise _friendly_api_error(e, "Generation")
+
+
+async def _map_windows_async(prompts, model: str):
+    limit = asyncio.Semaphore(max(1, SUMMARY_CONCURRENCY))
+
+    async def one(p):
+        async with limit:
+            return await _generate_text_async(p, model)
+
+    return list(await asyncio.gather(*(one(p) for p in prompts)))
+
+
+async def _reduce_notes_async(notes, model: str, max_chars: int):
+    for _ in range(MAX_REDUCE_ROUNDS):
+        prompts = _reduce_round(notes, max_chars)
+        if prompts is None:
+            break
+        notes = await _map_windows_async(prompts, model)
+    return _reduced_text(notes, max_chars)
+
+
+@instrumented("summarize", bytes_in=lambda a, kw: len((a[0] if a else kw.get("text")) or ""), bytes_out=len)
+async def summarize_text_async(text: str, model: str = MODEL, mode: str = "concise"):
+    """Async summarize_text (same map-reduce for long transcripts)."""
+    if not text or not text.strip():
+        raise ValueError("Cannot summarize empty text")
+
+    try:
+        if len(text) <= SUMMARY_WINDOW_CHARS:
+            return await _generate_text_async(_final_prompt(text, mode, from_notes=False), model)
+
+        windows = split_text_windows(text, SUMMARY_WINDOW_CHARS)
+        partial = await _map_windows_async([_map_prompt(w) for w in windows], model)
+        notes = await _reduce_notes_async(partial, model, SUMMARY_WINDOW_CHARS)
+        return await _generate_text_async(_final_prompt(notes, mode, from_notes=True), model)
+    except Exception as e:
+        raise Exception(f"Summarization failed: {str(e)}")
+
+
+@instrumented("answer", bytes_in=lambda a, kw: len((a[0] if a else kw.get("context_text")) or ""), bytes_out=len)
+async def answer_question_async(context_text: str, question: str, model: str = MODEL, index=None, top_k: int = 6):
+    """Async answer_question."""
+    prompt = _qa_prompt(context_text, question, index=index, top_k=top_k)
+    try:
+        return await _generate_text_async(prompt, model)
     except Exception as e:
         raise Exception(f"Question answering failed: {str(e)}")
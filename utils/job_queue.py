@@ -0,0 +1,267 @@
+# utils/job_queue.py
+"""Job queue separating the UI from processing.
+
+The UI enqueues a job (a recording in the shared spool directory plus its
+settings) and polls it; worker processes (worker.py), on this machine or on
+any node that shares the queue database and spool directory, claim jobs, run
+the pipeline and write progress and results back. A worker that dies stops
+renewing its lease and the job is handed to another worker.
+
+JobQueue is the interface; SQLiteJobQueue is the local implementation.
+Other backends can subclass JobQueue and be selected via JOB_QUEUE_URL.
+"""
+import os
+import json
+import time
+import uuid
+import shutil
+import sqlite3
+import threading
+from pathlib import Path
+from dataclasses import dataclass, field
+
+DEFAULT_QUEUE_PATH = os.path.join(Path.home(), ".cache", "voice2notes", "queue.sqlite")
+DEFAULT_SPOOL_DIR = os.path.join(Path.home(), ".cache", "voice2notes", "spool")
+# A running job whose worker has not sent a heartbeat for this long is re-queued.
+LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "120"))
+MAX_JOB_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+ACTIVE_STATUSES = (QUEUED, RUNNING)
+
+
+@dataclass
+class QueuedJob:
+    id: str
+    key: str
+    status: str
+    source_path: str
+    settings: dict
+    progress: dict = field(default_factory=dict)
+    result: dict = None
+    error: str = None
+    worker: str = None
+    attempts: int = 0
+    created: float = 0.0
+    updated: float = 0.0
+
+    @property
+    def finished(self) -> bool:
+        return self.status in (DONE, FAILED)
+
+
+class JobQueue:
+    """Interface of a job queue backend."""
+
+    lease_seconds = LEASE_SECONDS
+
+    def enqueue(self, key: str, source_path: str, settings: dict) -> QueuedJob:
+        """Add a job, or return the queued/running/done job with the same key."""
+        raise NotImplementedError
+
+    def get(self, job_id: str):
+        raise NotImplementedError
+
+    def find(self, key: str):
+        """Most recent job with this key (any status), or None."""
+        raise NotImplementedError
+
+    def claim(self, worker_id: str):
+        """Take the oldest available job for `worker_id`, or return None."""
+        raise NotImplementedError
+
+    def heartbeat(self, job_id: str, worker_id: str, progress: dict = None) -> bool:
+        """Renew the lease (and optionally store progress). False if the job was lost."""
+        raise NotImplementedError
+
+    def complete(self, job_id: str, worker_id: str, result: dict):
+        raise NotImplementedError
+
+    def fail(self, job_id: str, worker_id: str, error: str):
+        raise NotImplementedError
+
+    def counts(self) -> dict:
+        """Number of jobs per status."""
+        raise NotImplementedError
+
+
+class SQLiteJobQueue(JobQueue):
+    """Job queue in a SQLite database (shared by all processes that can open it)."""
+
+    def __init__(self, db_path: str = None, lease_seconds: float = LEASE_SECONDS,
+                 max_attempts: int = MAX_JOB_ATTEMPTS):
+        self.db_path = Path(db_path or DEFAULT_QUEUE_PATH)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True, mode=0o700)
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self._local = threading.local()
+        conn = self._connect()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id TEXT PRIMARY KEY, key TEXT NOT NULL, status TEXT NOT NULL, "
+            "source_path TEXT NOT NULL, settings TEXT NOT NULL, progress TEXT, result TEXT, "
+            "error TEXT, worker TEXT, attempts INTEGER NOT NULL DEFAULT 0, "
+            "created REAL NOT NULL, updated REAL NOT NULL, heartbeat REAL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS jobs_key ON jobs (key)")
+        conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created)")
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.db_path), timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _job(row):
+        if row is None:
+            return None
+        return QueuedJob(
+            id=row["id"], key=row["key"], status=row["status"], source_path=row["source_path"],
+            settings=json.loads(row["settings"]),
+            progress=json.loads(row["progress"]) if row["progress"] else {},
+            result=json.loads(row["result"]) if row["result"] else None,
+            error=row["error"], worker=row["worker"], attempts=row["attempts"],
+            created=row["created"], updated=row["updated"],
+        )
+
+    def _transaction(self, fn):
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            value = fn(conn)
+            conn.execute("COMMIT")
+            return value
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def enqueue(self, key: str, source_path: str, settings: dict) -> QueuedJob:
+        def tx(conn):
+            row = conn.execute(
+                "SELECT * FROM jobs WHERE key = ? AND status IN (?, ?, ?) ORDER BY created DESC LIMIT 1",
+                (key, QUEUED, RUNNING, DONE),
+            ).fetchone()
+            if row is not None:
+                return self._job(row)
+            now = time.time()
+            job_id = uuid.uuid4().hex
+            conn.execute(
+                "INSERT INTO jobs (id, key, status, source_path, settings, created, updated) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (job_id, key, QUEUED, source_path, json.dumps(settings), now, now),
+            )
+            return self._job(conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone())
+        return self._transaction(tx)
+
+    def get(self, job_id: str):
+        return self._job(self._connect().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone())
+
+    def find(self, key: str):
+        row = self._connect().execute(
+            "SELECT * FROM jobs WHERE key = ? ORDER BY created DESC LIMIT 1", (key,)
+        ).fetchone()
+        return self._job(row)
+
+    def claim(self, worker_id: str):
+        def tx(conn):
+            now = time.time()
+            # Jobs of workers that stopped heartbeating go back to the queue (or fail)
+            conn.execute(
+                "UPDATE jobs SET status = ?, error = 'Worker lost too many times', updated = ? "
+                "WHERE status = ? AND heartbeat < ? AND attempts >= ?",
+                (FAILED, now, RUNNING, now - self.lease_seconds, self.max_attempts),
+            )
+            row = conn.execute(
+                "SELECT * FROM jobs WHERE status = ? OR (status = ? AND heartbeat < ?) "
+                "ORDER BY created LIMIT 1",
+                (QUEUED, RUNNING, now - self.lease_seconds),
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                "UPDATE jobs SET status = ?, worker = ?, attempts = attempts + 1, heartbeat = ?, updated = ? "
+                "WHERE id = ?",
+                (RUNNING, worker_id, now, now, row["id"]),
+            )
+            return self._job(conn.execute("SELECT * FROM jobs WHERE id = ?", (row["id"],)).fetchone())
+        return self._transaction(tx)
+
+    def heartbeat(self, job_id: str, worker_id: str, progress: dict = None) -> bool:
+        now = time.time()
+        if progress is None:
+            cur = self._connect().execute(
+                "UPDATE jobs SET heartbeat = ?, updated = ? WHERE id = ? AND worker = ? AND status = ?",
+                (now, now, job_id, worker_id, RUNNING),
+            )
+        else:
+            cur = self._connect().execute(
+                "UPDATE jobs SET heartbeat = ?, updated = ?, progress = ? WHERE id = ? AND worker = ? AND status = ?",
+                (now, now, json.dumps(progress), job_id, worker_id, RUNNING),
+            )
+        return cur.rowcount == 1
+
+    def _finish(self, job_id: str, worker_id: str, status: str, result: dict = None, error: str = None):
+        now = time.time()
+        self._connect().execute(
+            "UPDATE jobs SET status = ?, result = ?, error = ?, updated = ? WHERE id = ? AND worker = ?",
+            (status, json.dumps(result) if result is not None else None, error, now, job_id, worker_id),
+        )
+
+    def complete(self, job_id: str, worker_id: str, result: dict):
+        self._finish(job_id, worker_id, DONE, result=result)
+
+    def fail(self, job_id: str, worker_id: str, error: str):
+        self._finish(job_id, worker_id, FAILED, error=error)
+
+    def counts(self) -> dict:
+        rows = self._connect().execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return {status: n for status, n in rows}
+
+
+def spool_dir() -> Path:
+    """Directory for queued recordings; must be shared with the workers."""
+    path = Path(os.getenv("JOB_SPOOL_DIR") or DEFAULT_SPOOL_DIR)
+    path.mkdir(parents=True, exist_ok=True, mode=0o700)
+    return path
+
+
+def spool_file(src_path: str, key: str) -> str:
+    """Copy an upload into the spool directory (once per key) and return its path."""
+    dest = spool_dir() / f"{key}{Path(src_path).suffix.lower()}"
+    if not dest.exists():
+        tmp = dest.with_suffix(dest.suffix + f".{os.getpid()}.tmp")
+        shutil.copyfile(src_path, tmp)
+        os.replace(tmp, dest)
+    return str(dest)
+
+
+def queue_enabled() -> bool:
+    """True when the UI should hand processing to workers (USE_JOB_QUEUE=1)."""
+    return os.getenv("USE_JOB_QUEUE", "").strip().lower() in ("1", "true", "yes")
+
+
+_default_queue = None
+_default_lock = threading.Lock()
+
+
+def get_job_queue() -> JobQueue:
+    """
+    Queue selected by JOB_QUEUE_URL: "sqlite:///path/to/queue.sqlite" (or a
+    plain path); defaults to a SQLite file under ~/.cache/voice2notes.
+    """
+    global _default_queue
+    with _default_lock:
+        if _default_queue is None:
+            url = os.getenv("JOB_QUEUE_URL", "")
+            if url and not url.startswith("sqlite://") and "://" in url:
+                raise ValueError(f"Unsupported JOB_QUEUE_URL scheme: {url.split('://')[0]}")
+            path = url[len("sqlite://"):] if url.startswith("sqlite://") else url
+            _default_queue = SQLiteJobQueue(path or None)
+        return _default_queue
@@ -0,0 +1,174 @@
+# utils/jobs.py
+"""Checkpointed processing jobs.
+
+A job journal records, per chunk, whether it was transcribed and what came
+back, and is rewritten after every chunk. If a run stops half way (rate
+limit, browser refresh, crash) the next run over the same file and settings
+picks up the journal and only transcribes chunks that are missing or failed.
+"""
+import os
+import json
+import time
+import hashlib
+import threading
+from pathlib import Path
+
+from .upload_registry import file_sha256
+
+DEFAULT_JOB_DIR = os.path.join(Path.home(), ".cache", "voice2notes", "jobs")
+
+STATUS_PENDING = "pending"
+STATUS_DONE = "done"
+STATUS_ERROR = "error"
+
+
+def make_job_id(content_hash: str, settings: dict) -> str:
+    """Job id derived from the source file's content hash and processing settings."""
+    h = hashlib.sha256(content_hash.encode("utf-8"))
+    h.update(json.dumps(settings, sort_keys=True, default=str).encode("utf-8"))
+    return h.hexdigest()[:32]
+
+
+class Job:
+    """Per-chunk state of one processing run, persisted as a JSON journal."""
+
+    def __init__(self, path: Path, data: dict):
+        self.path = path
+        self.data = data
+        self._lock = threading.Lock()
+
+    @property
+    def job_id(self) -> str:
+        return self.data["job_id"]
+
+    @property
+    def chunks(self):
+        return self.data["chunks"]
+
+    @property
+    def settings(self) -> dict:
+        return self.data.get("settings", {})
+
+    def save(self):
+        with self._lock:
+            self.data["updated"] = time.time()
+            tmp = self.path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(self.data, f)
+            os.replace(tmp, self.path)
+
+    @property
+    def total(self):
+        """Number of chunks in the job, or None while a streamed job is unfinished."""
+        if "total" not in self.data:
+            return len(self.chunks)
+        return self.data["total"]
+
+    def matches(self, chunks) -> bool:
+        """True if the journal was made for the same chunk boundaries."""
+        bounds = [(c["start_sec"], c["end_sec"]) for c in self.chunks]
+        return bounds == [(c[1], c[2]) for c in chunks]
+
+    def is_done(self, index: int, start_sec: int = None) -> bool:
+        if not (0 <= index < len(self.chunks)) or self.chunks[index]["status"] != STATUS_DONE:
+            return False
+        # Streamed jobs learn boundaries as they go; make sure they still line up
+        return start_sec is None or self.chunks[index]["start_sec"] == start_sec
+
+    def text(self, index: int) -> str:
+        return self.chunks[index].get("text") or ""
+
+    def done_count(self) -> int:
+        return sum(1 for c in self.chunks if c["status"] == STATUS_DONE)
+
+    def remaining_count(self) -> int:
+        """Chunks still to do (a lower bound while a streamed job's total is unknown)."""
+        total = self.total if self.total is not None else len(self.chunks)
+        return total - self.done_count()
+
+    def is_complete(self) -> bool:
+        return bool(self.chunks) and self.total is not None and self.remaining_count() == 0
+
+    def record(self, result):
+        """Store a ChunkResult and checkpoint the journal."""
+        while len(self.chunks) <= result.index:
+            # Streamed job: chunk boundaries become known as chunks arrive
+            self.chunks.append({"start_sec": None, "end_sec": None, "status": STATUS_PENDING,
+                                "text": None, "error": None})
+        entry = self.chunks[result.index]
+        entry.update(start_sec=result.start_sec, end_sec=result.end_sec)
+        if result.ok:
+            entry.update(status=STATUS_DONE, text=result.text, error=None)
+        else:
+            entry.update(status=STATUS_ERROR, error=result.error)
+        entry["attempts"] = entry.get("attempts", 0) + result.attempts
+        self.data["status"] = "complete" if self.is_complete() else "incomplete"
+        self.save()
+
+    def finish(self, total: int):
+        """Record the final chunk count once a streamed job has produced all chunks."""
+        del self.chunks[total:]
+        self.data["total"] = total
+        self.data["status"] = "complete" if self.is_complete() else "incomplete"
+        self.save()
+
+    def reset(self, chunks=None):
+        """
+        Start over (drops previous results). `chunks` is the chunk list, or None
+        for a streamed job whose chunks are added as they are produced.
+        """
+        chunks = chunks or []
+        self.data["chunks"] = [
+            {"start_sec": c[1], "end_sec": c[2], "status": STATUS_PENDING, "text": None, "error": None}
+            for c in chunks
+        ]
+        self.data["total"] = len(chunks) if chunks else None
+        self.data["status"] = "incomplete"
+        self.save()
+
+
+class JobStore:
+    """Directory of job journals, one JSON file per job id."""
+
+    def __init__(self, job_dir: str = None):
+        self.job_dir = Path(job_dir or os.getenv("JOB_DIR") or DEFAULT_JOB_DIR)
+        self.job_dir.mkdir(parents=True, exist_ok=True, mode=0o700)
+
+    def job_id_for(self, source_path: str, settings: dict) -> str:
+        return make_job_id(file_sha256(source_path), settings)
+
+    def _path(self, job_id: str) -> Path:
+        return self.job_dir / f"{job_id}.json"
+
+    def load(self, job_id: str):
+        """Return the Job for job_id, or None if there is no (readable) journal."""
+        path = self._path(job_id)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return Job(path, data)
+
+    def open(self, job_id: str, chunks=None, settings: dict = None, resume: bool = True) -> Job:
+        """
+        Load the journal for job_id if it matches `chunks` and `resume` is set,
+        otherwise start a fresh one. Pass chunks=None for a streamed job.
+        """
+        job = self.load(job_id) if resume else None
+        if job is not None and (chunks is None or job.matches(chunks)):
+            return job
+        job = Job(self._path(job_id), {
+            "job_id": job_id,
+            "settings": settings or {},
+            "created": time.time(),
+            "chunks": [],
+        })
+        job.reset(chunks)
+        return job
+
+    def delete(self, job_id: str):
+        try:
+            self._path(job_id).unlink()
+        except OSError:
+            pass
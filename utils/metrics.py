@@ -0,0 +1,406 @@
+# utils/metrics.py
+"""Lightweight instrumentation for the processing pipeline.
+
+Stages (conversion, chunking, upload, transcription, summarization, export)
+are wrapped with `instrumented`, which records call counts, errors,
+durations and bytes in/out. Other code adds counters with `incr` (API
+retries, cache hits, tokens, quota waits). Everything goes into a
+process-wide registry, which is exported in the Prometheus text format
+(`render_prometheus` / `start_metrics_server`). Everything recorded inside a
+`job_metrics(job_id)` block also goes to that job's JobMetrics, which can be
+saved as JSON.
+
+The current job is tracked with a context variable; code that hands work to
+thread pools wraps the callable with `propagate` so the worker threads record
+into the same job.
+
+Set PROFILE_MODE=cprofile and/or tracemalloc (comma separated) to also
+capture a profile of each job (see `profiled`).
+"""
+import os
+import io
+import json
+import time
+import inspect
+import threading
+import functools
+import contextlib
+import contextvars
+from pathlib import Path
+
+DURATION_BUCKETS = (0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+METRICS_PREFIX = "voice2notes"
+
+_current_job = contextvars.ContextVar("voice2notes_job_metrics", default=None)
+
+
+def file_size(path) -> int:
+    """
+    Size of a file in bytes (0 if it does not exist); accepts AudioSource-like
+    objects and in-memory chunks (anything with a `data` buffer).
+    """
+    data = getattr(path, "data", None)
+    if data is not None:
+        return len(data)
+    path = getattr(path, "path", path)
+    try:
+        return os.path.getsize(path)
+    except (OSError, TypeError):
+        return 0
+
+
+def _labels_key(labels: dict):
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+class MetricsRegistry:
+    """Process-wide counters and duration histograms."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}    # (name, labels) -> value
+        self._histograms = {}  # (name, labels) -> [bucket counts..., sum, count]
+
+    def incr(self, name: str, value: float = 1, **labels):
+        key = (name, _labels_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name: str, seconds: float, **labels):
+        key = (name, _labels_key(labels))
+        with self._lock:
+            h = self._histograms.get(key)
+            if h is None:
+                h = self._histograms[key] = [0] * len(DURATION_BUCKETS) + [0.0, 0]
+            for i, bound in enumerate(DURATION_BUCKETS):
+                if seconds <= bound:
+                    h[i] += 1
+            h[-2] += seconds
+            h[-1] += 1
+
+    def render_prometheus(self) -> str:
+        """All metrics in the Prometheus text exposition format."""
+        def fmt(labels, extra=()):
+            items = list(labels) + list(extra)
+            if not items:
+                return ""
+            return "{" + ",".join(f'{k}="{v}"' for k, v in items) + "}"
+
+        lines = []
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted(self._histograms.items())
+        seen = set()
+        for (name, labels), value in counters:
+            full = f"{METRICS_PREFIX}_{name}"
+            if full not in seen:
+                lines.append(f"# TYPE {full} counter")
+                seen.add(full)
+            lines.append(f"{full}{fmt(labels)} {value:g}")
+        for (name, labels), h in histograms:
+            full = f"{METRICS_PREFIX}_{name}"
+            if full not in seen:
+                lines.append(f"# TYPE {full} histogram")
+                seen.add(full)
+            for bound, count in zip(DURATION_BUCKETS, h):
+                lines.append(f"{full}_bucket{fmt(labels, [('le', f'{bound:g}')])} {count}")
+            lines.append(f"{full}_bucket{fmt(labels, [('le', '+Inf')])} {h[-1]}")
+            lines.append(f"{full}_sum{fmt(labels)} {h[-2]:.6f}")
+            lines.append(f"{full}_count{fmt(labels)} {h[-1]}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+
+class JobMetrics:
+    """Per-stage totals and counters of one job, exportable as JSON."""
+
+    def __init__(self, job_id: str):
+        self.job_id = job_id
+        self.started = time.time()
+        self.finished = None
+        self.stages = {}    # stage -> {"calls", "errors", "seconds", "max_seconds", "bytes_in", "bytes_out"}
+        self.counters = {}  # "name" or "name:label=value,..." -> value
+        self.profile = {}
+        self._lock = threading.Lock()
+
+    def observe(self, stage: str, seconds: float, ok: bool = True, bytes_in: int = 0, bytes_out: int = 0):
+        with self._lock:
+            s = self.stages.setdefault(stage, {"calls": 0, "errors": 0, "seconds": 0.0, "max_seconds": 0.0,
+                                               "bytes_in": 0, "bytes_out": 0})
+            s["calls"] += 1
+            s["errors"] += 0 if ok else 1
+            s["seconds"] += seconds
+            s["max_seconds"] = max(s["max_seconds"], seconds)
+            s["bytes_in"] += bytes_in
+            s["bytes_out"] += bytes_out
+
+    def incr(self, name: str, value: float = 1, **labels):
+        if labels:
+            name = f"{name}:" + ",".join(f"{k}={v}" for k, v in _labels_key(labels))
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def merge(self, data: dict):
+        """Add the stages and counters of another job's to_dict() (e.g. from a worker process)."""
+        for stage, s in (data.get("stages") or {}).items():
+            with self._lock:
+                mine = self.stages.setdefault(stage, {"calls": 0, "errors": 0, "seconds": 0.0, "max_seconds": 0.0,
+                                                      "bytes_in": 0, "bytes_out": 0})
+                for k, v in s.items():
+                    mine[k] = max(mine[k], v) if k == "max_seconds" else mine[k] + v
+        for name, value in (data.get("counters") or {}).items():
+            with self._lock:
+                self.counters[name] = self.counters.get(name, 0) + value
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            return {
+                "job_id": self.job_id,
+                "started": self.started,
+                "finished": self.finished,
+                "wall_seconds": round((self.finished or time.time()) - self.started, 3),
+                "stages": {k: dict(v, seconds=round(v["seconds"], 3), max_seconds=round(v["max_seconds"], 3))
+                           for k, v in self.stages.items()},
+                "counters": dict(self.counters),
+                "profile": dict(self.profile),
+            }
+
+    def to_json(self) -> str:
+        return json.dumps(self.to_dict(), indent=2)
+
+    def save(self, directory: str = None):
+        """Write <job_id>.json to `directory` (default METRICS_DIR); returns the path or None."""
+        directory = directory or os.getenv("METRICS_DIR")
+        if not directory:
+            return None
+        Path(directory).mkdir(parents=True, exist_ok=True)
+        path = Path(directory) / f"{self.job_id}.json"
+        path.write_text(self.to_json(), encoding="utf-8")
+        return str(path)
+
+
+def current_job():
+    return _current_job.get()
+
+
+@contextlib.contextmanager
+def job_metrics(job_id: str):
+    """Record everything instrumented inside the block into a new JobMetrics."""
+    metrics = JobMetrics(job_id)
+    token = _current_job.set(metrics)
+    try:
+        with profiled(metrics):
+            yield metrics
+    finally:
+        metrics.finished = time.time()
+        _current_job.reset(token)
+
+
+def propagate(fn):
+    """Wrap `fn` to run in a copy of the current context (use when submitting to a pool or thread)."""
+    ctx = contextvars.copy_context()
+    return functools.partial(ctx.run, fn)
+
+
+def incr(name: str, value: float = 1, **labels):
+    REGISTRY.incr(f"{name}_total", value, **labels)
+    job = _current_job.get()
+    if job is not None:
+        job.incr(name, value, **labels)
+
+
+def observe(stage: str, seconds: float, ok: bool = True, bytes_in: int = 0, bytes_out: int = 0):
+    REGISTRY.observe("stage_duration_seconds", seconds, stage=stage)
+    REGISTRY.incr("stage_calls_total", 1, stage=stage, status="ok" if ok else "error")
+    if bytes_in:
+        REGISTRY.incr("stage_bytes_in_total", bytes_in, stage=stage)
+    if bytes_out:
+        REGISTRY.incr("stage_bytes_out_total", bytes_out, stage=stage)
+    job = _current_job.get()
+    if job is not None:
+        job.observe(stage, seconds, ok, bytes_in, bytes_out)
+
+
+def _safe(fn, *args):
+    try:
+        return int(fn(*args) or 0)
+    except Exception:
+        return 0
+
+
+def instrumented(stage: str, bytes_in=None, bytes_out=None):
+    """
+    Decorator recording each call of the function as `stage`.
+    `bytes_in(args, kwargs)` and `bytes_out(result)` compute the sizes to
+    record. For generator functions the call lasts until the generator is
+    exhausted or closed, and `bytes_out` is applied to every yielded item.
+    """
+    def decorate(fn):
+        if inspect.isgeneratorfunction(fn):
+            @functools.wraps(fn)
+            def gen_wrapper(*args, **kwargs):
+                started = time.monotonic()
+                size_in = _safe(bytes_in, args, kwargs) if bytes_in else 0
+                size_out, ok = 0, False
+                try:
+                    for item in fn(*args, **kwargs):
+                        if bytes_out:
+                            size_out += _safe(bytes_out, item)
+                        yield item
+                    ok = True
+                except GeneratorExit:
+                    ok = True
+                    raise
+                finally:
+                    observe(stage, time.monotonic() - started, ok, size_in, size_out)
+            return gen_wrapper
+
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                started = time.monotonic()
+                ok, result = False, None
+                try:
+                    result = await fn(*args, **kwargs)
+                    ok = True
+                    return result
+                finally:
+                    observe(stage, time.monotonic() - started, ok,
+                            _safe(bytes_in, args, kwargs) if bytes_in else 0,
+                            _safe(bytes_out, result) if bytes_out and ok else 0)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            started = time.monotonic()
+            ok, result = False, None
+            try:
+                result = fn(*args, **kwargs)
+                ok = True
+                return result
+            finally:
+                observe(stage, time.monotonic() - started, ok,
+                        _safe(bytes_in, args, kwargs) if bytes_in else 0,
+                        _safe(bytes_out, result) if bytes_out and ok else 0)
+        return wrapper
+    return decorate
+
+
+def _profile_modes():
+    return {m.strip().lower() for m in os.getenv("PROFILE_MODE", "").split(",") if m.strip()}
+
+
+@contextlib.contextmanager
+def profiled(metrics: JobMetrics, modes=None):
+    """
+    Optional profiling of a job. "cprofile" profiles the calling thread and
+    stores the top functions by cumulative time (and the full .prof file in
+    METRICS_DIR if set); "tracemalloc" stores peak traced memory and the top
+    allocation sites across all threads.
+    """
+    modes = _profile_modes() if modes is None else set(modes)
+    profiler = None
+    tracing = False
+    if "cprofile" in modes:
+        import cProfile
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError as e:  # only one profiler may be active at a time (e.g. concurrent jobs)
+            metrics.profile["cprofile_error"] = str(e)
+            profiler = None
+    if "tracemalloc" in modes:
+        tracing = _tracemalloc_start()
+    try:
+        yield
+    finally:
+        if profiler is not None:
+            import pstats
+            profiler.disable()
+            out = io.StringIO()
+            stats = pstats.Stats(profiler, stream=out).sort_stats("cumulative")
+            stats.print_stats(25)
+            metrics.profile["cprofile_top"] = out.getvalue()
+            directory = os.getenv("METRICS_DIR")
+            if directory:
+                Path(directory).mkdir(parents=True, exist_ok=True)
+                stats.dump_stats(str(Path(directory) / f"{metrics.job_id}.prof"))
+        if tracing:
+            import tracemalloc
+            # Peak is process-wide, so concurrent jobs see each other's allocations
+            _, peak = tracemalloc.get_traced_memory()
+            top = tracemalloc.take_snapshot().statistics("lineno")[:15]
+            metrics.profile["tracemalloc_peak_bytes"] = peak
+            metrics.profile["tracemalloc_top"] = [str(s) for s in top]
+            _tracemalloc_stop()
+
+
+_tracemalloc_users = 0
+_tracemalloc_lock = threading.Lock()
+
+
+def _tracemalloc_start() -> bool:
+    """Start tracemalloc for a job (reference counted across concurrent jobs)."""
+    global _tracemalloc_users
+    import tracemalloc
+    with _tracemalloc_lock:
+        if _tracemalloc_users == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start(10)
+        elif _tracemalloc_users == 0:
+            return False  # traced by someone else; leave it alone
+        _tracemalloc_users += 1
+        return True
+
+
+def _tracemalloc_stop():
+    global _tracemalloc_users
+    import tracemalloc
+    with _tracemalloc_lock:
+        _tracemalloc_users -= 1
+        if _tracemalloc_users == 0:
+            tracemalloc.stop()
+
+
+def render_prometheus() -> str:
+    return REGISTRY.render_prometheus()
+
+
+_servers = {}
+_servers_lock = threading.Lock()
+
+
+def start_metrics_server(port: int = None, host: str = "0.0.0.0"):
+    """
+    Serve render_prometheus() at http://host:port/metrics from a daemon thread
+    (once per process and port). `port` defaults to METRICS_PORT; does nothing
+    if neither is set. Returns the server or None.
+    """
+    port = int(port or os.getenv("METRICS_PORT") or 0)
+    if not port:
+        return None
+    with _servers_lock:
+        if port in _servers:
+            return _servers[port]
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] not in ("/metrics", "/"):
+                    self.send_error(404)
+                    return
+                body = render_prometheus().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+        _servers[port] = server
+        return server
@@ -0,0 +1,117 @@
+# utils/pipeline.py
+"""The convert → chunk → transcribe → summarize pipeline without any UI.
+
+Used by the queue worker; `settings` has the same keys as the app's job
+settings (model, chunk_minutes, chunk_codec, split_on_silence, skip_silence,
+trim_silence_seconds, speedup, summary_mode, use_cache, concurrency,
+throttle_seconds).
+"""
+import os
+
+from .audio_utils import AudioSource, ensure_wav_mono_16k, chunk_audio, iter_chunks
+from .gemini_client import summarize_text, MODEL
+from .transcription import transcribe_chunks, merge_transcript, DEFAULT_CONCURRENCY
+from .transcript_cache import get_default_cache
+from .jobs import JobStore
+from .metrics import job_metrics
+from .workspace import workspace
+from .condense import condense_wav, condense_enabled
+
+
+def job_settings(settings: dict) -> dict:
+    """
+    The settings that determine chunk boundaries and transcripts (the journal
+    key). The app, batch.py and the worker all derive job ids from this, so
+    the same upload maps to the same journal everywhere.
+    """
+    keys = ("model", "chunk_minutes", "chunk_codec", "split_on_silence", "skip_silence")
+    picked = {k: settings.get(k) for k in keys}
+    # Only when enabled, so journals of runs without condensing keep their ids
+    if condense_enabled(settings.get("trim_silence_seconds"), settings.get("speedup")):
+        picked.update(trim_silence_seconds=float(settings.get("trim_silence_seconds") or 0),
+                      speedup=float(settings.get("speedup") or 1.0))
+    return picked
+
+
+def run_pipeline(src_path: str, settings: dict, on_result=None, job_store: JobStore = None) -> dict:
+    """
+    Process one recording. Transcription is journaled (see utils.jobs), so a
+    rerun after a crash only transcribes the missing chunks. `on_result` is
+    passed to transcribe_chunks. Returns a dict with "transcript", "summary",
+    "chunks", "failed" (always 0) and "metrics" (see utils.metrics; also saved
+    to METRICS_DIR if set). Raises if any chunk could not be transcribed, so a
+    partial transcript is never summarized or reported as finished.
+    """
+    job_store = job_store or JobStore()
+    job_id = job_store.job_id_for(src_path, job_settings(settings))
+    with job_metrics(job_id) as run_metrics:
+        outcome = _run(src_path, settings, on_result, job_store, job_id)
+    run_metrics.save()
+    outcome["metrics"] = run_metrics.to_dict()
+    return outcome
+
+
+def _run(src_path: str, settings: dict, on_result, job_store: JobStore, job_id: str) -> dict:
+    model = settings.get("model") or MODEL
+    chunk_seconds = int(settings.get("chunk_minutes", 5)) * 60
+    source = AudioSource(src_path)
+
+    condensing = condense_enabled(settings.get("trim_silence_seconds"), settings.get("speedup"))
+    with workspace() as work_dir:
+        pipelined = not settings.get("skip_silence") and not condensing
+        if pipelined:
+            chunks = iter_chunks(
+                source,
+                chunk_length_seconds=chunk_seconds,
+                codec=settings.get("chunk_codec"),
+                split_on_silence=settings.get("split_on_silence", True),
+                out_dir=work_dir,
+            )
+        else:
+            wav_path = ensure_wav_mono_16k(source, out_path=os.path.join(work_dir, "normalized.wav"))
+            time_map = None
+            if condensing:
+                source.release()
+                condensed_path = os.path.join(work_dir, "condensed.wav")
+                time_map = condense_wav(wav_path, condensed_path,
+                                        trim_silence_seconds=settings.get("trim_silence_seconds") or 0,
+                                        speedup=settings.get("speedup") or 1.0)
+                wav_path, source = condensed_path, AudioSource(condensed_path)
+            chunks = chunk_audio(
+                wav_path,
+                chunk_length_seconds=chunk_seconds,
+                source=source,
+                split_on_silence=settings.get("split_on_silence", True),
+                skip_silence=bool(settings.get("skip_silence")),
+                codec=settings.get("chunk_codec"),
+                out_dir=work_dir,
+            )
+            source.release()
+            if time_map is not None:
+                chunks = time_map.map_chunks(chunks)  # transcript times of the original recording
+
+        job = job_store.open(job_id, None if pipelined else chunks, settings=job_settings(settings))
+        results = transcribe_chunks(
+            chunks,
+            model=model,
+            concurrency=settings.get("concurrency") or DEFAULT_CONCURRENCY,
+            throttle_seconds=settings.get("throttle_seconds") or 0.0,
+            on_result=on_result,
+            cache=get_default_cache() if settings.get("use_cache", True) else None,
+            job=job,
+        )
+
+    if any(r.rate_limited for r in results):
+        raise Exception("API quota/rate limit exceeded. Progress is saved; the job can be retried.")
+    failed = sum(1 for r in results if not r.ok)
+    if failed:
+        raise Exception(f"{failed}/{len(results)} chunk(s) failed. Progress is saved; the job can be retried.")
+
+    transcript = merge_transcript(results)
+    summary = summarize_text(transcript, model=model, mode=settings.get("summary_mode", "concise"))
+    return {
+        "transcript": transcript,
+        "summary": summary,
+        "chunks": len(results),
+        "failed": failed,
+    }
@@ -0,0 +1,161 @@
+# utils/quota.py
+"""Process-wide Gemini quota manager.
+
+Two token buckets per scope (requests per minute and tokens per minute) are
+kept in a small SQLite database, so every Streamlit session, CLI run and
+worker process on the machine draws from the same budget. Callers block in
+`acquire` for exactly as long as the buckets need to refill instead of
+sleeping fixed amounts, and a 429 from the API drains the buckets for
+everyone via `penalize`.
+"""
+import os
+import time
+import asyncio
+import sqlite3
+import threading
+from pathlib import Path
+
+DEFAULT_DB_PATH = os.path.join(Path.home(), ".cache", "voice2notes", "quota.sqlite")
+# Free tier defaults; raise them (e.g. GEMINI_RPM=1000) on paid quotas.
+DEFAULT_RPM = int(os.getenv("GEMINI_RPM", "15"))
+DEFAULT_TPM = int(os.getenv("GEMINI_TPM", "1000000"))
+
+# Gemini bills audio at 32 tokens per second.
+AUDIO_TOKENS_PER_SECOND = 32
+
+
+def estimate_text_tokens(text: str) -> int:
+    """Rough token count for text (about 4 characters per token)."""
+    return len(text or "") // 4 + 1
+
+
+class QuotaManager:
+    """Shared requests-per-minute and tokens-per-minute buckets backed by SQLite."""
+
+    def __init__(self, db_path: str = None, rpm: int = DEFAULT_RPM, tpm: int = DEFAULT_TPM):
+        self.db_path = Path(db_path or os.getenv("QUOTA_DB_PATH") or DEFAULT_DB_PATH)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True, mode=0o700)
+        self.rpm = max(1, int(rpm))
+        self.tpm = max(1, int(tpm))
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS buckets ("
+                "name TEXT PRIMARY KEY, level REAL NOT NULL, updated REAL NOT NULL)"
+            )
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.db_path), timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def _limits(self, scope: str, requests: int, tokens: int):
+        # (bucket name, capacity, refill per second, amount wanted)
+        return [
+            (f"{scope}:rpm", self.rpm, self.rpm / 60.0, min(requests, self.rpm)),
+            (f"{scope}:tpm", self.tpm, self.tpm / 60.0, min(tokens, self.tpm)),
+        ]
+
+    def _levels(self, conn, limits, now):
+        levels = []
+        for name, capacity, rate, _ in limits:
+            row = conn.execute("SELECT level, updated FROM buckets WHERE name = ?", (name,)).fetchone()
+            if row is None:
+                levels.append(capacity)
+            else:
+                level, updated = row
+                levels.append(min(capacity, level + max(0.0, now - updated) * rate))
+        return levels
+
+    def _try_acquire(self, scope: str, requests: int, tokens: int, commit: bool = True) -> float:
+        """Take from both buckets if possible. Returns 0.0, or seconds until it would be."""
+        limits = self._limits(scope, requests, tokens)
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            now = time.time()
+            levels = self._levels(conn, limits, now)
+            wait = max(
+                (amount - level) / rate if level < amount else 0.0
+                for (_, _, rate, amount), level in zip(limits, levels)
+            )
+            if wait <= 0 and commit:
+                for (name, _, _, amount), level in zip(limits, levels):
+                    conn.execute(
+                        "INSERT OR REPLACE INTO buckets (name, level, updated) VALUES (?, ?, ?)",
+                        (name, level - amount, now),
+                    )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return wait
+
+    def acquire(self, scope: str = "default", requests: int = 1, tokens: int = 0, timeout: float = None) -> float:
+        """
+        Block until `requests` and `tokens` are available in `scope`, then take
+        them. Returns the seconds spent waiting. Raises TimeoutError if that
+        would take longer than `timeout`.
+        """
+        started = time.monotonic()
+        while True:
+            wait = self._try_acquire(scope, requests, tokens)
+            if wait <= 0:
+                return time.monotonic() - started
+            if timeout is not None and time.monotonic() - started + wait > timeout:
+                raise TimeoutError(f"API quota wait of {wait:.0f}s exceeds {timeout:.0f}s")
+            # Other processes may take tokens meanwhile; re-check after sleeping
+            time.sleep(min(wait, 5.0))
+
+    async def acquire_async(self, scope: str = "default", requests: int = 1, tokens: int = 0,
+                            timeout: float = None) -> float:
+        """Like `acquire`, but waits with asyncio.sleep instead of blocking the thread."""
+        started = time.monotonic()
+        while True:
+            wait = await asyncio.to_thread(self._try_acquire, scope, requests, tokens)
+            if wait <= 0:
+                return time.monotonic() - started
+            if timeout is not None and time.monotonic() - started + wait > timeout:
+                raise TimeoutError(f"API quota wait of {wait:.0f}s exceeds {timeout:.0f}s")
+            await asyncio.sleep(min(wait, 5.0))
+
+    def estimate_wait(self, scope: str = "default", requests: int = 1, tokens: int = 0) -> float:
+        """Seconds a request of this size would currently have to wait."""
+        return self._try_acquire(scope, requests, tokens, commit=False)
+
+    def penalize(self, scope: str = "default", seconds: float = 30.0):
+        """
+        Drain `scope` so that nobody sends for about `seconds`; used when the
+        API answers 429 despite local pacing (e.g. another machine shares the key).
+        """
+        limits = self._limits(scope, 1, 0)
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            now = time.time()
+            levels = self._levels(conn, limits, now)
+            for (name, _, rate, _), level in zip(limits, levels):
+                conn.execute(
+                    "INSERT OR REPLACE INTO buckets (name, level, updated) VALUES (?, ?, ?)",
+                    (name, min(level, -rate * seconds), now),
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+
+_default_quota = None
+_default_lock = threading.Lock()
+
+
+def get_quota() -> QuotaManager:
+    """Process-wide QuotaManager (the SQLite file makes it machine-wide)."""
+    global _default_quota
+    with _default_lock:
+        if _default_quota is None:
+            _default_quota = QuotaManager()
+        return _default_quota
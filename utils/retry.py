@@ -0,0 +1,281 @@
+# utils/retry.py
+"""Retry policy for Gemini API calls.
+
+Errors are classified from the SDK's structured status codes (falling back to
+message matching only for exceptions that carry none), server-provided retry
+delays are honored, other transient errors back off exponentially with full
+jitter under a total deadline, and a per-scope circuit breaker makes queued
+work fail fast after repeated 5xx responses instead of piling up sleeping
+threads.
+"""
+import os
+import re
+import time
+import asyncio
+import inspect
+import random
+import threading
+from dataclasses import dataclass
+
+RATE_LIMITED = "rate_limited"
+UNAVAILABLE = "unavailable"
+UPLOAD_PENDING = "upload_pending"
+FATAL = "fatal"
+
+RETRYABLE_KINDS = {RATE_LIMITED, UNAVAILABLE, UPLOAD_PENDING}
+
+_RATE_LIMIT_STATUSES = {"RESOURCE_EXHAUSTED"}
+_UNAVAILABLE_STATUSES = {"UNAVAILABLE", "DEADLINE_EXCEEDED", "INTERNAL"}
+_DURATION_RE = re.compile(r"^\s*([\d.]+)\s*s\s*$")
+
+
+@dataclass
+class ErrorInfo:
+    kind: str
+    code: int = None
+    retry_after: float = None
+
+
+class CircuitOpenError(Exception):
+    """Raised without calling the API while the circuit for a scope is open."""
+
+
+class QuotaWaitError(Exception):
+    """
+    Raised when a call gives up waiting for the local shared quota. The API
+    was never called, so this is not a server rate limit and is not retried.
+    """
+
+
+def _status_code(exc):
+    for attr in ("code", "status_code"):
+        value = getattr(exc, attr, None)
+        value = getattr(value, "value", value)  # grpc/api_core enums
+        if isinstance(value, int):
+            return value
+    response = getattr(exc, "response", None)
+    value = getattr(response, "status_code", None)
+    return value if isinstance(value, int) else None
+
+
+def _parse_duration(value):
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        m = _DURATION_RE.match(value)
+        if m:
+            return float(m.group(1))
+        try:
+            return float(value)
+        except ValueError:
+            return None
+    if isinstance(value, dict):  # {"seconds": 3, "nanos": 0}
+        return float(value.get("seconds", 0)) + float(value.get("nanos", 0)) / 1e9
+    return None
+
+
+def retry_after_seconds(exc):
+    """Server-provided retry delay from a RetryInfo detail or Retry-After header."""
+    details = getattr(exc, "details", None)
+    if isinstance(details, dict):
+        details = details.get("error", details).get("details")
+    if isinstance(details, list):
+        for detail in details:
+            if isinstance(detail, dict) and "retryDelay" in detail:
+                delay = _parse_duration(detail["retryDelay"])
+                if delay is not None:
+                    return delay
+    headers = getattr(getattr(exc, "response", None), "headers", None)
+    if headers is not None:
+        try:
+            return _parse_duration(headers.get("retry-after"))
+        except Exception:
+            return None
+    return None
+
+
+def classify_error(exc) -> ErrorInfo:
+    """Classify an exception raised by an SDK call."""
+    if isinstance(exc, QuotaWaitError):
+        return ErrorInfo(FATAL)
+    code = _status_code(exc)
+    status = str(getattr(exc, "status", "") or "").upper()
+    retry_after = retry_after_seconds(exc)
+    message = str(exc).lower()
+
+    if "upload status is not finalized" in message:
+        return ErrorInfo(UPLOAD_PENDING, code, retry_after)
+    if code == 429 or status in _RATE_LIMIT_STATUSES:
+        return ErrorInfo(RATE_LIMITED, code, retry_after)
+    if code in (500, 502, 503, 504) or status in _UNAVAILABLE_STATUSES:
+        return ErrorInfo(UNAVAILABLE, code, retry_after)
+    if code is not None:
+        return ErrorInfo(FATAL, code, retry_after)
+
+    # No structured code (e.g. transport errors): fall back to the message
+    if any(p in message for p in ("429", "resource exhausted", "resource_exhausted", "quota", "rate limit", "too many requests")):
+        return ErrorInfo(RATE_LIMITED, None, retry_after)
+    if any(p in message for p in ("503", "unavailable", "deadline exceeded", "timed out", "connection reset")):
+        return ErrorInfo(UNAVAILABLE, None, retry_after)
+    return ErrorInfo(FATAL, None, retry_after)
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive unavailable errors; while open
+    calls fail immediately. After `cooldown` seconds one trial call is let
+    through (half-open): success closes the circuit, failure re-opens it.
+    """
+
+    def __init__(self, failure_threshold: int = 5, cooldown: float = 60.0):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self._failures = 0
+        self._opened_at = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self) -> bool:
+        with self._lock:
+            return self._opened_at is not None and time.monotonic() - self._opened_at < self.cooldown
+
+    def before_call(self):
+        with self._lock:
+            if self._opened_at is None:
+                return
+            if time.monotonic() - self._opened_at < self.cooldown or self._trial_running:
+                raise CircuitOpenError("API temporarily unavailable (too many 503 errors). Please try again in a few minutes.")
+            self._trial_running = True  # half-open: let exactly one call through
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_running = False
+
+    def record_failure(self, kind: str):
+        with self._lock:
+            if kind != UNAVAILABLE:
+                self._trial_running = False
+                return
+            self._failures += 1
+            if self._trial_running or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+            self._trial_running = False
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(scope: str) -> CircuitBreaker:
+    with _breakers_lock:
+        if scope not in _breakers:
+            _breakers[scope] = CircuitBreaker(
+                failure_threshold=int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5")),
+                cooldown=float(os.getenv("CIRCUIT_COOLDOWN_SECONDS", "60")),
+            )
+        return _breakers[scope]
+
+
+class RetryError(Exception):
+    """Raised when retries are exhausted; `info` holds the last classification."""
+
+    def __init__(self, info: ErrorInfo, last_exc: Exception):
+        super().__init__(str(last_exc))
+        self.info = info
+        self.last_exc = last_exc
+
+
+class RetryPolicy:
+    """Jittered exponential backoff bounded by attempts and a total deadline."""
+
+    def __init__(self, max_attempts: int = None, base_delay: float = None,
+                 max_delay: float = None, deadline: float = None):
+        self.max_attempts = max_attempts or int(os.getenv("RETRY_MAX_ATTEMPTS", "4"))
+        self.base_delay = base_delay if base_delay is not None else float(os.getenv("RETRY_BASE_DELAY", "2"))
+        self.max_delay = max_delay if max_delay is not None else float(os.getenv("RETRY_MAX_DELAY", "60"))
+        self.deadline = deadline if deadline is not None else float(os.getenv("RETRY_DEADLINE_SECONDS", "180"))
+
+    def backoff(self, attempt: int, info: ErrorInfo) -> float:
+        """Delay before retry number `attempt` (0-based)."""
+        if info.retry_after is not None:
+            return min(max(info.retry_after, 0.0), self.max_delay)
+        cap = min(self.max_delay, self.base_delay * (2 ** attempt))
+        return random.uniform(0, cap)  # full jitter
+
+    def _failed(self, exc, breaker, attempt: int, started: float):
+        """
+        Book-keeping for a failed attempt: returns (info, delay) for a retry,
+        re-raises fatal errors and raises RetryError once attempts or the
+        deadline are exhausted. Must be called from the `except` block.
+        """
+        info = classify_error(exc)
+        breaker.record_failure(info.kind)
+        if info.kind not in RETRYABLE_KINDS:
+            raise
+        delay = self.backoff(attempt, info)
+        if attempt + 1 >= self.max_attempts or time.monotonic() - started + delay > self.deadline:
+            raise RetryError(info, exc)
+        return info, delay
+
+    def call(self, fn, scope: str = "default", on_backoff=None, sleep=time.sleep):
+        """
+        Call fn() with retries. `on_backoff(info, delay)` is invoked before each
+        wait and may return True if it has arranged the wait itself (e.g. by
+        draining a shared quota), in which case no local sleep happens.
+        Raises CircuitOpenError, the original exception for fatal errors, or
+        RetryError once attempts or the deadline are exhausted.
+        """
+        breaker = get_breaker(scope)
+        started = time.monotonic()
+        attempt = 0
+        while True:
+            breaker.before_call()
+            try:
+                result = fn()
+            except Exception as exc:
+                info, delay = self._failed(exc, breaker, attempt, started)
+                attempt += 1
+                handled = on_backoff(info, delay) if on_backoff is not None else False
+                if not handled:
+                    sleep(delay)
+                continue
+            breaker.record_success()
+            return result
+
+    async def call_async(self, fn, scope: str = "default", on_backoff=None):
+        """
+        Async version of `call`: `fn` returns an awaitable and waits use
+        asyncio.sleep, so a retrying request does not hold a thread.
+        `on_backoff(info, delay)` may be a plain callable or a coroutine function.
+        """
+        breaker = get_breaker(scope)
+        started = time.monotonic()
+        attempt = 0
+        while True:
+            breaker.before_call()
+            try:
+                result = await fn()
+            except Exception as exc:
+                info, delay = self._failed(exc, breaker, attempt, started)
+                attempt += 1
+                handled = on_backoff(info, delay) if on_backoff is not None else False
+                if inspect.isawaitable(handled):
+                    handled = await handled
+                if not handled:
+                    await asyncio.sleep(delay)
+                continue
+            breaker.record_success()
+            return result
+
+
+_default_policy = None
+
+
+def get_policy() -> RetryPolicy:
+    global _default_policy
+    if _default_policy is None:
+        _default_policy = RetryPolicy()
+    return _default_policy
@@ -0,0 +1,175 @@
+# utils/transcript_cache.py
+"""Persistent, content-addressed cache of chunk transcripts.
+
+Entries are keyed by a hash of the chunk's decoded PCM samples plus the model
+name and prompt, so a re-encoded or re-uploaded copy of the same recording
+still hits. The cache lives on disk as one small JSON file per entry; the
+file's mtime doubles as the LRU timestamp.
+"""
+import os
+import json
+import time
+import wave
+import hashlib
+import threading
+from pathlib import Path
+
+DEFAULT_CACHE_DIR = os.path.join(Path.home(), ".cache", "voice2notes", "transcripts")
+DEFAULT_MAX_BYTES = int(float(os.getenv("TRANSCRIPT_CACHE_MAX_MB", "200")) * 1024 * 1024)
+# Scanning the directory costs O(entries). Between scans the cache tracks its
+# size from its own writes, and rescans after this many puts to pick up
+# entries written by other processes.
+EVICT_SCAN_INTERVAL = 256
+# Eviction frees down to this share of the cap, so a full cache is not
+# rescanned on every put.
+EVICT_TARGET_RATIO = 0.9
+
+
+def pcm_fingerprint(path: str) -> str:
+    """
+    SHA-256 of the audio samples in `path`, independent of container/headers.
+    WAV files are hashed straight from their frames; other formats are decoded
+    to mono 16k PCM first.
+    """
+    h = hashlib.sha256()
+    try:
+        with wave.open(path, "rb") as w:
+            h.update(f"{w.getframerate()}:{w.getnchannels()}:{w.getsampwidth()}".encode())
+            while True:
+                block = w.readframes(1 << 16)
+                if not block:
+                    break
+                h.update(block)
+        return h.hexdigest()
+    except (wave.Error, EOFError):
+        pass
+
+    from .audio_utils import decode_pcm
+    h.update(b"16000:1:2")
+    h.update(decode_pcm(path))
+    return h.hexdigest()
+
+
+class TranscriptCache:
+    """On-disk transcript cache with a total size cap and LRU eviction."""
+
+    def __init__(self, cache_dir: str = None, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.cache_dir = Path(cache_dir or os.getenv("TRANSCRIPT_CACHE_DIR") or DEFAULT_CACHE_DIR).expanduser()
+        self.cache_dir.mkdir(parents=True, exist_ok=True, mode=0o700)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._size = None  # bytes on disk at the last scan plus our writes since
+        self._puts_since_scan = 0
+
+    @staticmethod
+    def make_key(fingerprint: str, model: str, prompt: str) -> str:
+        h = hashlib.sha256()
+        for part in (fingerprint, model or "", prompt or ""):
+            h.update(part.encode("utf-8"))
+            h.update(b"\0")
+        return h.hexdigest()
+
+    def key_for(self, chunk_path, model: str, prompt: str) -> str:
+        """
+        Cache key for the audio in `chunk_path` transcribed with model/prompt.
+        In-memory chunks carry their fingerprint (`pcm_sha256`) already.
+        """
+        fingerprint = getattr(chunk_path, "pcm_sha256", None) or pcm_fingerprint(chunk_path)
+        return self.make_key(fingerprint, model, prompt)
+
+    def _entry_path(self, key: str) -> Path:
+        return self.cache_dir / f"{key}.json"
+
+    def get(self, key: str):
+        """Return the cached transcript for `key`, or None."""
+        path = self._entry_path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                text = json.load(f)["text"]
+            os.utime(path)  # mark as recently used
+        except (OSError, ValueError, KeyError):
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return text
+
+    def put(self, key: str, text: str, model: str = None):
+        """Store a transcript and evict least recently used entries if over the cap."""
+        path = self._entry_path(key)
+        tmp = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"text": text, "model": model, "created": time.time()}, f)
+        try:
+            old_size = path.stat().st_size
+        except OSError:
+            old_size = 0
+        new_size = tmp.stat().st_size
+        os.replace(tmp, path)
+        with self._lock:
+            self._puts_since_scan += 1
+            if self._size is not None:
+                self._size += new_size - old_size
+            scan = (self._size is None or self._size > self.max_bytes
+                    or self._puts_since_scan >= EVICT_SCAN_INTERVAL)
+            if scan:
+                self._puts_since_scan = 0
+        if scan:
+            self._evict()
+
+    def _evict(self):
+        """Scan the directory, drop least recently used entries over the cap, and resync the size."""
+        entries = []
+        total = 0
+        for p in self.cache_dir.glob("*.json"):
+            try:
+                st = p.stat()
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, p))
+            total += st.st_size
+        if total > self.max_bytes:
+            target = self.max_bytes * EVICT_TARGET_RATIO
+            entries.sort()
+            for _, size, p in entries:
+                if total <= target:
+                    break
+                try:
+                    p.unlink()
+                    total -= size
+                    with self._lock:
+                        self.evictions += 1
+                except OSError:
+                    pass
+        with self._lock:
+            self._size = total
+
+    def clear(self):
+        for p in self.cache_dir.glob("*.json"):
+            try:
+                p.unlink()
+            except OSError:
+                pass
+        with self._lock:
+            self._size = None
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions}
+
+
+_default_cache = None
+_default_lock = threading.Lock()
+
+
+def get_default_cache() -> TranscriptCache:
+    """Process-wide cache instance (created on first use)."""
+    global _default_cache
+    with _default_lock:
+        if _default_cache is None:
+            _default_cache = TranscriptCache()
+        return _default_cache
@@ -0,0 +1,149 @@
+# utils/transcript_index.py
+"""Passage index over a merged transcript for question answering.
+
+The merged transcript (one "[mm:ss] text" paragraph per chunk) is cut into
+timestamp-aligned passages and indexed with BM25 over an in-memory inverted
+index, so a question only needs the few passages that are relevant to it.
+"""
+import re
+import math
+from collections import Counter, defaultdict
+from dataclasses import dataclass
+
+PASSAGE_CHARS = 1200
+DEFAULT_TOP_K = 6
+
+_TIMESTAMP_RE = re.compile(r"^\[(\d+):(\d{2})\]\s*")
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+_STOPWORDS = frozenset(
+    "a an and are as at be but by did do does for from had has have how i if in is it its "
+    "of on or so that the their then there these they this to was we were what when where "
+    "which who why will with you your".split()
+)
+
+
+def tokenize(text: str):
+    return [t for t in _TOKEN_RE.findall(text.lower()) if t not in _STOPWORDS]
+
+
+def format_timestamp(seconds: int) -> str:
+    return f"[{seconds // 60:02d}:{seconds % 60:02d}]"
+
+
+@dataclass
+class Passage:
+    start_sec: int
+    text: str
+
+    def render(self) -> str:
+        return f"{format_timestamp(self.start_sec)} {self.text}"
+
+
+def _split_sentences(text: str, max_chars: int):
+    """Greedy split into pieces of at most max_chars, preferring sentence ends."""
+    sentences = re.split(r"(?<=[.!?])\s+", text.strip())
+    pieces, current = [], ""
+    for sentence in sentences:
+        while len(sentence) > max_chars:
+            if current:
+                pieces.append(current)
+                current = ""
+            pieces.append(sentence[:max_chars])
+            sentence = sentence[max_chars:]
+        if current and len(current) + 1 + len(sentence) > max_chars:
+            pieces.append(current)
+            current = sentence
+        else:
+            current = f"{current} {sentence}".strip()
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+def split_passages(transcript: str, max_chars: int = PASSAGE_CHARS):
+    """
+    Turn a merged transcript into Passages. Paragraphs longer than max_chars
+    are split at sentence ends; the start time of each piece is interpolated
+    between its paragraph's timestamp and the next one.
+    """
+    paragraphs = []
+    for para in transcript.split("\n\n"):
+        para = para.strip()
+        if not para:
+            continue
+        m = _TIMESTAMP_RE.match(para)
+        if m:
+            paragraphs.append((int(m.group(1)) * 60 + int(m.group(2)), para[m.end():]))
+        elif paragraphs:
+            start, prev = paragraphs[-1]
+            paragraphs[-1] = (start, f"{prev}\n\n{para}")
+        else:
+            paragraphs.append((0, para))
+
+    passages = []
+    for i, (start, text) in enumerate(paragraphs):
+        end = paragraphs[i + 1][0] if i + 1 < len(paragraphs) else None
+        pieces = _split_sentences(text, max_chars)
+        total = sum(len(p) for p in pieces) or 1
+        offset = 0
+        for piece in pieces:
+            piece_start = start
+            if end is not None and end > start:
+                piece_start = start + int((end - start) * offset / total)
+            passages.append(Passage(piece_start, piece))
+            offset += len(piece)
+    return passages
+
+
+class TranscriptIndex:
+    """BM25 ranking over transcript passages."""
+
+    def __init__(self, passages, k1: float = 1.5, b: float = 0.75):
+        self.passages = list(passages)
+        self.k1 = k1
+        self.b = b
+        self._postings = defaultdict(list)  # term -> [(passage_idx, term_freq)]
+        self._lengths = []
+        for idx, passage in enumerate(self.passages):
+            counts = Counter(tokenize(passage.text))
+            self._lengths.append(sum(counts.values()))
+            for term, tf in counts.items():
+                self._postings[term].append((idx, tf))
+        self._avg_len = (sum(self._lengths) / len(self._lengths)) if self._lengths else 0.0
+
+    @classmethod
+    def from_transcript(cls, transcript: str, max_chars: int = PASSAGE_CHARS):
+        return cls(split_passages(transcript, max_chars))
+
+    def __len__(self):
+        return len(self.passages)
+
+    def _idf(self, term: str) -> float:
+        n = len(self._postings.get(term, ()))
+        return math.log(1 + (len(self.passages) - n + 0.5) / (n + 0.5))
+
+    def search(self, query: str, top_k: int = DEFAULT_TOP_K):
+        """Return up to top_k (score, Passage) pairs, best first."""
+        scores = defaultdict(float)
+        for term in set(tokenize(query)):
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+            idf = self._idf(term)
+            for idx, tf in postings:
+                norm = self.k1 * (1 - self.b + self.b * self._lengths[idx] / (self._avg_len or 1))
+                scores[idx] += idf * tf * (self.k1 + 1) / (tf + norm)
+        ranked = sorted(scores.items(), key=lambda kv: kv[1], reverse=True)[:top_k]
+        return [(score, self.passages[idx]) for idx, score in ranked]
+
+    def context_for(self, query: str, top_k: int = DEFAULT_TOP_K) -> str:
+        """
+        Top passages for `query`, rendered with their [mm:ss] markers in
+        transcript order. Falls back to the opening passages if nothing matches.
+        """
+        hits = [p for _, p in self.search(query, top_k)]
+        if not hits:
+            hits = self.passages[:top_k]
+        order = {id(p): i for i, p in enumerate(self.passages)}
+        hits.sort(key=lambda p: order[id(p)])
+        return "\n\n".join(p.render() for p in hits)
@@ -0,0 +1,292 @@
+# utils/transcription.py
+"""Concurrent chunk transcription engine.
+
+Runs ``audio_part`` (inline bytes or ``upload_file``) + ``transcribe_file``
+for every chunk produced by ``chunk_audio`` over a bounded thread pool.
+Results always come back ordered by chunk start time, no matter in which
+order the workers finish.
+"""
+import os
+import time
+import queue
+import contextlib
+import threading
+from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from .gemini_client import audio_part, transcribe_file, MODEL, TRANSCRIBE_PROMPT
+from .retry import classify_error, RetryError, CircuitOpenError, QuotaWaitError, RATE_LIMITED, UPLOAD_PENDING, UNAVAILABLE
+from .transcript_index import format_timestamp
+from . import metrics
+
+DEFAULT_CONCURRENCY = int(os.getenv("TRANSCRIBE_CONCURRENCY", "2"))
+MAX_CONCURRENCY = 16
+
+
+def _error_kind(exc: Exception) -> str:
+    """
+    utils.retry classification of a failed chunk. The client raises
+    user-facing exceptions, so the error they replaced is classified.
+    """
+    cause = exc.__cause__ or exc.__context__ or exc
+    if isinstance(cause, RetryError):
+        return cause.info.kind
+    if isinstance(cause, QuotaWaitError):
+        return RATE_LIMITED  # the shared quota is exhausted for everyone
+    if isinstance(cause, CircuitOpenError):
+        return UNAVAILABLE
+    return classify_error(cause).kind
+
+
+@dataclass
+class ChunkResult:
+    """Outcome of transcribing one chunk."""
+    index: int
+    start_sec: int
+    end_sec: int
+    text: str = ""
+    error: str = None
+    attempts: int = 0
+    latency: float = 0.0
+    rate_limited: bool = False
+    cached: bool = False
+    resumed: bool = False
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+    def display_text(self) -> str:
+        """Text used in the merged transcript (error marker for failed chunks)."""
+        if self.ok:
+            return self.text
+        return f"[ERROR: {self.error[:50]}...]"
+
+
+def merge_transcript(results) -> str:
+    """
+    Merge ChunkResults into one "[mm:ss] text" paragraph per chunk, in time
+    order. Works on a partial, out-of-order set of results as well.
+    """
+    ordered = sorted(results, key=lambda r: (r.start_sec, r.index))
+    return "\n\n".join(f"{format_timestamp(r.start_sec)} {r.display_text().strip()}" for r in ordered)
+
+
+class _Pacer:
+    """Enforce a minimum interval between request starts across all workers."""
+
+    def __init__(self, interval: float):
+        self.interval = max(0.0, float(interval or 0))
+        self._lock = threading.Lock()
+        self._next_start = 0.0
+
+    def wait(self, abort: threading.Event = None):
+        if self.interval <= 0:
+            return
+        with self._lock:
+            now = time.monotonic()
+            start_at = max(now, self._next_start)
+            self._next_start = start_at + self.interval
+        delay = start_at - time.monotonic()
+        if delay > 0:
+            if abort is not None:
+                abort.wait(delay)
+            else:
+                time.sleep(delay)
+
+
+def _transcribe_one(idx, chunk, model, prompt, pacer, abort, cache, job):
+    chunk_path, start_sec, end_sec = chunk[:3]
+    audio_seconds = chunk[3] if len(chunk) > 3 else end_sec - start_sec
+    result = ChunkResult(index=idx, start_sec=start_sec, end_sec=end_sec)
+    started = time.monotonic()
+
+    if job is not None and job.is_done(idx, start_sec):
+        # Finished in an earlier run of the same job
+        result.text = job.text(idx)
+        result.resumed = True
+        metrics.incr("chunks_resumed")
+        return result
+
+    cache_key = None
+    if cache is not None:
+        try:
+            cache_key = cache.key_for(chunk_path, model, prompt or TRANSCRIBE_PROMPT)
+            cached_text = cache.get(cache_key)
+        except Exception:
+            cache_key, cached_text = None, None  # a broken cache must not fail the chunk
+        metrics.incr("transcript_cache", result="hit" if cached_text is not None else "miss")
+        if cached_text is not None:
+            result.text = cached_text
+            result.cached = True
+            result.latency = time.monotonic() - started
+            return result
+
+    # Transient API errors were already retried by the client's RetryPolicy;
+    # what reaches here is final for this run (the journal retries it later).
+    if abort.is_set():
+        result.error = "Skipped after API rate limit"
+        result.rate_limited = True
+        return result
+    pacer.wait(abort)
+    result.attempts = 1
+    try:
+        file_obj = audio_part(chunk_path)  # inline for small chunks, else Files API
+        result.text = transcribe_file(file_obj, model=model, prompt=prompt, audio_seconds=audio_seconds)
+        if cache_key is not None:
+            try:
+                cache.put(cache_key, result.text, model=model)
+            except OSError:
+                pass
+    except Exception as e:
+        result.error = str(e)
+        if _error_kind(e) in (RATE_LIMITED, UPLOAD_PENDING):
+            # The client already backed off; hammering further only makes
+            # it worse, so stop every worker that has not started yet.
+            result.rate_limited = True
+            abort.set()
+
+    result.latency = time.monotonic() - started
+    return result
+
+
+def _stream_futures(chunks, submit, max_pending: int, stop: threading.Event, state: dict):
+    """
+    Feed chunks from a (possibly slow) iterator into the pool from a producer
+    thread, and yield futures as they complete. At most `max_pending` chunks
+    are queued or in flight, which backpressures the producer (and thus the
+    converter feeding it). `state` receives "total" once the iterator is
+    exhausted and "error" if it raised.
+    """
+    done_q = queue.Queue()
+    slots = threading.Semaphore(max_pending)
+    finished = object()
+
+    def on_done(future):
+        slots.release()
+        done_q.put(future)
+
+    def produce():
+        count = 0
+        try:
+            for idx, chunk in enumerate(chunks):
+                while not slots.acquire(timeout=0.5):
+                    if stop.is_set():
+                        return
+                if stop.is_set():
+                    slots.release()
+                    return
+                submit(idx, chunk).add_done_callback(on_done)
+                count += 1
+            state["total"] = count
+        except Exception as e:
+            state["error"] = e
+        finally:
+            state["submitted"] = count
+            close = getattr(chunks, "close", None)
+            if close is not None:
+                close()  # stop the converter if we bailed out early
+            done_q.put(finished)
+
+    producer = threading.Thread(target=metrics.propagate(produce), name="transcribe-producer", daemon=True)
+    producer.start()
+    received = 0
+    producer_done = False
+    while not producer_done or received < state["submitted"]:
+        item = done_q.get()
+        if item is finished:
+            producer_done = True
+            continue
+        received += 1
+        yield item
+
+
+def transcribe_chunks(chunks, model: str = MODEL, prompt: str = None,
+                      concurrency: int = DEFAULT_CONCURRENCY,
+                      throttle_seconds: float = 0.0, on_result=None, cache=None, job=None,
+                      executor=None, cancel: threading.Event = None):
+    """
+    Transcribe chunks concurrently.
+
+    `chunks` is the list returned by chunk_audio: (chunk_path, start_sec, end_sec),
+    optionally with a fourth item giving the seconds of audio sent when that
+    differs from end_sec - start_sec (condense.TimeMap.map_chunks),
+    or any iterator of such tuples (e.g. audio_utils.iter_chunks), in which case
+    transcription of early chunks overlaps with conversion of later ones.
+    Each chunk is sent (inline or via upload) and transcribed on a pool of
+    `concurrency` workers; transient API errors are retried by the client's
+    RetryPolicy (utils.retry), and a rate limit stops the chunks that have
+    not started yet. `throttle_seconds` is the minimum gap between two
+    request starts (shared by all workers).
+
+    If `cache` (a TranscriptCache) is given, chunks whose audio was already
+    transcribed with the same model and prompt are served from it without any
+    API call, and fresh transcripts are stored in it.
+
+    If `job` (a jobs.Job journal for these chunks) is given, chunks it already
+    has as done are not sent again, and every new result is checkpointed to it
+    as soon as it arrives.
+
+    `on_result(result, done_count, total)` is called from the calling thread as
+    each chunk finishes, so it is safe to update Streamlit widgets from it.
+    `total` is None while an iterator is still producing chunks.
+
+    `executor` is an optional ThreadPoolExecutor shared with other callers
+    (e.g. one API pool for a whole batch of files); without it a private pool
+    of `concurrency` workers is used.
+
+    Once `cancel` (an Event owned by the caller) is set, chunks that have not
+    started are skipped instead of sent, e.g. when a batch is interrupted.
+
+    Returns a list of ChunkResult ordered by start_sec.
+    """
+    is_list = isinstance(chunks, (list, tuple))
+    if is_list and not chunks:
+        return []
+
+    limit = len(chunks) if is_list else MAX_CONCURRENCY
+    concurrency = max(1, min(int(concurrency), MAX_CONCURRENCY, limit))
+    pacer = _Pacer(throttle_seconds)
+    abort = threading.Event()
+    stop = threading.Event()
+    state = {"total": len(chunks) if is_list else None, "error": None, "submitted": 0}
+    results = []
+
+    if executor is not None:
+        pool_context = contextlib.nullcontext(executor)
+    else:
+        pool_context = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="transcribe")
+    with pool_context as pool:
+        def run(idx, chunk):
+            if cancel is not None and cancel.is_set():
+                abort.set()
+            return _transcribe_one(idx, chunk, model, prompt, pacer, abort, cache, job)
+
+        def submit(idx, chunk):
+            return pool.submit(metrics.propagate(run), idx, chunk)
+
+        if is_list:
+            completed = as_completed([submit(idx, chunk) for idx, chunk in enumerate(chunks)])
+        else:
+            completed = _stream_futures(chunks, submit, concurrency * 2, stop, state)
+
+        try:
+            for future in completed:
+                result = future.result()
+                results.append(result)
+                if job is not None and not result.resumed:
+                    job.record(result)
+                if result.rate_limited:
+                    stop.set()  # no point converting more chunks
+                if on_result is not None:
+                    on_result(result, len(results), state["total"])
+        finally:
+            stop.set()
+
+    if state["error"] is not None:
+        raise state["error"]
+    if job is not None and state["total"] is not None:
+        job.finish(state["total"])
+
+    results.sort(key=lambda r: (r.start_sec, r.index))
+    return results
@@ -0,0 +1,109 @@
+# utils/upload_registry.py
+"""Local registry of files already uploaded to the Gemini Files API.
+
+Maps the SHA-256 of a local file's bytes to the remote file name and its
+expiry, so identical chunks are not uploaded again while the remote copy is
+still live. Kept in a small SQLite database (like utils.quota), so the app,
+batch runs and workers on the machine share it without losing each other's
+entries.
+"""
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+from datetime import datetime
+from pathlib import Path
+
+DEFAULT_REGISTRY_PATH = os.path.join(Path.home(), ".cache", "voice2notes", "uploads.sqlite")
+# Files API keeps uploads for 48 hours; used when the SDK does not report it.
+DEFAULT_TTL_SECONDS = 48 * 3600
+# Do not reuse a handle that expires within this margin (a request may be slow).
+EXPIRY_MARGIN_SECONDS = 15 * 60
+# What a failing registry raises; callers treat it as "no reuse" and just upload.
+REGISTRY_ERRORS = (OSError, sqlite3.Error)
+
+
+def file_sha256(path: str) -> str:
+    """SHA-256 of the file's bytes, read in blocks."""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def expiry_timestamp(file_obj) -> float:
+    """Expiry of an SDK file object as a UNIX timestamp (falls back to 48h)."""
+    exp = getattr(file_obj, "expiration_time", None)
+    if isinstance(exp, datetime):
+        return exp.timestamp()
+    if isinstance(exp, str):
+        try:
+            return datetime.fromisoformat(exp.replace("Z", "+00:00")).timestamp()
+        except ValueError:
+            pass
+    return time.time() + DEFAULT_TTL_SECONDS
+
+
+class UploadRegistry:
+    """Content hash → remote file handle map with expiry tracking."""
+
+    def __init__(self, path: str = None):
+        self.path = Path(path or os.getenv("UPLOAD_REGISTRY_PATH") or DEFAULT_REGISTRY_PATH)
+        self.path.parent.mkdir(parents=True, exist_ok=True, mode=0o700)
+        self._local = threading.local()
+        self._connect().execute(
+            "CREATE TABLE IF NOT EXISTS uploads ("
+            "content_hash TEXT PRIMARY KEY, name TEXT NOT NULL, uri TEXT, mime_type TEXT, "
+            "expires_at REAL NOT NULL)"
+        )
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.path), timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+        return conn
+
+    def lookup(self, content_hash: str):
+        """Return the entry dict for `content_hash` if it is not about to expire."""
+        row = self._connect().execute(
+            "SELECT name, uri, mime_type, expires_at FROM uploads WHERE content_hash = ? AND expires_at > ?",
+            (content_hash, time.time() + EXPIRY_MARGIN_SECONDS),
+        ).fetchone()
+        return dict(row) if row is not None else None
+
+    def register(self, content_hash: str, file_obj):
+        """Record an uploaded SDK file object under `content_hash`."""
+        name = getattr(file_obj, "name", None)
+        if not name:
+            return
+        self._connect().execute(
+            "INSERT OR REPLACE INTO uploads (content_hash, name, uri, mime_type, expires_at) VALUES (?, ?, ?, ?, ?)",
+            (content_hash, name, getattr(file_obj, "uri", None), getattr(file_obj, "mime_type", None),
+             expiry_timestamp(file_obj)),
+        )
+
+    def forget(self, content_hash: str):
+        self._connect().execute("DELETE FROM uploads WHERE content_hash = ?", (content_hash,))
+
+    def purge_expired(self) -> int:
+        """Drop entries whose remote file has expired. Returns the number removed."""
+        return self._connect().execute("DELETE FROM uploads WHERE expires_at <= ?", (time.time(),)).rowcount
+
+
+_default_registry = None
+_default_lock = threading.Lock()
+
+
+def get_default_registry() -> UploadRegistry:
+    """Process-wide registry instance (created on first use)."""
+    global _default_registry
+    with _default_lock:
+        if _default_registry is None:
+            _default_registry = UploadRegistry()
+            _default_registry.purge_expired()
+        return _default_registry
@@ -0,0 +1,163 @@
+# utils/vad.py
+"""Energy-based voice activity detection used to pick chunk boundaries.
+
+Everything works on per-frame RMS energy (dBFS) computed with NumPy, either from
+an in-memory sample array or block-by-block from a 16-bit PCM WAV file so that
+long recordings never have to be loaded at once.
+"""
+import wave
+
+import numpy as np
+
+DEFAULT_FRAME_MS = 30
+# Shortest pause we are willing to cut in, and shortest chunk we ever emit.
+MIN_SILENCE_MS = 300
+MIN_CHUNK_MS = 1000
+# Silent stretches at least this long count as dead air when skipping silence.
+DEFAULT_DEAD_AIR_MS = 10000
+# Speech context kept on both sides of a skipped dead-air gap.
+DEAD_AIR_PAD_MS = 250
+
+
+def _to_db(rms: np.ndarray) -> np.ndarray:
+    return 20.0 * np.log10(np.maximum(rms, 1e-10))
+
+
+def frame_energies(samples, sample_rate: int, frame_ms: int = DEFAULT_FRAME_MS) -> np.ndarray:
+    """Return per-frame RMS energy in dBFS for 16-bit mono `samples`."""
+    frame_len = max(1, int(sample_rate * frame_ms / 1000))
+    x = np.asarray(samples, dtype=np.float32) / 32768.0
+    if x.size == 0:
+        return np.zeros(0, dtype=np.float32)
+    n_frames = -(-x.size // frame_len)  # ceil
+    x = np.pad(x, (0, n_frames * frame_len - x.size))
+    rms = np.sqrt(np.mean(np.square(x.reshape(n_frames, frame_len)), axis=1))
+    return _to_db(rms)
+
+
+def frame_energies_from_wav(path: str, frame_ms: int = DEFAULT_FRAME_MS, block_seconds: int = 60) -> np.ndarray:
+    """
+    Same as frame_energies but reads a 16-bit PCM WAV in blocks, so memory stays
+    bounded by `block_seconds` of audio regardless of file length.
+    """
+    with wave.open(path, "rb") as w:
+        if w.getsampwidth() != 2:
+            raise ValueError("VAD requires 16-bit PCM WAV input")
+        rate = w.getframerate()
+        channels = w.getnchannels()
+        frame_len = max(1, int(rate * frame_ms / 1000))
+        block_frames = max(1, (rate * block_seconds) // frame_len) * frame_len
+        parts = []
+        while True:
+            raw = w.readframes(block_frames)
+            if not raw:
+                break
+            x = np.frombuffer(raw, dtype="<i2")
+            if channels > 1:
+                x = x.reshape(-1, channels).mean(axis=1)
+            parts.append(frame_energies(x, rate, frame_ms))
+    if not parts:
+        return np.zeros(0, dtype=np.float32)
+    return np.concatenate(parts)
+
+
+def auto_threshold_db(energies_db: np.ndarray) -> float:
+    """Silence threshold a little above the noise floor, never above -25 dBFS."""
+    if energies_db.size == 0:
+        return -40.0
+    return float(min(np.percentile(energies_db, 10) + 6.0, -25.0))
+
+
+def silent_runs(energies_db: np.ndarray, threshold_db: float):
+    """Return (starts, ends) frame index arrays of contiguous silent runs."""
+    mask = np.concatenate(([False], energies_db < threshold_db, [False]))
+    edges = np.flatnonzero(np.diff(mask.astype(np.int8)))
+    return edges[0::2], edges[1::2]
+
+
+def _speech_regions(starts, ends, frame_ms, total_ms, dead_air_ms, pad_ms=DEAD_AIR_PAD_MS):
+    """Complement of the silent runs that are at least `dead_air_ms` long."""
+    long_runs = (ends - starts) * frame_ms >= dead_air_ms
+    regions = []
+    pos = 0
+    for s, e in zip(starts[long_runs] * frame_ms, ends[long_runs] * frame_ms):
+        gap_start = 0 if s == 0 else min(int(s) + pad_ms, total_ms)
+        gap_end = total_ms if e >= total_ms else max(int(e) - pad_ms, gap_start)
+        if gap_start > pos:
+            regions.append((pos, gap_start))
+        pos = max(pos, gap_end)
+    if pos < total_ms:
+        regions.append((pos, total_ms))
+    return regions
+
+
+def speech_regions(energies_db: np.ndarray, total_ms: int, min_silence_ms: int,
+                   frame_ms: int = DEFAULT_FRAME_MS, pad_ms: int = DEAD_AIR_PAD_MS,
+                   threshold_db: float = None):
+    """
+    (start_ms, end_ms) regions left after removing every silence of at least
+    `min_silence_ms`; `pad_ms` of each removed silence is kept next to speech.
+    """
+    if threshold_db is None:
+        threshold_db = auto_threshold_db(energies_db)
+    starts, ends = silent_runs(energies_db, threshold_db)
+    return _speech_regions(starts, ends, frame_ms, total_ms, min_silence_ms, pad_ms)
+
+
+def _nearest_cut(cuts: np.ndarray, target: int, lo: int, hi: int, tolerance_ms: int):
+    """Cut point in `cuts` closest to `target`, within tolerance and (lo, hi)."""
+    i = int(np.searchsorted(cuts, target))
+    best = None
+    for c in cuts[max(0, i - 1):i + 1]:
+        c = int(c)
+        if abs(c - target) > tolerance_ms or c <= lo or c >= hi:
+            continue
+        if best is None or abs(c - target) < abs(best - target):
+            best = c
+    return best
+
+
+def plan_chunks(energies_db: np.ndarray, total_ms: int, target_ms: int,
+                frame_ms: int = DEFAULT_FRAME_MS, tolerance_ms: int = 20000,
+                skip_silence: bool = False, dead_air_ms: int = DEFAULT_DEAD_AIR_MS,
+                threshold_db: float = None):
+    """
+    Plan chunk boundaries of roughly `target_ms` that fall in pauses.
+
+    Each boundary moves to the middle of the nearest pause (>= MIN_SILENCE_MS)
+    within `tolerance_ms` of where a fixed split would cut; without a pause in
+    range it stays at the fixed position. With `skip_silence`, silences of at
+    least `dead_air_ms` are left out of every chunk. A remainder shorter than
+    MIN_CHUNK_MS is merged into the previous chunk instead of being dropped.
+
+    Returns a list of (start_ms, end_ms).
+    """
+    if threshold_db is None:
+        threshold_db = auto_threshold_db(energies_db)
+    starts, ends = silent_runs(energies_db, threshold_db)
+
+    pauses = (ends - starts) * frame_ms >= MIN_SILENCE_MS
+    cuts = np.sort((starts[pauses] + ends[pauses]) * frame_ms // 2)
+
+    if skip_silence:
+        regions = _speech_regions(starts, ends, frame_ms, total_ms, dead_air_ms)
+    else:
+        regions = [(0, total_ms)]
+
+    plan = []
+    for region_start, region_end in regions:
+        if region_end - region_start < MIN_CHUNK_MS:
+            continue  # blip inside dead air
+        pos = region_start
+        while region_end - pos > target_ms:
+            target = pos + target_ms
+            cut = _nearest_cut(cuts, target, pos + MIN_CHUNK_MS, region_end - MIN_CHUNK_MS, tolerance_ms)
+            if cut is None:
+                cut = target
+            if region_end - cut < MIN_CHUNK_MS:
+                break
+            plan.append((pos, cut))
+            pos = cut
+        plan.append((pos, region_end))
+    return plan
+
@@ -0,0 +1,30 @@
+# utils/workspace.py
+"""Scoped scratch directories for intermediate audio files.
+
+Everything a run writes to disk (normalized WAV, chunk files) goes into one
+workspace directory that is removed as a whole when the run ends, so nothing
+is left behind in the temp directory. Set WORKSPACE_DIR to put workspaces on
+a tmpfs such as /dev/shm.
+"""
+import os
+import shutil
+import tempfile
+import contextlib
+
+
+def workspace_root():
+    """Parent directory for workspaces: WORKSPACE_DIR if usable, else the system temp dir."""
+    root = os.getenv("WORKSPACE_DIR")
+    if root and os.path.isdir(root) and os.access(root, os.W_OK):
+        return root
+    return None
+
+
+@contextlib.contextmanager
+def workspace(prefix: str = "voice2notes_"):
+    """Create a private scratch directory and remove it, with all contents, on exit."""
+    path = tempfile.mkdtemp(prefix=prefix, dir=workspace_root())
+    try:
+        yield path
+    finally:
+        shutil.rmtree(path, ignore_errors=True)
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Queue worker: claims jobs enqueued by the Streamlit app (USE_JOB_QUEUE=1) and
+runs the convert → chunk → transcribe → summarize pipeline for them.
+
+Run as many workers as the machine (or cluster) can take; every worker on
+every node that shares JOB_QUEUE_URL and JOB_SPOOL_DIR takes jobs from the
+same queue and paces its API calls through the shared quota.
+
+Usage:
+    python worker.py            # run until interrupted
+    python worker.py --once     # process at most one job and exit
+"""
+import os
+import sys
+import time
+import socket
+import argparse
+import threading
+from pathlib import Path
+
+from dotenv import load_dotenv
+load_dotenv()
+
+
+def log(message: str):
+    print(f"[{time.strftime('%H:%M:%S')}] {message}", flush=True)
+
+
+class _Heartbeat(threading.Thread):
+    """Renews the job lease while long stages (conversion, summary) run."""
+
+    def __init__(self, queue, job_id: str, worker_id: str, interval: float):
+        super().__init__(name="heartbeat", daemon=True)
+        self.queue, self.job_id, self.worker_id, self.interval = queue, job_id, worker_id, interval
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            try:
+                self.queue.heartbeat(self.job_id, self.worker_id)
+            except Exception as e:
+                log(f"⚠️ Heartbeat failed: {e}")
+
+
+def run_job(queue, job, worker_id: str):
+    """Run one claimed job and record its outcome in the queue."""
+    from utils.job_queue import spool_dir
+    from utils.pipeline import run_pipeline
+    from utils.transcription import merge_transcript
+    from utils.metrics import current_job
+
+    results = {}
+
+    def on_result(result, done, total):
+        results[result.index] = result
+        queue.heartbeat(job.id, worker_id, progress={
+            "done": done,
+            "total": total,
+            "chunks": [
+                {"index": r.index, "start_sec": r.start_sec, "ok": r.ok, "cached": r.cached,
+                 "resumed": r.resumed, "latency": round(r.latency, 2), "error": r.error}
+                for r in sorted(results.values(), key=lambda r: r.start_sec)
+            ],
+            "partial_transcript": merge_transcript(results.values()),
+            "metrics": current_job().to_dict() if current_job() else None,
+        })
+
+    heartbeat = _Heartbeat(queue, job.id, worker_id, max(1.0, queue.lease_seconds / 4))
+    heartbeat.start()
+    try:
+        outcome = run_pipeline(job.source_path, job.settings, on_result=on_result)
+        queue.complete(job.id, worker_id, outcome)
+        log(f"✅ Job {job.id}: {outcome['chunks']} chunk(s), {outcome['failed']} failed")
+    except Exception as e:
+        queue.fail(job.id, worker_id, str(e))
+        log(f"❌ Job {job.id}: {e}")
+    finally:
+        heartbeat.stopped.set()
+
+    # The spooled upload is only needed until the job is finished
+    src = Path(job.source_path)
+    if src.parent == spool_dir():
+        try:
+            src.unlink()
+        except OSError:
+            pass
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Process jobs from the Voice2Notes job queue.")
+    parser.add_argument("--once", action="store_true", help="Process at most one job, then exit")
+    parser.add_argument("--poll", type=float, default=2.0, help="Seconds between queue polls when idle")
+    parser.add_argument("--metrics-port", type=int, default=None,
+                        help="Serve Prometheus metrics on this port (default: METRICS_PORT, off if unset)")
+    args = parser.parse_args(argv)
+
+    if not os.getenv("GEMINI_API_KEY"):
+        log("❌ GEMINI_API_KEY not found in environment variables!")
+        return 2
+
+    from utils.job_queue import get_job_queue
+    from utils.metrics import start_metrics_server
+
+    queue = get_job_queue()
+    if start_metrics_server(args.metrics_port):
+        log(f"📈 Metrics on :{args.metrics_port or os.getenv('METRICS_PORT')}/metrics")
+    worker_id = f"{socket.gethostname()}:{os.getpid()}"
+    log(f"👷 Worker {worker_id} polling {getattr(queue, 'db_path', 'queue')}")
+    try:
+        while True:
+            job = queue.claim(worker_id)
+            if job is None:
+                if args.once:
+                    return 0
+                time.sleep(args.poll)
+                continue
+            log(f"▶️ Job {job.id} (attempt {job.attempts}): {os.path.basename(job.source_path)}")
+            run_job(queue, job, worker_id)
+            if args.once:
+                return 0
+    except KeyboardInterrupt:
+        log("⏹️ Stopped; a job in progress is re-queued when its lease expires")
+        return 130
+
+
+if __name__ == "__main__":
+    sys.exit(main())